@@ -0,0 +1,469 @@
+"""
+Aderência de uma petição ao histórico de um juiz por vizinhos mais próximos
+(kNN) sobre os embeddings de todas as decisões dele.
+
+Cada decisão ganha um embedding (tema + texto, normalizado, guardado em float16
+na tabela `embeddings_decisoes`), calculado em lotes por `indexar_pendentes`:
+pela fila (fila_tarefas.py: tarefa "eventos", enfileirada após cada
+clonagem, ou "embeddings") ou pelo próprio app quando não há worker. A ingestão descarta o
+embedding das decisões cujo texto mudou, e o log de eventos (eventos.py)
+recalcula só os das decisões inseridas ou atualizadas.
+
+Na consulta, a matriz do juiz (n decisões x d dimensões) fica em memória,
+invalidada pela versão dos dados ou pela dos embeddings (contador próprio em
+`estado_sistema`, para não invalidar o cache do dashboard), e a similaridade com a petição é um único
+produto matriz-vetor (matriz-matriz para um lote de petições, em
+`avaliar_lote`); os k vizinhos saem de um argpartition. Daí vêm:
+
+- aderência: similaridade média dos k vizinhos (0-100);
+- taxa favorável: média dos desfechos dos vizinhos (procedente=1, parcial=0.5,
+  improcedente=0), ponderada pela similaridade; None se nenhum tem desfecho;
+- distribuição de temas dos vizinhos e a lista de precedentes.
+
+O ranking de varas (`ranking_tribunal`) compara a petição de uma vez com o
+centroide de cada juiz do tribunal. Os centroides ficam em `centroides_juizes`
+como soma + contagem, atualizadas a cada embedding gravado ou descartado.
+
+Uso:
+    python aderencia.py                # calcula os embeddings que faltam
+    python aderencia.py --centroides   # refaz a tabela de centroides
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import undefer_group
+
+from database_models import (
+    SessionLocal,
+    SessionLeitura,
+    CentroideJuiz,
+    Decisao,
+    EmbeddingDecisao,
+    Juiz,
+    CHAVE_VERSAO_EMBEDDINGS,
+    incrementar_versao,
+    obter_versao,
+    obter_versao_dados,
+)
+
+MODELO_PADRAO = "all-MiniLM-L6-v2"
+K_PADRAO = 10
+LOTE_EMBEDDINGS = 256
+MAX_CARACTERES_TEXTO = 2000  # o modelo trunca em 256 tokens de qualquer forma
+PESO_DESFECHO = {"procedente": 1.0, "parcial": 0.5, "improcedente": 0.0}
+MATRIZES_EM_CACHE = 8
+
+_matrizes = OrderedDict()  # chave -> ((versão dos dados, dos embeddings), matriz)
+_trava = threading.Lock()
+
+
+@lru_cache(maxsize=2)
+def carregar_modelo(nome=MODELO_PADRAO):
+    """SentenceTransformer (carregado uma vez por processo; ex: no worker)."""
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(nome)
+
+
+def texto_para_embedding(tema, texto):
+    return f"{tema or ''}. {texto or ''}"[:MAX_CARACTERES_TEXTO]
+
+
+def normalizar(vetores):
+    vetores = np.asarray(vetores, dtype=np.float32)
+    normas = np.linalg.norm(vetores, axis=-1, keepdims=True)
+    return vetores / np.where(normas == 0, 1, normas)
+
+
+# --- CÁLCULO E ARMAZENAMENTO ---
+
+
+def _ajustar_centroides(session, deltas):
+    """Soma `deltas` {(juiz_id, modelo): (soma de vetores, n)} aos centroides."""
+    for (juiz_id, nome_modelo), (soma, n) in deltas.items():
+        centroide = session.execute(
+            select(CentroideJuiz)
+            .where(
+                CentroideJuiz.juiz_id == juiz_id, CentroideJuiz.modelo == nome_modelo
+            )
+            .with_for_update()
+        ).scalar_one_or_none()
+        if centroide is None:
+            centroide = CentroideJuiz(
+                juiz_id=juiz_id,
+                modelo=nome_modelo,
+                soma=np.zeros_like(soma).tobytes(),
+                n=0,
+            )
+            session.add(centroide)
+        centroide.soma = (
+            np.frombuffer(centroide.soma, dtype=np.float64) + soma
+        ).tobytes()
+        centroide.n = centroide.n + n
+
+
+def _acumular(deltas, juiz_id, nome_modelo, vetor, sinal):
+    soma, n = deltas.get((juiz_id, nome_modelo), (0.0, 0))
+    deltas[(juiz_id, nome_modelo)] = (
+        soma + sinal * vetor.astype(np.float64),
+        n + sinal,
+    )
+
+
+def descartar_embeddings(session, decisao_ids):
+    """Apaga os embeddings dessas decisões (texto mudou ou decisão removida)."""
+    if not decisao_ids:
+        return
+    deltas = {}
+    for juiz_id, nome_modelo, vetor in session.execute(
+        select(
+            EmbeddingDecisao.juiz_id, EmbeddingDecisao.modelo, EmbeddingDecisao.vetor
+        ).where(EmbeddingDecisao.decisao_id.in_(list(decisao_ids)))
+    ):
+        _acumular(deltas, juiz_id, nome_modelo, np.frombuffer(vetor, np.float16), -1)
+    if deltas:
+        session.execute(
+            delete(EmbeddingDecisao).where(
+                EmbeddingDecisao.decisao_id.in_(list(decisao_ids))
+            )
+        )
+        _ajustar_centroides(session, deltas)
+
+
+def recalcular_centroides(session):
+    """Refaz a tabela de centroides a partir de `embeddings_decisoes`."""
+    session.execute(delete(CentroideJuiz))
+    deltas = {}
+    for juiz_id, nome_modelo, vetor in session.execute(
+        select(
+            EmbeddingDecisao.juiz_id, EmbeddingDecisao.modelo, EmbeddingDecisao.vetor
+        )
+    ):
+        _acumular(deltas, juiz_id, nome_modelo, np.frombuffer(vetor, np.float16), 1)
+    _ajustar_centroides(session, deltas)
+    return len(deltas)
+
+
+def _pendentes(nome_modelo, juizes, ids=None):
+    """Decisões sem embedding do modelo atual."""
+    query = (
+        select(Decisao)
+        .outerjoin(
+            EmbeddingDecisao,
+            (EmbeddingDecisao.decisao_id == Decisao.id)
+            & (EmbeddingDecisao.modelo == nome_modelo),
+        )
+        .where(EmbeddingDecisao.decisao_id.is_(None))
+    )
+    if juizes is not None:
+        query = query.where(Decisao.juiz_id.in_(juizes))
+    if ids is not None:
+        query = query.where(Decisao.id.in_(ids))
+    return query
+
+
+def indexar_pendentes(
+    modelo=None, juizes=None, nome_modelo=MODELO_PADRAO, ao_progresso=None, ids=None
+):
+    """
+    Calcula e grava os embeddings que faltam (de todos os juízes, ou só dos
+    `juizes` pedidos, ou só das decisões `ids`, como faz eventos.py), em
+    lotes de LOTE_EMBEDDINGS com commit por lote. Devolve quantos foram gravados.
+    """
+    session = SessionLocal()
+    try:
+        total = session.scalar(
+            select(func.count()).select_from(
+                _pendentes(nome_modelo, juizes, ids).subquery()
+            )
+        )
+        if not total:
+            return 0
+        modelo = modelo or carregar_modelo(nome_modelo)
+        feitos = 0
+        ultimo_id = 0
+        while True:
+            decisoes = (
+                session.execute(
+                    _pendentes(nome_modelo, juizes, ids)
+                    .where(Decisao.id > ultimo_id)
+                    .order_by(Decisao.id)
+                    .limit(LOTE_EMBEDDINGS)
+                    .options(undefer_group("texto"))
+                )
+                .scalars()
+                .all()
+            )
+            if not decisoes:
+                break
+            vetores = normalizar(
+                modelo.encode(
+                    [texto_para_embedding(d.tema, d.texto_decisao) for d in decisoes],
+                    batch_size=64,
+                    convert_to_numpy=True,
+                )
+            ).astype(np.float16)
+            gravados = [d.id for d in decisoes]
+            # Embedding de outro modelo, se houver, é substituído
+            descartar_embeddings(session, gravados)
+            deltas = {}
+            for d, vetor in zip(decisoes, vetores):
+                session.add(
+                    EmbeddingDecisao(
+                        decisao_id=d.id,
+                        juiz_id=d.juiz_id,
+                        modelo=nome_modelo,
+                        vetor=vetor.tobytes(),
+                    )
+                )
+                _acumular(deltas, d.juiz_id, nome_modelo, vetor, 1)
+            _ajustar_centroides(session, deltas)
+            # As matrizes em cache (aqui e nos outros processos) ficam velhas;
+            # o cache do dashboard (versão dos dados) não
+            incrementar_versao(session, CHAVE_VERSAO_EMBEDDINGS)
+            session.commit()
+            session.expunge_all()
+            ultimo_id = gravados[-1]
+            feitos += len(decisoes)
+            if ao_progresso:
+                ao_progresso(feitos, total, f"🧮 {feitos}/{total} embeddings")
+        return feitos
+    finally:
+        session.close()
+
+
+# --- CONSULTA ---
+
+
+def _carregar_matriz(session, juizes, nome_modelo):
+    linhas = session.execute(
+        select(
+            EmbeddingDecisao.vetor,
+            Decisao.id,
+            Decisao.numero_processo,
+            Decisao.tema,
+            Decisao.desfecho,
+        )
+        .join(Decisao, Decisao.id == EmbeddingDecisao.decisao_id)
+        .where(
+            EmbeddingDecisao.juiz_id.in_(juizes),
+            EmbeddingDecisao.modelo == nome_modelo,
+        )
+    ).all()
+    if not linhas:
+        return None
+    vetores, ids, processos, temas, desfechos = zip(*linhas)
+    matriz = np.frombuffer(b"".join(vetores), dtype=np.float16)
+    return {
+        # float32: o produto em float16 não usa BLAS e é bem mais lento
+        "vetores": matriz.reshape(len(linhas), -1).astype(np.float32),
+        "ids": np.array(ids),
+        "processos": processos,
+        "temas": temas,
+        "desfechos": desfechos,
+        "pesos": np.array(
+            [PESO_DESFECHO.get(d, np.nan) for d in desfechos], dtype=np.float32
+        ),
+    }
+
+
+def _em_cache(chave, carregar):
+    """
+    carregar(session) em cache até a versão dos dados ou a dos embeddings
+    mudar (LRU): a matriz traz tema e desfecho das decisões, além dos vetores.
+    """
+    session = SessionLeitura()
+    try:
+        versao = (
+            obter_versao_dados(session),
+            obter_versao(session, CHAVE_VERSAO_EMBEDDINGS),
+        )
+        with _trava:
+            em_cache = _matrizes.get(chave)
+            if em_cache and em_cache[0] == versao:
+                _matrizes.move_to_end(chave)
+                return em_cache[1]
+        valor = carregar(session)
+    finally:
+        session.close()
+    with _trava:
+        _matrizes[chave] = (versao, valor)
+        _matrizes.move_to_end(chave)
+        while len(_matrizes) > MATRIZES_EM_CACHE:
+            _matrizes.popitem(last=False)
+    return valor
+
+
+def matriz_juiz(juizes, nome_modelo=MODELO_PADRAO):
+    """Matriz de embeddings das decisões dos `juizes` (cache por versão)."""
+    juizes = tuple(sorted(juizes))
+    return _em_cache(
+        ("juizes", juizes, nome_modelo),
+        lambda session: _carregar_matriz(session, juizes, nome_modelo),
+    )
+
+
+def avaliar(vetor_peticao, juizes, k=K_PADRAO, nome_modelo=MODELO_PADRAO):
+    """
+    Compara a petição (embedding) com todas as decisões dos `juizes`.
+    Devolve None se eles ainda não têm embeddings; senão, um dict com
+    aderencia, taxa_favoravel, com_desfecho, temas [(tema, n)], precedentes
+    e n_decisoes.
+    """
+    return avaliar_lote(np.atleast_2d(vetor_peticao), juizes, k, nome_modelo)[0]
+
+
+def avaliar_lote(vetores_peticoes, juizes, k=K_PADRAO, nome_modelo=MODELO_PADRAO):
+    """`avaliar` para várias petições com um único produto de matrizes."""
+    matriz = matriz_juiz(juizes, nome_modelo)
+    if matriz is None:
+        return [None] * len(vetores_peticoes)
+    todas = normalizar(vetores_peticoes) @ matriz["vetores"].T
+    return [_vizinhos(matriz, similaridades, k) for similaridades in todas]
+
+
+def _vizinhos(matriz, similaridades, k):
+    k = min(k, len(similaridades))
+    vizinhos = np.argpartition(-similaridades, k - 1)[:k]
+    vizinhos = vizinhos[np.argsort(-similaridades[vizinhos])]
+    sims = similaridades[vizinhos]
+
+    pesos = matriz["pesos"][vizinhos]
+    conhecidos = ~np.isnan(pesos)
+    relevancia = np.clip(sims[conhecidos], 0, None)
+    taxa_favoravel = (
+        float((relevancia * pesos[conhecidos]).sum() / relevancia.sum() * 100)
+        if relevancia.sum() > 0
+        else None
+    )
+
+    return {
+        "aderencia": float(np.clip(sims, 0, None).mean() * 100),
+        "taxa_favoravel": taxa_favoravel,
+        "com_desfecho": int(conhecidos.sum()),
+        "temas": Counter(matriz["temas"][i] for i in vizinhos).most_common(),
+        "precedentes": [
+            {
+                "decisao_id": int(matriz["ids"][i]),
+                "numero_processo": matriz["processos"][i],
+                "tema": matriz["temas"][i],
+                "desfecho": matriz["desfechos"][i],
+                "similaridade": float(similaridades[i]),
+            }
+            for i in vizinhos
+        ],
+        "n_decisoes": len(similaridades),
+    }
+
+
+# --- RANKING DE JUÍZES (CENTROIDES) ---
+
+SUAVIZACAO_TAXA = 10  # decisões "emprestadas" da média do tribunal
+
+
+def _carregar_centroides(session, tribunal_id, nome_modelo):
+    linhas = session.execute(
+        select(Juiz.id, Juiz.nome, Juiz.vara, CentroideJuiz.soma, CentroideJuiz.n)
+        .join(CentroideJuiz, CentroideJuiz.juiz_id == Juiz.id)
+        .where(
+            Juiz.tribunal_id == tribunal_id,
+            CentroideJuiz.modelo == nome_modelo,
+            CentroideJuiz.n > 0,
+        )
+        .order_by(Juiz.id)
+    ).all()
+    if not linhas:
+        return None
+    ids, nomes, varas, somas, ns = zip(*linhas)
+
+    # Desfechos por juiz numa agregação só (procedente=1, parcial=0.5, improcedente=0)
+    peso = case(
+        *[(Decisao.desfecho == d, p) for d, p in PESO_DESFECHO.items()], else_=None
+    )
+    desfechos = dict(
+        (juiz_id, (favoraveis or 0.0, com_desfecho))
+        for juiz_id, favoraveis, com_desfecho in session.execute(
+            select(Decisao.juiz_id, func.sum(peso), func.count(peso))
+            .where(Decisao.juiz_id.in_(ids))
+            .group_by(Decisao.juiz_id)
+        )
+    )
+    favoraveis = np.array([desfechos.get(j, (0.0, 0))[0] for j in ids], dtype=float)
+    com_desfecho = np.array([desfechos.get(j, (0.0, 0))[1] for j in ids], dtype=float)
+    media = favoraveis.sum() / com_desfecho.sum() if com_desfecho.sum() else np.nan
+    return {
+        "ids": ids,
+        "nomes": nomes,
+        "varas": varas,
+        "n": np.array(ns),
+        # soma / n e normaliza: cada linha é o centroide unitário do juiz
+        "centroides": normalizar(
+            np.frombuffer(b"".join(somas), dtype=np.float64).reshape(len(ids), -1)
+        ),
+        "com_desfecho": com_desfecho.astype(int),
+        # Taxa suavizada: juiz com poucos desfechos fica perto da média do tribunal
+        "taxas": (favoraveis + SUAVIZACAO_TAXA * media)
+        / (com_desfecho + SUAVIZACAO_TAXA),
+    }
+
+
+def ranking_tribunal(
+    vetor_peticao,
+    tribunal_id,
+    limite=20,
+    ordenar_por="aderencia",
+    nome_modelo=MODELO_PADRAO,
+):
+    """
+    Todos os juízes do tribunal ordenados por aderência da petição ao
+    centroide das decisões de cada um (um produto matriz-vetor) ou pela taxa
+    de desfecho favorável (`ordenar_por="taxa_favoravel"`). Devolve uma lista
+    de dicts (vazia se o tribunal ainda não tem embeddings).
+    """
+    dados = _em_cache(
+        ("tribunal", tribunal_id, nome_modelo),
+        lambda session: _carregar_centroides(session, tribunal_id, nome_modelo),
+    )
+    if dados is None:
+        return []
+    aderencias = dados["centroides"] @ normalizar(vetor_peticao).ravel()
+    chave = aderencias if ordenar_por == "aderencia" else np.nan_to_num(dados["taxas"])
+    ordem = np.argsort(-chave, kind="stable")[:limite]
+    return [
+        {
+            "juiz_id": dados["ids"][i],
+            "juiz": dados["nomes"][i],
+            "vara": dados["varas"][i],
+            "aderencia": float(max(aderencias[i], 0) * 100),
+            "taxa_favoravel": (
+                None if np.isnan(dados["taxas"][i]) else float(dados["taxas"][i] * 100)
+            ),
+            "com_desfecho": int(dados["com_desfecho"][i]),
+            "n_decisoes": int(dados["n"][i]),
+        }
+        for i in ordem
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--centroides" in sys.argv:
+        session = SessionLocal()
+        try:
+            juizes = recalcular_centroides(session)
+            incrementar_versao(session, CHAVE_VERSAO_EMBEDDINGS)
+            session.commit()
+        finally:
+            session.close()
+        print(f"✅ Centroides recalculados ({juizes} juízes).")
+    else:
+        print("🧮 Calculando embeddings das decisões...")
+        gravados = indexar_pendentes(
+            ao_progresso=lambda feitos, total, msg: print(f"   {msg}")
+        )
+        print(f"✅ {gravados} embeddings novos.")
@@ -1,5 +1,7 @@
-from sqlalchemy.orm import Session
-from database_models import SessionLocal, Decisao
+from sqlalchemy.orm import Session, undefer_group
+from database_models import SessionLocal, Decisao, incrementar_versao_dados
+import estatisticas
+import eventos
 
 # 1. O Teu "Dicionário Jurídico" (Taxonomia Própria)
 # Aqui definimos as regras. Se o texto conter X, a categoria é Y.
@@ -26,30 +28,52 @@ REGRA_RISCO = {
 }
 
 
-def normalizar_processos():
+AREAS = [area.upper() for area in REGRA_CLASSIFICACAO] + ["Outros"]
+RISCOS = [nivel.upper() for nivel in REGRA_RISCO] + ["Indefinido"]
+
+
+def classificar_texto(texto):
+    """(área, risco) pelas regras acima; usado nas decisões e nas petições."""
+    texto_analise = texto.lower()
+
+    # 1. Identificar Área do Direito
+    area_detectada = "Outros"
+    for area, palavras_chave in REGRA_CLASSIFICACAO.items():
+        if any(palavra in texto_analise for palavra in palavras_chave):
+            area_detectada = area.upper()
+            break  # Para na primeira correspondência
+
+    # 2. Identificar Complexidade/Risco
+    risco_detectado = "Indefinido"
+    for nivel, palavras_chave in REGRA_RISCO.items():
+        if any(palavra in texto_analise for palavra in palavras_chave):
+            risco_detectado = nivel.upper()
+            break
+
+    return area_detectada, risco_detectado
+
+
+def normalizar_processos(ids=None):
+    """
+    Classifica as decisões (todas, ou só as de `ids`, ex: as recém-clonadas) e
+    devolve quantas mudaram de etiqueta.
+    """
     session = SessionLocal()
 
-    # Busca todas as decisões que ainda não foram analisadas (ou todas para reprocessar)
-    decisoes = session.query(Decisao).all()
+    # O texto é deferred: undefer_group traz junto, numa só query (sem N+1)
+    query = session.query(Decisao).options(undefer_group("texto"))
+    if ids is not None:
+        query = query.filter(Decisao.id.in_(ids))
+    decisoes = query.all()
 
     print(f"🧠 Iniciando análise jurídica de {len(decisoes)} processos...")
+    alterados = 0
+    deltas = estatisticas.novo_acumulador()
+    mudancas = []  # (tipo, decisao_id, juiz_id) para o log de eventos
 
     for decisao in decisoes:
-        texto_analise = (str(decisao.tema) + " " + str(decisao.texto_decisao)).lower()
-
-        # 1. Identificar Área do Direito
-        area_detectada = "Outros"
-        for area, palavras_chave in REGRA_CLASSIFICACAO.items():
-            if any(palavra in texto_analise for palavra in palavras_chave):
-                area_detectada = area.upper()
-                break  # Para na primeira correspondência
-
-        # 2. Identificar Complexidade/Risco
-        risco_detectado = "Indefinido"
-        for nivel, palavras_chave in REGRA_RISCO.items():
-            if any(palavra in texto_analise for palavra in palavras_chave):
-                risco_detectado = nivel.upper()
-                break
+        texto_analise = str(decisao.tema) + " " + str(decisao.texto_decisao)
+        area_detectada, risco_detectado = classificar_texto(texto_analise)
 
         # 3. Atualizar o registro no Banco (Simulando o resultado normalizado)
         # Aqui, estamos a usar o campo 'resultado' para guardar essa etiqueta temporariamente
@@ -59,14 +83,30 @@ def normalizar_processos():
 
         # Só atualiza se for diferente para poupar processamento
         if decisao.resultado != etiqueta_final:
+            # Move a contagem da etiqueta antiga para a nova na tabela de resumo
+            chave_antiga = estatisticas.chave_estatistica(
+                decisao.juiz_id, decisao.tema, decisao.resultado, decisao.data_decisao
+            )
+            chave_nova = estatisticas.chave_estatistica(
+                decisao.juiz_id, decisao.tema, etiqueta_final, decisao.data_decisao
+            )
+            deltas[chave_antiga] -= 1
+            deltas[chave_nova] += 1
             decisao.resultado = etiqueta_final
+            mudancas.append((eventos.ETIQUETA, decisao.id, decisao.juiz_id))
+            alterados += 1
             print(
                 f"Processo {decisao.numero_processo} -> Classificado como: {etiqueta_final}"
             )
 
+    if alterados:
+        estatisticas.aplicar_deltas(session, deltas)
+        incrementar_versao_dados(session)
+        eventos.registrar(session, mudancas)
     session.commit()
     session.close()
     print("✅ Normalização Jurídica concluída!")
+    return alterados
 
 
 if __name__ == "__main__":
@@ -0,0 +1,210 @@
+"""
+Análise de petições em lote (carteiras de processos), usada pela API
+(POST /analise/peticoes) através da fila de tarefas.
+
+1. `gravar_lote` copia os PDFs (soltos ou de dentro de um .zip), em blocos
+   e dentro dos limites de MAX_ARQUIVOS/MAX_BYTES_PDF/MAX_BYTES_LOTE, para
+   DIR_LOTES/<lote>/ com nomes numerados e um manifesto com os nomes
+   originais. A tarefa "analisar_peticoes" recebe só o caminho: o banco não
+   guarda os arquivos (o worker precisa enxergar o mesmo disco).
+2. Extração: um PDF por processo num pool (extracao_pdf.extrair_texto, com
+   o mesmo limite de caracteres do analisador do app, sem cache: o texto da
+   carteira não fica em lugar nenhum depois que o lote é descartado).
+3. Embeddings: uma chamada `encode` para o lote inteiro, em LOTE_EMBEDDINGS.
+4. Aderência: um produto de matrizes entre as petições e as decisões do juiz
+   (aderencia.avaliar_lote), mais as probabilidades do modelo de desfecho.
+
+O progresso sai por `ao_progresso` (um passo por PDF extraído e um para
+embeddings + aderência), que a API transmite em /tarefas/{id}/eventos.
+"""
+
+import json
+import os
+import shutil
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import aderencia
+import analise_juridica
+import extracao_pdf
+import modelo_desfecho
+
+DIR_LOTES = os.getenv("PROLOGOS_LOTES_DIR", "./dados/lotes")
+MAX_ARQUIVOS = 500
+MAX_BYTES_PDF = 50 * 1024 * 1024
+MAX_BYTES_LOTE = 500 * 1024 * 1024  # soma dos PDFs (descompactados) de um lote
+BLOCO_COPIA = 1024 * 1024
+PRECEDENTES_POR_PETICAO = 5
+MANIFESTO = "manifesto.json"
+
+
+# --- RECEBIMENTO ---
+
+
+def _entradas(arquivos):
+    """(nome, arquivo aberto) de cada PDF enviado, solto ou de dentro de um .zip."""
+    for nome, arquivo in arquivos:
+        if (nome or "").lower().endswith(".zip"):
+            try:
+                pacote = zipfile.ZipFile(arquivo)  # lê do próprio arquivo enviado
+            except zipfile.BadZipFile:
+                raise ValueError("Arquivo .zip inválido.")
+            with pacote:
+                for info in pacote.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                        continue
+                    # Tamanho declarado no zip: recusa antes de descompactar (zip
+                    # bomb); a cópia confere o tamanho real
+                    if info.file_size > MAX_BYTES_PDF:
+                        raise ValueError(f"{info.filename}: PDF maior que o permitido.")
+                    with pacote.open(info) as entrada:
+                        yield os.path.basename(info.filename), entrada
+        elif arquivo.read(5) == b"%PDF-":
+            arquivo.seek(0)
+            yield nome, arquivo
+        else:
+            raise ValueError(f"{nome}: envie PDFs ou um .zip de PDFs.")
+
+
+def _copiar(entrada, destino, nome, gravados):
+    """
+    Copia em blocos e devolve os bytes copiados; para no primeiro bloco que
+    passa do limite do PDF ou do lote (`gravados` = já gravado antes dele).
+    """
+    tamanho = 0
+    while True:
+        bloco = entrada.read(BLOCO_COPIA)
+        if not bloco:
+            return tamanho
+        tamanho += len(bloco)
+        if tamanho > MAX_BYTES_PDF:
+            raise ValueError(f"{nome}: PDF maior que o permitido.")
+        if gravados + tamanho > MAX_BYTES_LOTE:
+            raise ValueError(
+                f"O lote passa de {MAX_BYTES_LOTE // (1024 * 1024)} MB de PDFs."
+            )
+        destino.write(bloco)
+
+
+def gravar_lote(arquivos):
+    """
+    Grava os `arquivos` [(nome, arquivo binário)] (PDFs ou .zip de PDFs) numa
+    pasta nova, em blocos, e devolve o caminho. O número de PDFs e os bytes
+    (por PDF e do lote) são conferidos durante a cópia: ValueError, sem nada
+    gravado, se passar dos limites ou se não houver PDF.
+    """
+    pasta = os.path.join(DIR_LOTES, uuid.uuid4().hex)
+    os.makedirs(pasta)
+    nomes = []
+    gravados = 0
+    try:
+        for nome, entrada in _entradas(arquivos):
+            if len(nomes) == MAX_ARQUIVOS:
+                raise ValueError(f"No máximo {MAX_ARQUIVOS} petições por lote.")
+            # Nomes numerados no disco: o nome enviado nunca vira caminho
+            caminho = os.path.join(pasta, f"{len(nomes):04d}.pdf")
+            with open(caminho, "wb") as destino:
+                gravados += _copiar(entrada, destino, nome, gravados)
+            nomes.append(nome or f"peticao_{len(nomes) + 1}.pdf")
+        if not nomes:
+            raise ValueError("Nenhum PDF no envio.")
+        with open(os.path.join(pasta, MANIFESTO), "w", encoding="utf-8") as f:
+            json.dump(nomes, f, ensure_ascii=False)
+    except Exception:
+        descartar_lote(pasta)
+        raise
+    return pasta
+
+
+def descartar_lote(pasta):
+    shutil.rmtree(pasta, ignore_errors=True)
+
+
+# --- ANÁLISE ---
+
+
+def _extrair_arquivo(caminho):
+    """Roda em cada processo do pool: lê o PDF do disco e extrai o início."""
+    try:
+        with open(caminho, "rb") as f:
+            return extracao_pdf.extrair_texto(f.read(), usar_cache=False)
+    except Exception as erro:  # PDF corrompido não derruba o lote
+        return {"erro": f"PDF ilegível: {erro}"}
+
+
+def _extrair_todos(caminhos, ao_progresso):
+    total = len(caminhos) + 1
+    if extracao_pdf.MAX_PROCESSOS > 1 and len(caminhos) > 1:
+        pool = ProcessPoolExecutor(max_workers=extracao_pdf.MAX_PROCESSOS)
+        extraidos = pool.map(_extrair_arquivo, caminhos)
+    else:
+        pool = None
+        extraidos = map(_extrair_arquivo, caminhos)
+    try:
+        for feitos, extraido in enumerate(extraidos, start=1):
+            ao_progresso(feitos, total, f"📄 {feitos}/{len(caminhos)} PDFs lidos")
+            yield extraido
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def analisar_pasta(pasta, juiz_id, modelo=None, ao_progresso=None):
+    """
+    Analisa os PDFs de uma pasta criada por `gravar_lote` contra o histórico
+    do juiz. Devolve um dict com juiz_id e `peticoes` (uma entrada por
+    arquivo, na ordem do envio).
+    """
+    ao_progresso = ao_progresso or (lambda feitos, total, msg: None)
+    with open(os.path.join(pasta, MANIFESTO), encoding="utf-8") as f:
+        nomes = json.load(f)
+    caminhos = [os.path.join(pasta, f"{i:04d}.pdf") for i in range(len(nomes))]
+    extraidos = list(_extrair_todos(caminhos, ao_progresso))
+
+    modelo = modelo or aderencia.carregar_modelo()
+    # Embeddings do juiz que faltam (sem worker, ninguém mais os calcularia)
+    aderencia.indexar_pendentes(modelo, juizes=[juiz_id])
+
+    com_texto = [i for i, e in enumerate(extraidos) if e.get("texto", "").strip() != ""]
+    ao_progresso(
+        len(caminhos), len(caminhos) + 1, f"🧠 Comparando {len(com_texto)} petições"
+    )
+    textos = [extraidos[i]["texto"] for i in com_texto]
+    vetores = (
+        modelo.encode(
+            textos, batch_size=aderencia.LOTE_EMBEDDINGS, convert_to_numpy=True
+        )
+        if textos
+        else []
+    )
+    analises = aderencia.avaliar_lote(vetores, [juiz_id]) if textos else []
+
+    peticoes = [
+        {
+            "arquivo": nome,
+            "paginas": extraido.get("paginas"),
+            "erro": extraido.get("erro")
+            or "Sem texto selecionável (PDF digitalizado?)",
+        }
+        for nome, extraido in zip(nomes, extraidos)
+    ]
+    for i, vetor, analise in zip(com_texto, vetores, analises):
+        area, risco = analise_juridica.classificar_texto(extraidos[i]["texto"])
+        tema = analise["temas"][0][0] if analise else None
+        previsao = modelo_desfecho.prever([juiz_id], vetor, area, risco, tema=tema)
+        peticoes[i] = {
+            "arquivo": nomes[i],
+            "paginas": extraidos[i]["paginas"],
+            "area": area,
+            "risco": risco,
+            "tema": tema,
+            "aderencia": analise["aderencia"] if analise else None,
+            "taxa_favoravel": analise["taxa_favoravel"] if analise else None,
+            "precedentes": (
+                analise["precedentes"][:PRECEDENTES_POR_PETICAO] if analise else []
+            ),
+            "previsao": previsao,
+            "erro": None,
+        }
+    return {"juiz_id": juiz_id, "peticoes": peticoes}
@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import time
 import os
 import numpy as np
 from dotenv import load_dotenv
@@ -9,14 +8,20 @@ from dotenv import load_dotenv
 # --- IMPORTS DE IA E UTILITÁRIOS ---
 from sentence_transformers import SentenceTransformer, util
 from pydantic import ValidationError
-from pypdf import PdfReader
 from sqlalchemy.orm import Session
 
 # --- SEUS MÓDULOS LOCAIS ---
 import ingestor_datajud
-
-# Importamos Base e engine para criar o banco se ele não existir
-from database_models import SessionLocal, Decisao, Juiz, Tribunal, Base, engine
+import aderencia
+import analise_juridica
+import dossie as dossie_juiz
+import consultas
+import extracao_pdf
+import fila_tarefas
+import migracoes
+import modelo_desfecho
+import perfilamento
+import snapshot_analitico
 
 # Carrega .env (se existir) e expõe GROQ_API_KEY
 load_dotenv()
@@ -27,9 +32,16 @@ try:
 except ImportError:
     Groq = None
 
+
 # --- INICIALIZAÇÃO DO BANCO (CRÍTICO PARA DEPLOY) ---
-# Cria as tabelas vazias se o arquivo .db não existir
-Base.metadata.create_all(bind=engine)
+# Cria as tabelas vazias se o arquivo .db não existir e aplica as migrações
+# pendentes (migracoes.py). Roda uma vez por processo, não a cada rerun.
+@st.cache_resource
+def inicializar_banco():
+    migracoes.atualizar_banco()
+
+
+inicializar_banco()
 
 
 # --- FUNÇÕES UTILITÁRIAS (GROQ) ---
@@ -67,44 +79,67 @@ def _discover_groq_models(client, prefer_prefixes=("llama3", "llama")):
 st.set_page_config(page_title="PRÓLOGOS | Jurimetria", page_icon="⚖️", layout="wide")
 
 
-# --- CARREGAMENTO DE DADOS BLINDADO ---
-def carregar_dados():
-    session = SessionLocal()
+# --- CARREGAMENTO DE DADOS (CACHE POR VERSÃO) ---
+# Cada consulta traz só o recorte necessário (um juiz, um agregado). O cache é
+# invalidado pela versão dos dados, que a ingestão/classificação incrementa.
+@st.cache_data(show_spinner=False)
+def carregar_lista_juizes(versao):
     try:
-        query = (
-            session.query(
-                Decisao.numero_processo,
-                Decisao.tema,
-                Decisao.resultado,
-                Decisao.data_decisao,
-                Juiz.nome.label("juiz_nome"),
-                Juiz.vara,
-            )
-            .join(Juiz, Decisao.juiz_id == Juiz.id)
-            .all()
-        )
+        return consultas.listar_juizes()
+    except Exception:
+        # Em caso de erro de conexão ou tabela inexistente
+        return []
 
-        # Definição das colunas padrão
-        colunas = ["Processo", "Tema", "Resultado/Risco", "Data", "Juiz", "Vara"]
 
-        if not query:
-            # Retorna DataFrame vazio MAS com as colunas definidas
-            return pd.DataFrame(columns=colunas)
+@st.cache_data(show_spinner=False)
+def carregar_resumo(juiz_id, versao):
+    """Volume, distribuição de temas e últimas decisões (juiz_id=None: todos)."""
+    return {
+        "volume": consultas.contar_decisoes(juiz_id),
+        "temas": (
+            consultas.distribuicao_temas(juiz_id)
+            if juiz_id is not None
+            else pd.DataFrame(columns=["Tema", "Quantidade"])
+        ),
+        "ultimas": consultas.carregar_decisoes(juiz_id, limite=10),
+    }
+
+
+@st.cache_data(show_spinner=False)
+def carregar_panorama_snapshot(gerado_em):
+    """Decisões por tribunal/ano, lidas do snapshot Parquet (só 2 colunas)."""
+    base = snapshot_analitico.carregar_snapshot(["tribunal", "ano"])
+    return (
+        base.groupby(["tribunal", "ano"], observed=True)
+        .size()
+        .reset_index(name="Decisões")
+    )
 
-        return pd.DataFrame(query, columns=colunas)
 
-    except Exception as e:
-        # Em caso de erro de conexão ou tabela inexistente
-        return pd.DataFrame(
-            columns=["Processo", "Tema", "Resultado/Risco", "Data", "Juiz", "Vara"]
-        )
-    finally:
-        session.close()
+@st.cache_data(show_spinner=False)
+def carregar_panorama_resumo(versao):
+    """O mesmo panorama, somado da tabela de resumo (quando o snapshot falha)."""
+    return consultas.panorama_tribunais()
 
 
 @st.cache_resource
 def carregar_modelo_ia():
-    return SentenceTransformer("all-MiniLM-L6-v2")
+    return SentenceTransformer(aderencia.MODELO_PADRAO)
+
+
+# Trabalho feito uma vez por versão dos dados (e não a cada rerun). As escritas
+# de embeddings e modelos têm contadores próprios e não mudam essa versão.
+@st.cache_resource(show_spinner=False)
+def preparar_juizes_sem_worker(juizes, versao, _modelo):
+    """Sem worker: calcula aqui os embeddings que faltam e o modelo de desfecho."""
+    aderencia.indexar_pendentes(_modelo, juizes=list(juizes))
+    modelo_desfecho.treinar(juizes=list(juizes))
+
+
+@st.cache_resource(show_spinner=False)
+def pedir_embeddings(versao):
+    """Enfileira os embeddings pendentes (a chave deduplica contra a fila)."""
+    return fila_tarefas.enfileirar("embeddings", chave=fila_tarefas.CHAVE_EMBEDDINGS)
 
 
 # --- INTERFACE PRINCIPAL ---
@@ -112,11 +147,16 @@ def carregar_modelo_ia():
 st.title("⚖️ PRÓLOGOS")
 st.markdown("**Inteligência Jurídica & Previsibilidade**")
 
-# Inicializa estado da sessão para controle do clone
+# Inicializa estado da sessão para controle do clone (juiz_ativo guarda o id)
 if "juiz_ativo" not in st.session_state:
     st.session_state["juiz_ativo"] = None
 if "dossie_ia" not in st.session_state:
     st.session_state["dossie_ia"] = None  # Variável para guardar o perfil do juiz
+# Tarefas da fila (fila_tarefas.py) que esta sessão está acompanhando
+if "tarefa_clone" not in st.session_state:
+    st.session_state["tarefa_clone"] = None
+if "tarefa_dossie" not in st.session_state:
+    st.session_state["tarefa_dossie"] = None
 
 # --- SIDEBAR: BOTÃO VOLTAR/RESET ---
 with st.sidebar:
@@ -153,45 +193,90 @@ if st.session_state["juiz_ativo"] is None:
             with st.status(
                 "🚀 Iniciando clonagem estatística...", expanded=True
             ) as status:
-                st.write("📡 Conectando ao DataJud...")
-                time.sleep(1)
-
-                st.write("📍 Identificando Vara e Competência...")
-
-                # Chama o módulo importado
-                resultado = ingestor_datajud.clonar_perfil_juiz(processo_ref)
-
-                if resultado["sucesso"]:
-                    st.write(f"✅ Vara localizada: {resultado['juiz_nome']}")
-                    st.write("📥 Baixando histórico de sentenças (50 últimos casos)...")
-
-                    # Barra de progresso visual
-                    progress_bar = st.progress(0)
-                    for i in range(100):
-                        time.sleep(0.01)
-                        progress_bar.progress(i + 1)
-
-                    status.update(
-                        label="✅ Perfil clonado com sucesso!",
-                        state="complete",
-                        expanded=False,
-                    )
-                    st.session_state["juiz_ativo"] = resultado["juiz_nome"]
-                    st.rerun()
-                else:
+                progresso_clone = st.progress(0)
+
+                # Cada etapa concluída no ingestor aparece aqui na hora
+                def _ao_progresso_clone(etapa, total, msg):
+                    st.write(msg)
+                    progresso_clone.progress(etapa / total, text=msg)
+
+                # Etapas 1-2 (uma consulta rápida) rodam aqui; o download e a
+                # classificação vão para a fila, deduplicados pela vara
+                localizada = ingestor_datajud.localizar_vara(
+                    processo_ref, ao_progresso=_ao_progresso_clone
+                )
+                if not localizada["sucesso"]:
                     status.update(label="❌ Falha na clonagem", state="error")
-                    st.error(resultado["msg"])
+                    st.error(localizada["msg"])
+                else:
+                    vara = localizada["vara"]
+                    tarefa_id, _nova = fila_tarefas.enfileirar(
+                        "clonar",
+                        {"vara": vara},
+                        chave=fila_tarefas.chave_clonagem(vara),
+                    )
+                    resultado = None
+                    if not fila_tarefas.worker_ativo():
+                        # Sem worker rodando: executa aqui mesmo, como antes. Vale
+                        # também para uma clonagem igual que ficou na fila (ou
+                        # presa numa execução interrompida): senão ninguém a roda
+                        resultado = fila_tarefas.executar_agora(
+                            tarefa_id, ao_progresso=_ao_progresso_clone
+                        )
+
+                    if resultado and resultado["status"] == fila_tarefas.CONCLUIDA:
+                        status.update(
+                            label="✅ Perfil clonado com sucesso!",
+                            state="complete",
+                            expanded=False,
+                        )
+                        st.session_state["juiz_ativo"] = resultado["resultado"][
+                            "juiz_id"
+                        ]
+                        st.rerun()
+                    elif resultado and resultado["status"] == fila_tarefas.FALHOU:
+                        status.update(label="❌ Falha na clonagem", state="error")
+                        st.error(resultado["mensagem"])
+                    else:
+                        status.update(
+                            label="📋 Clonagem enviada para a fila",
+                            state="complete",
+                            expanded=False,
+                        )
+                        st.session_state["tarefa_clone"] = tarefa_id
+
+        # Acompanha a clonagem feita pelo worker sem prender a sessão
+        @st.fragment(run_every=2)
+        def _acompanhar_clone():
+            tarefa = fila_tarefas.obter_tarefa(st.session_state["tarefa_clone"])
+            if tarefa is None:
+                st.session_state["tarefa_clone"] = None
+                return
+            st.progress(tarefa["progresso"], text=tarefa["mensagem"])
+            if tarefa["status"] == fila_tarefas.CONCLUIDA:
+                st.session_state["tarefa_clone"] = None
+                st.session_state["juiz_ativo"] = tarefa["resultado"]["juiz_id"]
+                st.rerun()
+            elif tarefa["status"] == fila_tarefas.FALHOU:
+                st.session_state["tarefa_clone"] = None
+                st.error(tarefa["mensagem"])
+
+        if st.session_state["tarefa_clone"] is not None:
+            _acompanhar_clone()
 
 # --- CARREGA DADOS (PÓS CLONAGEM) ---
-df = carregar_dados()
+# perfilamento.secao só mede algo com PROLOGOS_PERFIL=1 (ver perfilamento.py)
+with perfilamento.secao("carregar_juizes"):
+    versao_dados = consultas.versao_dados()
 
-# Sincroniza filtros com o estado do clone
-lista_juizes = ["Todos"] + list(df["Juiz"].unique())
+    # Sincroniza filtros com o estado do clone (id -> rótulo único)
+    rotulos_juizes = dict(carregar_lista_juizes(versao_dados))
+    lista_juizes = ["Todos"] + list(rotulos_juizes.values())
 index_juiz = 0
 
 # Se tiver um juiz ativo na sessão, garante que ele está selecionado na lista
-if st.session_state["juiz_ativo"] in lista_juizes:
-    index_juiz = lista_juizes.index(st.session_state["juiz_ativo"])
+if st.session_state["juiz_ativo"] in rotulos_juizes:
+    index_juiz = lista_juizes.index(rotulos_juizes[st.session_state["juiz_ativo"]])
 
 # --- TABS DE NAVEGAÇÃO ---
 tab1, tab2 = st.tabs(["📊 Dashboard & Dossiê", "📝 Analisador de Petição"])
@@ -202,33 +287,37 @@ tab1, tab2 = st.tabs(["📊 Dashboard & Dossiê", "📝 Analisador de Petição"
 
 with tab1:
     st.sidebar.header("🔍 Filtros")
-    juiz_selecionado = st.sidebar.selectbox(
-        "Juiz Selecionado", lista_juizes, index=index_juiz
-    )
+    nome_juiz = st.sidebar.selectbox("Juiz Selecionado", lista_juizes, index=index_juiz)
+    # Daqui em diante o juiz é o id ("Todos" vira None)
+    juiz_selecionado = {r: i for i, r in rotulos_juizes.items()}.get(nome_juiz)
 
     # Se o usuário mudar o selectbox, atualizamos a sessão
-    if juiz_selecionado != "Todos":
+    if juiz_selecionado is not None:
         st.session_state["juiz_ativo"] = juiz_selecionado
 
-    dados_juiz = (
-        df[df["Juiz"] == juiz_selecionado] if juiz_selecionado != "Todos" else df
-    )
+    with perfilamento.secao("carregar_resumo"):
+        resumo_juiz = carregar_resumo(juiz_selecionado, versao_dados)
 
     # KPIs
     col_kpi1, col_kpi2 = st.columns(2)
-    col_kpi1.metric("Volume Analisado", len(dados_juiz))
+    col_kpi1.metric("Volume Analisado", resumo_juiz["volume"])
     col_kpi2.metric("Última Atualização", "Agora")
 
     # Gráficos
-    if not dados_juiz.empty and juiz_selecionado != "Todos":
+    if resumo_juiz["volume"] and juiz_selecionado is not None:
         col_g1, col_g2 = st.columns(2)
         with col_g1:
-            fig = px.pie(dados_juiz, names="Tema", title="Distribuição de Temas")
+            fig = px.pie(
+                resumo_juiz["temas"],
+                names="Tema",
+                values="Quantidade",
+                title="Distribuição de Temas",
+            )
             st.plotly_chart(fig, use_container_width=True)
         with col_g2:
-            st.subheader("Últimas Decisões Coletadas")
+            st.subheader("Últimas Decisões")
             st.dataframe(
-                dados_juiz[["Tema", "Resultado/Risco"]].head(10),
+                resumo_juiz["ultimas"][["Tema", "Resultado/Risco"]],
                 use_container_width=True,
             )
 
@@ -251,43 +340,98 @@ with tab1:
                 try:
                     client = Groq(api_key=api_key_dash)
 
-                    # Prepara contexto
-                    lista_txt = ""
-                    for i, row in dados_juiz.head(50).iterrows():
-                        lista_txt += (
-                            f"- Tema '{row['Tema']}', Risco: {row['Resultado/Risco']}\n"
-                        )
-
-                    prompt_dossie = f"""
-                    ATUE COMO JURIMETRISTA. Crie um Perfil do juiz: {juiz_selecionado}.
-                    DADOS: {lista_txt}
-                    SAÍDA: Perfil comportamental, principais focos, tendência (rígido/garantista).
-                    """
-
                     modelos = _discover_groq_models(client)
                     mod = modelos[0] if modelos else "llama-3.3-70b-versatile"
 
-                    with st.spinner("Escrevendo Dossiê..."):
-                        resp = client.chat.completions.create(
-                            messages=[{"role": "user", "content": prompt_dossie}],
-                            model=mod,
-                            temperature=0.4,
+                    # Com a chave no .env (que o worker também lê) e um worker
+                    # rodando, o dossiê vai para a fila; uma chave digitada aqui
+                    # nunca é gravada no banco, então nesse caso roda inline
+                    if GROQ_API_KEY and fila_tarefas.worker_ativo():
+                        tarefa_id, _nova = fila_tarefas.enfileirar(
+                            "dossie",
+                            {"juiz_id": juiz_selecionado, "modelo": mod},
+                            chave=fila_tarefas.chave_dossie(juiz_selecionado, mod),
                         )
-                        dossie = resp.choices[0].message.content
-
-                        # SALVA NA SESSÃO PARA USAR NA ABA 2
-                        st.session_state["dossie_ia"] = dossie
-                        st.success("✅ Dossiê gerado e salvo na memória!")
-                        st.markdown(dossie)
+                        st.session_state["tarefa_dossie"] = tarefa_id
+                    else:
+                        with st.spinner("Escrevendo Dossiê..."):
+                            # Histórico grande é resumido em blocos (map-reduce),
+                            # com cache por bloco em `resumos_blocos`
+                            progresso_dossie = st.progress(0)
+
+                            def _ao_progresso(feitos, total, msg):
+                                progresso_dossie.progress(
+                                    feitos / max(total, 1), text=msg
+                                )
+
+                            with perfilamento.secao("llm_dossie"):
+                                dossie = dossie_juiz.gerar_dossie(
+                                    juiz_selecionado,
+                                    client,
+                                    mod,
+                                    ao_progresso=_ao_progresso,
+                                )
+
+                            # SALVA NA SESSÃO PARA USAR NA ABA 2
+                            st.session_state["dossie_ia"] = dossie
+                            st.success("✅ Dossiê gerado e salvo na memória!")
+                            st.markdown(dossie)
                 except Exception as e:
                     st.error(f"Erro: {e}")
 
-    elif juiz_selecionado == "Todos":
-        st.dataframe(dados_juiz.head(10), use_container_width=True)
+        # Dossiê gerado pelo worker: acompanha o progresso até terminar
+        @st.fragment(run_every=2)
+        def _acompanhar_dossie():
+            tarefa = fila_tarefas.obter_tarefa(st.session_state["tarefa_dossie"])
+            if tarefa is None:
+                st.session_state["tarefa_dossie"] = None
+                return
+            st.progress(tarefa["progresso"], text=tarefa["mensagem"])
+            if tarefa["status"] == fila_tarefas.CONCLUIDA:
+                st.session_state["tarefa_dossie"] = None
+                st.session_state["dossie_ia"] = tarefa["resultado"]["dossie"]
+                st.rerun()
+            elif tarefa["status"] == fila_tarefas.FALHOU:
+                st.session_state["tarefa_dossie"] = None
+                st.error(tarefa["mensagem"])
+
+        if st.session_state["tarefa_dossie"] is not None:
+            _acompanhar_dossie()
+
+    elif juiz_selecionado is None:
+        st.dataframe(resumo_juiz["ultimas"], use_container_width=True)
+
+        # Panorama da base inteira a partir do snapshot colunar, se for recente
+        # (gerado por `python snapshot_analitico.py`, depois pela tarefa eventos)
+        meta_snapshot = snapshot_analitico.snapshot_recente()
+        panorama = None
+        if meta_snapshot:
+            try:
+                panorama = carregar_panorama_snapshot(meta_snapshot["gerado_em"])
+            except snapshot_analitico.ERROS_LEITURA:
+                # Snapshot sendo trocado agora: soma da tabela de resumo
+                meta_snapshot = None
+                panorama = carregar_panorama_resumo(versao_dados)
+        if panorama is not None and not panorama.empty:
+            fig = px.bar(
+                panorama,
+                x="ano",
+                y="Decisões",
+                color="tribunal",
+                title="Decisões por Tribunal e Ano",
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        if meta_snapshot and panorama is not None and not panorama.empty:
+            minutos = int(snapshot_analitico.idade_snapshot(meta_snapshot) // 60)
+            st.caption(
+                f"Snapshot de {minutos // 60} h {minutos % 60} min atrás "
+                f"({meta_snapshot['linhas']} decisões); escritas mais novas "
+                "entram quando a tarefa de eventos rodar."
+            )
 
 # === ABA 2: CONSULTOR ===
 with tab2:
-    if juiz_selecionado == "Todos" or len(dados_juiz) < 5:
+    if juiz_selecionado is None or resumo_juiz["volume"] < 5:
         st.warning("🔒 Clone um juiz primeiro.")
         st.info(
             "Para liberar esta aba, clone um Juiz com histórico suficiente (mínimo 5 sentenças) na área de Setup."
@@ -304,9 +448,9 @@ with tab2:
         st.file_uploader("Carregar Petição (Bloqueado)", disabled=True)
 
     else:
-        st.header(f"Simulador: {juiz_selecionado}")
+        st.header(f"Simulador: {nome_juiz}")
         modelo_ia = carregar_modelo_ia()
-        temas_juiz = dados_juiz["Tema"].value_counts().head(10).index.tolist()
+        temas_juiz = resumo_juiz["temas"]["Tema"].head(10).tolist()
 
         # Mostra se temos um dossiê carregado
         if st.session_state.get("dossie_ia"):
@@ -316,20 +460,149 @@ with tab2:
 
         arquivo = st.file_uploader("Sua Petição (PDF)", type="pdf")
         if arquivo:
-            leitor = PdfReader(arquivo)
-            texto_peticao = "".join([p.extract_text() for p in leitor.pages])[:6000]
+            # Só as primeiras páginas são lidas, e o texto fica em cache pelo
+            # hash do arquivo: os reruns seguintes não reextraem nada
+            with perfilamento.secao("ler_pdf"):
+                extraido = extracao_pdf.extrair_texto(arquivo.getvalue())
+            texto_peticao = extraido["texto"]
+            if extraido["paginas_sem_texto"] == extraido["paginas_lidas"]:
+                st.warning(
+                    "Não foi possível ler texto deste PDF (parece digitalizado). "
+                    "Envie uma versão com texto selecionável (OCR)."
+                )
+
+            # Vetorização: a petição contra os embeddings de todas as decisões
+            # do juiz (kNN num único produto de matrizes, ver aderencia.py)
+            with st.spinner("Calculando aderência vetorial..."), perfilamento.secao(
+                "encode_aderencia"
+            ):
+                # Só este juiz: outra vara de mesmo nome é outro juízo
+                juizes_ids = [juiz_selecionado]
+                sem_worker = not fila_tarefas.worker_ativo()
+                if sem_worker:
+                    preparar_juizes_sem_worker(
+                        tuple(juizes_ids), versao_dados, modelo_ia
+                    )
+                v_pet = modelo_ia.encode(texto_peticao, convert_to_numpy=True)
+                analise = aderencia.avaliar(v_pet, juizes_ids)
 
-            # Vetorização
-            with st.spinner("Calculando aderência vetorial..."):
-                v_pet = modelo_ia.encode(texto_peticao, convert_to_tensor=True)
+            if analise:
+                best_score = analise["aderencia"]
+                tema_match = analise["temas"][0][0]
+            else:
+                # Embeddings ainda na fila: compara só com os temas do juiz
+                if not sem_worker:
+                    pedir_embeddings(versao_dados)
                 v_juiz = modelo_ia.encode(temas_juiz, convert_to_tensor=True)
                 scores = util.cos_sim(v_pet, v_juiz)
                 best_score = float(scores.max()) * 100
                 tema_match = temas_juiz[np.argmax(scores.cpu().numpy())]
 
-            c1, c2 = st.columns([1, 2])
+            c1, c2, c3 = st.columns([1, 1, 2])
             c1.metric("Aderência", f"{best_score:.1f}%")
-            c2.success(f"Tema Conectado: {tema_match}")
+            if analise and analise["taxa_favoravel"] is not None:
+                c2.metric(
+                    "Desfecho Favorável (vizinhos)",
+                    f"{analise['taxa_favoravel']:.0f}%",
+                    help=f"{analise['com_desfecho']} precedentes com desfecho conhecido",
+                )
+            c3.success(f"Tema Conectado: {tema_match}")
+
+            if analise:
+                with st.expander(
+                    f"📚 Precedentes mais próximos ({analise['n_decisoes']} decisões comparadas)"
+                ):
+                    st.dataframe(
+                        pd.DataFrame(analise["precedentes"]).rename(
+                            columns={
+                                "numero_processo": "Processo",
+                                "tema": "Tema",
+                                "desfecho": "Desfecho",
+                                "similaridade": "Similaridade",
+                            }
+                        )[["Processo", "Tema", "Desfecho", "Similaridade"]],
+                        use_container_width=True,
+                    )
+
+            # Ranking de varas: a mesma petição contra o centroide de cada juiz
+            # do tribunal (um produto matriz-vetor, ver aderencia.ranking_tribunal)
+            tribunais = consultas.listar_tribunais()
+            if tribunais:
+                with st.expander("🏛️ Ranking de juízes do tribunal"):
+                    siglas = dict(tribunais)
+                    ids_tribunais = list(siglas)
+                    do_juiz = consultas.tribunal_do_juiz(juiz_selecionado)
+                    tribunal_id = st.selectbox(
+                        "Tribunal",
+                        ids_tribunais,
+                        index=(
+                            ids_tribunais.index(do_juiz)
+                            if do_juiz in ids_tribunais
+                            else 0
+                        ),
+                        format_func=siglas.get,
+                    )
+                    ordenar_por = st.radio(
+                        "Ordenar por",
+                        ["aderencia", "taxa_favoravel"],
+                        format_func={
+                            "aderencia": "Aderência",
+                            "taxa_favoravel": "Desfecho favorável",
+                        }.get,
+                        horizontal=True,
+                    )
+                    ranking = aderencia.ranking_tribunal(
+                        v_pet, tribunal_id, ordenar_por=ordenar_por
+                    )
+                    if ranking:
+                        st.dataframe(
+                            pd.DataFrame(ranking).rename(
+                                columns={
+                                    "juiz": "Juiz",
+                                    "vara": "Vara",
+                                    "aderencia": "Aderência (%)",
+                                    "taxa_favoravel": "Desfecho Favorável (%)",
+                                    "n_decisoes": "Decisões",
+                                }
+                            )[
+                                [
+                                    "Juiz",
+                                    "Vara",
+                                    "Aderência (%)",
+                                    "Desfecho Favorável (%)",
+                                    "Decisões",
+                                ]
+                            ],
+                            use_container_width=True,
+                        )
+                    else:
+                        st.info(
+                            "Os embeddings deste tribunal ainda não foram calculados."
+                        )
+
+            # Probabilidades do modelo estatístico do juiz (modelo_desfecho.py):
+            # vão para o prompt, no lugar de percentuais inventados pela IA
+            area_pet, risco_pet = analise_juridica.classificar_texto(texto_peticao)
+            previsao = modelo_desfecho.prever(
+                juizes_ids, v_pet, area_pet, risco_pet, tema=tema_match
+            )
+            contexto_estatistico = ""
+            if previsao:
+                p1, p2, p3 = st.columns(3)
+                p1.metric("Procedência", f"{previsao['procedente']:.0%}")
+                p2.metric("Parcial Procedência", f"{previsao['parcial']:.0%}")
+                p3.metric("Improcedência", f"{previsao['improcedente']:.0%}")
+                st.caption(
+                    f"Modelo estatístico do juiz: {previsao['n_amostras']} decisões "
+                    f"com desfecho conhecido ({previsao['n_tema']} do tema {tema_match})."
+                )
+                contexto_estatistico = f"""
+                            PROBABILIDADES CALCULADAS (modelo estatístico treinado com {previsao['n_amostras']} decisões deste juiz, {previsao['n_tema']} do tema):
+                            - Procedência: {previsao['procedente']:.0%}
+                            - Parcial procedência: {previsao['parcial']:.0%}
+                            - Improcedência: {previsao['improcedente']:.0%}
+                            Use exatamente estes percentuais no item 3; não estime outros.
+                            """
 
             st.divider()
             st.subheader("Consultor Jurídico IA")
@@ -363,7 +636,7 @@ with tab2:
                         Você é um Consultor Jurídico Especialista em Processo Civil Brasileiro, de conhecimento jurídico avançado que atua como SIMULADOR DECISÓRIO, utilizando um PERFIL ESTATÍSTICO DE JUIZ previamente definido
                         
                         CONTEXTO:
-                        Juiz: {juiz_selecionado}
+                        Juiz: {nome_juiz}
                         Tema do Processo: {tema_match}
                         - Estilo: Focado em dados estatísticos e jurisprudência consolidada.
                         
@@ -386,6 +659,7 @@ with tab2:
                         - Aplicar normas e precedentes
 
                         3. PROBABILIDADE ESTATÍSTICA DE DESFECHO
+                        {contexto_estatistico}
                         Com base nos dados:
                         - Probabilidade estimada de:
                           • Procedência
@@ -430,7 +704,9 @@ with tab2:
                             else "llama-3.3-70b-versatile"
                         )
 
-                        with st.spinner("Simulando julgamento..."):
+                        with st.spinner("Simulando julgamento..."), perfilamento.secao(
+                            "llm_simulacao"
+                        ):
                             resp = client.chat.completions.create(
                                 messages=[{"role": "user", "content": prompt_sistema}],
                                 model=mod,
@@ -0,0 +1,216 @@
+"""
+Busca textual (full-text) sobre `tema` e `texto_decisao`.
+
+- SQLite: tabela virtual FTS5 `decisoes_fts` com o tema e o texto em claro
+  (o de `decisoes` fica comprimido), tokenizer unicode61 sem acentos
+  ("indenização" == "indenizacao"). A aplicação grava o texto
+  (indexar_decisoes); triggers só copiam o tema e apagam as linhas removidas,
+  sem depender de função SQL registrada na conexão (migração 010).
+- PostgreSQL: coluna `busca_vetor` (tsvector, dicionário 'portuguese', com
+  stemming) gravada pela aplicação (indexar_decisoes) e índice GIN.
+
+O ranking dá peso maior ao tema que ao texto. Os trechos (snippets) só são
+gerados para os resultados da página, não para todos os que casam. O texto
+das decisões vem de fora (DataJud): o trecho é escapado como HTML e só
+então ganha as tags <b></b> em volta dos termos.
+
+O DDL do índice fica nas migrações (migracoes.py: 005, 006 e 010).
+"""
+
+import html
+import re
+
+from sqlalchemy import text
+
+import compressao
+
+PESO_TEMA = 2.0
+PESO_TEXTO = 1.0
+
+_SQL_APAGAR_SQLITE = "DELETE FROM decisoes_fts WHERE rowid = :id"
+_SQL_INSERIR_SQLITE = (
+    "INSERT INTO decisoes_fts(rowid, tema, texto_decisao) VALUES (:id, :tema, :texto)"
+)
+_SQL_VETOR_POSTGRES = """
+    UPDATE decisoes SET busca_vetor =
+        setweight(to_tsvector('portuguese', coalesce(:tema, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(:texto, '')), 'B')
+    WHERE id = :id
+"""
+LOTE_INDEXACAO = 1000
+
+
+def reconstruir_indice_textual(conn):
+    """Reindexa tudo a partir de `decisoes` (usado no backfill e na manutenção)."""
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("DELETE FROM decisoes_fts"))
+        indexar_todas(conn)
+    else:
+        conn.execute(text("REINDEX INDEX ix_decisoes_busca"))
+
+
+def indexar_decisoes(conn, decisoes):
+    """
+    Grava no índice o (id, tema, texto) de decisões recém-gravadas (depois do
+    flush, com o texto em claro). Aceita Connection ou Session.
+    """
+    if not decisoes:
+        return
+    bind = conn if hasattr(conn, "dialect") else conn.get_bind()
+    linhas = [{"id": i, "tema": tema, "texto": texto} for i, tema, texto in decisoes]
+    if bind.dialect.name == "postgresql":
+        conn.execute(text(_SQL_VETOR_POSTGRES), linhas)
+        return
+    # A linha que o trigger de INSERT criou (sem o texto comprimido) é trocada
+    conn.execute(text(_SQL_APAGAR_SQLITE), [{"id": l["id"]} for l in linhas])
+    conn.execute(text(_SQL_INSERIR_SQLITE), linhas)
+
+
+def indexar_todas(conn):
+    """
+    Indexa as decisões já gravadas, em lotes por id: no SQLite todas (índice
+    recém-criado ou esvaziado), no Postgres as que ainda não têm tsvector.
+    """
+    pendentes = " AND busca_vetor IS NULL" if conn.dialect.name == "postgresql" else ""
+    ultimo_id = 0
+    while True:
+        linhas = conn.execute(
+            text(
+                "SELECT id, tema, texto_comprimido, texto_decisao FROM decisoes "
+                f"WHERE id > :ultimo{pendentes} ORDER BY id LIMIT :lote"
+            ),
+            {"ultimo": ultimo_id, "lote": LOTE_INDEXACAO},
+        ).all()
+        if not linhas:
+            return
+        indexar_decisoes(
+            conn,
+            [
+                (
+                    l.id,
+                    l.tema,
+                    compressao.descomprimir(l.texto_comprimido) or l.texto_decisao,
+                )
+                for l in linhas
+            ],
+        )
+        ultimo_id = linhas[-1].id
+
+
+def _consulta_fts5(termos):
+    """
+    Converte o texto livre do usuário numa consulta FTS5 segura: cada palavra
+    vira um termo entre aspas com prefixo ("danos"* "morais"*), todos obrigatórios.
+    O prefixo compensa em parte a falta de stemming (consumidor/consumidora).
+    """
+    palavras = re.findall(r"\w+", termos, flags=re.UNICODE)
+    return " ".join(f'"{p}"*' for p in palavras)
+
+
+_SQL_SQLITE = f"""
+    SELECT d.id, d.numero_processo, d.tema, d.data_decisao, d.juiz_id,
+           -bm25(decisoes_fts, {PESO_TEMA}, {PESO_TEXTO}) AS score,
+           snippet(decisoes_fts, 1, :abre, :fecha, '…', 16) AS trecho
+    FROM decisoes_fts
+    JOIN decisoes d ON d.id = decisoes_fts.rowid
+    WHERE decisoes_fts MATCH :consulta {{filtros}}
+    ORDER BY bm25(decisoes_fts, {PESO_TEMA}, {PESO_TEXTO})
+    LIMIT :limite
+"""
+
+# O ts_headline não enxerga o texto comprimido: o trecho é montado em Python
+# (_destacar) só para as linhas da página
+_SQL_POSTGRES = """
+    WITH q AS (SELECT websearch_to_tsquery('portuguese', :consulta) AS consulta)
+    SELECT d.id, d.numero_processo, d.tema, d.data_decisao, d.juiz_id,
+           d.texto_comprimido, d.texto_decisao,
+           ts_rank_cd(d.busca_vetor, q.consulta) AS score
+    FROM decisoes d, q
+    WHERE d.busca_vetor @@ q.consulta {filtros}
+    ORDER BY score DESC
+    LIMIT :limite
+"""
+PALAVRAS_TRECHO = 24
+
+# Marcadores do snippet (uso privado do Unicode, fora de qualquer texto
+# jurídico): viram <b></b> depois que o trecho é escapado
+_ABRE, _FECHA = "\ue000", "\ue001"
+
+_FILTRO_TRIBUNAL = (
+    " AND d.juiz_id IN (SELECT j.id FROM juizes j JOIN tribunais t "
+    "ON t.id = j.tribunal_id WHERE t.nome = :tribunal)"
+)
+
+
+def montar_busca(dialeto, termos, limite=20, juiz_id=None, tribunal=None):
+    """Devolve (sql, parâmetros) da busca, ou None se não houver termos."""
+    filtros = ""
+    params = {"limite": limite}
+    if juiz_id is not None:
+        filtros += " AND d.juiz_id = :juiz_id"
+        params["juiz_id"] = juiz_id
+    if tribunal:
+        filtros += _FILTRO_TRIBUNAL
+        params["tribunal"] = tribunal.upper()
+
+    if dialeto == "postgresql":
+        params["consulta"] = termos
+        return text(_SQL_POSTGRES.format(filtros=filtros)), params
+
+    consulta = _consulta_fts5(termos)
+    if not consulta:
+        return None
+    params.update(consulta=consulta, abre=_ABRE, fecha=_FECHA)
+    return text(_SQL_SQLITE.format(filtros=filtros)), params
+
+
+def _marcar(trecho):
+    """Escapa o trecho como HTML e troca os marcadores por <b></b>."""
+    if not trecho:
+        return trecho
+    return html.escape(trecho).replace(_ABRE, "<b>").replace(_FECHA, "</b>")
+
+
+def _destacar(texto, termos, palavras=PALAVRAS_TRECHO):
+    """Trecho de `texto` em volta do primeiro termo encontrado, com <b></b>
+    (o texto sai escapado como HTML)."""
+    if not texto:
+        return ""
+    # Prefixo do termo: aproxima o stemming do Postgres (consumidor/consumidora)
+    prefixos = [p.lower()[: max(4, len(p) - 2)] for p in re.findall(r"\w+", termos)]
+    tokens = texto.split()
+
+    def _casa(token):
+        return any(token.lower().strip(".,;:()[]|").startswith(p) for p in prefixos)
+
+    inicio = next((i for i, t in enumerate(tokens) if _casa(t)), 0)
+    inicio = max(0, inicio - palavras // 3)
+    janela = tokens[inicio : inicio + palavras]
+    trecho = " ".join(f"{_ABRE}{t}{_FECHA}" if _casa(t) else t for t in janela)
+    if inicio > 0:
+        trecho = "…" + trecho
+    if inicio + palavras < len(tokens):
+        trecho += "…"
+    return _marcar(trecho)
+
+
+async def buscar(db, termos, limite=20, juiz_id=None, tribunal=None):
+    """Executa a busca numa AsyncSession e devolve uma lista de dicts."""
+    dialeto = db.get_bind().dialect.name
+    montada = montar_busca(dialeto, termos, limite, juiz_id, tribunal)
+    if montada is None:
+        return []
+    sql, params = montada
+    linhas = (await db.execute(sql, params)).mappings().all()
+    if dialeto != "postgresql":
+        return [{**linha, "trecho": _marcar(linha["trecho"])} for linha in linhas]
+
+    resultados = []
+    for linha in linhas:
+        resultado = dict(linha)
+        blob = resultado.pop("texto_comprimido")
+        legado = resultado.pop("texto_decisao")
+        texto = compressao.descomprimir(blob) if blob is not None else legado
+        resultado["trecho"] = _destacar(texto, termos)
+        resultados.append(resultado)
+    return resultados
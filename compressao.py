@@ -0,0 +1,289 @@
+"""
+Compressão do `texto_decisao` com dicionário compartilhado (zlib, sem
+dependências externas).
+
+Os textos minerados são curtos e repetem as mesmas descrições de movimento
+("Julgado procedente o pedido...", "Assunto: Dano Moral.") em milhares de
+processos. Comprimidos um a um, quase não encolhem; com um dicionário treinado
+sobre uma amostra do próprio banco (zlib "preset dictionary", até 32 KiB), cada
+texto passa a referenciar esses trechos em vez de repeti-los.
+
+Formato do blob (1º byte):
+    0x00  texto UTF-8 sem compressão (quando comprimir não compensa)
+    0x01  deflate cru, sem dicionário
+    0x02  deflate cru com dicionário; bytes 1-2 = id do dicionário (big-endian)
+
+Os dicionários ficam na tabela `dicionarios_compressao` e nunca são apagados
+(blobs antigos continuam apontando para eles). A compressão em si não conhece
+o banco: database_models registra os dicionários aqui ao abrir cada conexão e
+define `ao_faltar_dicionario` para buscar os que forem criados depois. As
+rotinas do fim do arquivo (treino, migração) recebem uma Connection.
+
+Uso:
+    python compressao.py treinar      # treina um dicionário novo e recomprime
+    python compressao.py status       # total de bytes comprimidos
+"""
+
+import re
+import struct
+import sys
+import zlib
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import text
+
+FORMATO_BRUTO = 0
+FORMATO_DEFLATE = 1
+FORMATO_DEFLATE_DICIONARIO = 2
+
+NIVEL = 9
+WBITS = -15  # deflate cru: sem os 6 bytes de cabeçalho/checksum do zlib
+TAMANHO_DICIONARIO = 32 * 1024  # janela máxima do deflate
+AMOSTRA_TREINO = 20_000
+
+# Trechos candidatos a entrar no dicionário: frases entre separadores de
+# movimento, sem a data (que varia de processo para processo)
+_RE_SEPARADORES = re.compile(r"\s*(?:\||\n|\[\d{4}-\d{2}-\d{2}\]|---)\s*")
+
+_dicionarios = {}  # id -> bytes
+_dicionario_ativo = None  # id usado para comprimir textos novos
+ao_faltar_dicionario = None  # callback(id) -> bytes | None
+
+
+def registrar_dicionario(dicionario_id, dados, ativo=False):
+    global _dicionario_ativo
+    _dicionarios[dicionario_id] = bytes(dados)
+    if ativo or _dicionario_ativo is None or dicionario_id > _dicionario_ativo:
+        _dicionario_ativo = dicionario_id
+
+
+def dicionario_ativo():
+    return _dicionario_ativo
+
+
+def _dicionario(dicionario_id):
+    dados = _dicionarios.get(dicionario_id)
+    if dados is None and ao_faltar_dicionario is not None:
+        dados = ao_faltar_dicionario(dicionario_id)
+        if dados is not None:
+            _dicionarios[dicionario_id] = bytes(dados)
+    if dados is None:
+        raise LookupError(f"Dicionário de compressão {dicionario_id} não encontrado.")
+    return _dicionarios[dicionario_id]
+
+
+def comprimir(texto, dicionario_id=None):
+    """Texto -> blob. Sem `dicionario_id`, usa o dicionário ativo (se houver)."""
+    if texto is None:
+        return None
+    bruto = texto.encode("utf-8")
+    dicionario_id = dicionario_id if dicionario_id is not None else _dicionario_ativo
+
+    if dicionario_id is not None:
+        compressor = zlib.compressobj(
+            NIVEL, zlib.DEFLATED, WBITS, zdict=_dicionario(dicionario_id)
+        )
+        cabecalho = struct.pack(">BH", FORMATO_DEFLATE_DICIONARIO, dicionario_id)
+    else:
+        compressor = zlib.compressobj(NIVEL, zlib.DEFLATED, WBITS)
+        cabecalho = bytes([FORMATO_DEFLATE])
+
+    comprimido = cabecalho + compressor.compress(bruto) + compressor.flush()
+    if len(comprimido) >= len(bruto) + 1:
+        return bytes([FORMATO_BRUTO]) + bruto
+    return comprimido
+
+
+def descomprimir(blob):
+    """Blob -> texto (aceita None)."""
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    formato = blob[0]
+    if formato == FORMATO_BRUTO:
+        return blob[1:].decode("utf-8")
+    if formato == FORMATO_DEFLATE:
+        return zlib.decompress(blob[1:], WBITS).decode("utf-8")
+    if formato == FORMATO_DEFLATE_DICIONARIO:
+        (dicionario_id,) = struct.unpack_from(">H", blob, 1)
+        descompressor = zlib.decompressobj(WBITS, zdict=_dicionario(dicionario_id))
+        return (descompressor.decompress(blob[3:]) + descompressor.flush()).decode(
+            "utf-8"
+        )
+    raise ValueError(f"Formato de texto comprimido desconhecido: {formato}")
+
+
+def treinar_dicionario(amostras, tamanho=TAMANHO_DICIONARIO):
+    """
+    Monta um dicionário zlib a partir de uma amostra de textos.
+
+    Conta os trechos que se repetem entre textos e fica com os de maior ganho
+    (frequência x tamanho) até encher `tamanho` bytes. Os mais valiosos vão no
+    fim: o deflate alcança o dicionário pelo final, com distâncias menores.
+    """
+    contagem = Counter()
+    for texto in amostras:
+        if not texto:
+            continue
+        # set(): conta em quantos textos o trecho aparece, não quantas vezes
+        for trecho in set(_RE_SEPARADORES.split(texto)):
+            if len(trecho) >= 8:
+                contagem[trecho] += 1
+
+    candidatos = sorted(
+        ((freq * len(t), t) for t, freq in contagem.items() if freq > 1),
+        reverse=True,
+    )
+    escolhidos = []
+    usado = 0
+    for _ganho, trecho in candidatos:
+        dados = trecho.encode("utf-8") + b" "
+        if usado + len(dados) > tamanho:
+            continue
+        escolhidos.append(dados)
+        usado += len(dados)
+    return b"".join(reversed(escolhidos))
+
+
+# --- Rotinas sobre o banco (recebem uma Connection do SQLAlchemy) ---
+
+MIN_AMOSTRAS = 50
+LOTE_RECOMPRESSAO = 2000
+
+
+def salvar_dicionario(conn, dados, amostras):
+    """Grava um dicionário novo, registra-o e torna-o o ativo. Devolve o id."""
+    novo_id = conn.execute(
+        text(
+            "INSERT INTO dicionarios_compressao (dados, amostras, criado_em) "
+            "VALUES (:dados, :amostras, :quando) RETURNING id"
+        ),
+        {"dados": dados, "amostras": amostras, "quando": datetime.utcnow()},
+    ).scalar_one()
+    registrar_dicionario(novo_id, dados, ativo=True)
+    return novo_id
+
+
+def _recomprimir(conn, condicao, ler_texto, confirmar_lotes=False, verbose=False):
+    """Regrava `texto_comprimido` em lotes por id (keyset) com o dicionário ativo."""
+    ultimo_id = 0
+    total = 0
+    while True:
+        linhas = conn.execute(
+            text(
+                "SELECT id, texto_comprimido, texto_decisao FROM decisoes "
+                f"WHERE id > :ultimo AND ({condicao}) ORDER BY id LIMIT :lote"
+            ),
+            {"ultimo": ultimo_id, "lote": LOTE_RECOMPRESSAO},
+        ).all()
+        if not linhas:
+            break
+        conn.execute(
+            text(
+                "UPDATE decisoes SET texto_comprimido = :blob, texto_decisao = NULL "
+                "WHERE id = :id"
+            ),
+            [{"id": l.id, "blob": comprimir(ler_texto(l))} for l in linhas],
+        )
+        ultimo_id = linhas[-1].id
+        total += len(linhas)
+        if confirmar_lotes:
+            conn.commit()
+        if verbose:
+            print(f"   ... {total} textos recomprimidos")
+    return total
+
+
+def migrar_texto_legado(conn, verbose=False):
+    """
+    Move o texto da coluna antiga (`texto_decisao`, sem compressão) para
+    `texto_comprimido`, treinando antes um dicionário com uma amostra dela.
+    """
+    amostra = (
+        conn.execute(
+            text(
+                "SELECT texto_decisao FROM decisoes "
+                "WHERE texto_decisao IS NOT NULL LIMIT :n"
+            ),
+            {"n": AMOSTRA_TREINO},
+        )
+        .scalars()
+        .all()
+    )
+    if len(amostra) >= MIN_AMOSTRAS:
+        salvar_dicionario(conn, treinar_dicionario(amostra), len(amostra))
+    return _recomprimir(
+        conn,
+        "texto_decisao IS NOT NULL",
+        lambda linha: linha.texto_decisao,
+        verbose=verbose,
+    )
+
+
+def treinar_e_recomprimir(conn, confirmar_lotes=False, verbose=False):
+    """
+    Treina um dicionário novo com uma amostra dos textos atuais e recomprime
+    todas as decisões com ele. Devolve o id do dicionário (None se a amostra
+    for pequena demais para valer a pena).
+    """
+    amostra = [
+        descomprimir(blob)
+        for blob in conn.execute(
+            text(
+                "SELECT texto_comprimido FROM decisoes "
+                "WHERE texto_comprimido IS NOT NULL ORDER BY random() LIMIT :n"
+            ),
+            {"n": AMOSTRA_TREINO},
+        ).scalars()
+    ]
+    if len(amostra) < MIN_AMOSTRAS:
+        return None
+
+    novo_id = salvar_dicionario(conn, treinar_dicionario(amostra), len(amostra))
+    if confirmar_lotes:
+        conn.commit()
+    _recomprimir(
+        conn,
+        "texto_comprimido IS NOT NULL OR texto_decisao IS NOT NULL",
+        lambda linha: (
+            descomprimir(linha.texto_comprimido)
+            if linha.texto_comprimido is not None
+            else linha.texto_decisao
+        ),
+        confirmar_lotes=confirmar_lotes,
+        verbose=verbose,
+    )
+    return novo_id
+
+
+if __name__ == "__main__":
+    # Importa o próprio módulo pelo nome: é nele (e não em __main__) que
+    # database_models registra os dicionários
+    import compressao
+    from database_models import engine
+
+    comando = sys.argv[1] if len(sys.argv) > 1 else "status"
+    with engine.connect() as conn:
+        if comando == "treinar":
+            print("📚 Treinando dicionário de compressão...")
+            novo_id = compressao.treinar_e_recomprimir(
+                conn, confirmar_lotes=True, verbose=True
+            )
+            if novo_id is None:
+                print("⚠️ Poucos textos no banco para treinar um dicionário.")
+            else:
+                print(f"✅ Dicionário {novo_id} ativo.")
+        total, comprimido = conn.execute(
+            text(
+                "SELECT count(*), coalesce(sum(length(texto_comprimido)), 0) "
+                "FROM decisoes"
+            )
+        ).one()
+    print(
+        f"📦 {total} decisões, {comprimido} bytes de texto comprimido "
+        f"(dicionário ativo: {compressao.dicionario_ativo()})."
+    )
+    print(
+        "   Para medir o ganho e o custo de leitura: scripts/benchmark_text_storage.py"
+    )
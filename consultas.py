@@ -0,0 +1,184 @@
+"""
+Consultas de leitura usadas pelo dashboard (app.py).
+
+Cada função busca no banco só o recorte necessário (um juiz, um agregado, uma
+amostra), em vez de carregar a tabela `decisoes` inteira num DataFrame. O cache
+fica no app.py (st.cache_data), com a versão dos dados como parte da chave.
+As sessões são somente leitura (SessionLeitura), separadas das da ingestão.
+"""
+
+from collections import Counter
+
+import pandas as pd
+from sqlalchemy import func
+
+from database_models import (
+    SessionLeitura,
+    Decisao,
+    Juiz,
+    Tribunal,
+    EstatisticaDecisao,
+    obter_versao_dados,
+)
+import temas_cnj
+
+COLUNAS_DECISOES = ["Processo", "Tema", "Resultado/Risco", "Data", "Juiz", "Vara"]
+
+
+def versao_dados():
+    session = SessionLeitura()
+    try:
+        return obter_versao_dados(session)
+    except Exception:
+        # Banco ainda sem a tabela de controle
+        return 0
+    finally:
+        session.close()
+
+
+def listar_juizes():
+    """
+    [(id, rótulo)] dos juízes que têm ao menos uma decisão coletada. O rótulo
+    leva a sigla do tribunal (a mesma vara pode existir em vários tribunais) e,
+    se ainda repetir, o id.
+    """
+    session = SessionLeitura()
+    try:
+        linhas = (
+            session.query(Juiz.id, Juiz.nome, Tribunal.nome)
+            .join(Tribunal, Juiz.tribunal_id == Tribunal.id)
+            .join(EstatisticaDecisao, EstatisticaDecisao.juiz_id == Juiz.id)
+            .distinct()
+            .order_by(Juiz.nome, Tribunal.nome)
+            .all()
+        )
+        repetidos = Counter((nome, sigla) for _id, nome, sigla in linhas)
+        return [
+            (
+                juiz_id,
+                (
+                    f"{nome} ({sigla})"
+                    if repetidos[(nome, sigla)] == 1
+                    else f"{nome} ({sigla}, #{juiz_id})"
+                ),
+            )
+            for juiz_id, nome, sigla in linhas
+        ]
+    finally:
+        session.close()
+
+
+def _consulta_decisoes(session):
+    return session.query(
+        Decisao.numero_processo,
+        Decisao.tema,
+        Decisao.resultado,
+        Decisao.data_decisao,
+        Juiz.nome.label("juiz_nome"),
+        Juiz.vara,
+    ).join(Juiz, Decisao.juiz_id == Juiz.id)
+
+
+def carregar_decisoes(juiz_id=None, limite=None):
+    """
+    Decisões (sem o texto) de um juiz, das mais recentes para as mais antigas
+    (por data da decisão).
+
+    Sem `juiz_id`, devolve uma amostra de todos os juízes; use `limite`
+    para não trazer a base inteira.
+    """
+    session = SessionLeitura()
+    try:
+        query = _consulta_decisoes(session)
+        if juiz_id is not None:
+            query = query.filter(Decisao.juiz_id == juiz_id)
+        # Usa o índice (juiz_id, data_decisao) sem ordenação extra
+        query = query.order_by(Decisao.data_decisao.desc(), Decisao.id.desc())
+        if limite:
+            query = query.limit(limite)
+        return pd.DataFrame(query.all(), columns=COLUNAS_DECISOES)
+    finally:
+        session.close()
+
+
+def contar_decisoes(juiz_id=None):
+    """Total de decisões, lido da tabela de resumo `estatisticas_decisoes`."""
+    session = SessionLeitura()
+    try:
+        query = session.query(func.sum(EstatisticaDecisao.total))
+        if juiz_id is not None:
+            query = query.filter(EstatisticaDecisao.juiz_id == juiz_id)
+        return int(query.scalar() or 0)
+    finally:
+        session.close()
+
+
+def distribuicao_temas(juiz_id, limite=None):
+    """
+    DataFrame [Tema, Quantidade] ordenado do tema mais frequente ao menos.
+    Conta todos os assuntos de cada decisão (join por código em
+    `decisoes_temas`, ver temas_cnj.py), não só o principal.
+    """
+    session = SessionLeitura()
+    try:
+        contagem = temas_cnj.contar_por_tema(session, juiz_id)
+    finally:
+        session.close()
+    linhas = sorted(contagem.items(), key=lambda item: (-item[1], item[0]))
+    return pd.DataFrame(
+        linhas[:limite] if limite else linhas, columns=["Tema", "Quantidade"]
+    )
+
+
+def listar_tribunais():
+    """(id, sigla) dos tribunais com juízes cadastrados."""
+    session = SessionLeitura()
+    try:
+        return (
+            session.query(Tribunal.id, Tribunal.nome)
+            .join(Juiz, Juiz.tribunal_id == Tribunal.id)
+            .distinct()
+            .order_by(Tribunal.nome)
+            .all()
+        )
+    finally:
+        session.close()
+
+
+def tribunal_do_juiz(juiz_id):
+    """Id do tribunal do juiz (None se ele não existe)."""
+    session = SessionLeitura()
+    try:
+        return session.query(Juiz.tribunal_id).filter(Juiz.id == juiz_id).scalar()
+    finally:
+        session.close()
+
+
+def panorama_tribunais():
+    """
+    DataFrame [tribunal, ano, Decisões] da base inteira, somado da tabela de
+    resumo (o mês vem como "AAAA-MM"; "s/d" vira ano nulo).
+    """
+    session = SessionLeitura()
+    try:
+        linhas = (
+            session.query(
+                Tribunal.nome,
+                EstatisticaDecisao.mes,
+                func.sum(EstatisticaDecisao.total),
+            )
+            .join(Juiz, EstatisticaDecisao.juiz_id == Juiz.id)
+            .join(Tribunal, Juiz.tribunal_id == Tribunal.id)
+            .group_by(Tribunal.nome, EstatisticaDecisao.mes)
+            .all()
+        )
+    finally:
+        session.close()
+    por_ano = Counter()
+    for tribunal, mes, total in linhas:
+        ano = int(mes[:4]) if mes[:4].isdigit() else None
+        por_ano[(tribunal, ano)] += int(total)
+    return pd.DataFrame(
+        [(tribunal, ano, n) for (tribunal, ano), n in por_ano.items()],
+        columns=["tribunal", "ano", "Decisões"],
+    )
@@ -1,17 +1,208 @@
+import os
+
 # Importamos as ferramentas necessárias do SQLAlchemy
-from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, Date
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from datetime import date
+from sqlalchemy import (
+    create_engine,
+    event,
+    Column,
+    Integer,
+    String,
+    Text,
+    ForeignKey,
+    Date,
+    DateTime,
+    Float,
+    Index,
+    LargeBinary,
+    UniqueConstraint,
+    select,
+    text,
+)
+from sqlalchemy.orm import declarative_base, deferred, relationship, sessionmaker
+from dotenv import load_dotenv
+
+import compressao
 
 # 1. Configuração do Banco de Dados
-# Para este teste, usamos SQLite (um ficheiro local).
-# Para mudar para PostgreSQL no futuro, basta alterar esta linha de conexão.
-DATABASE_URL = "sqlite:///./prologos_mvp.db"
+# A conexão vem da variável DATABASE_URL (ver .env.example). Sem ela, usamos o
+# SQLite local. Todos os módulos (app, API, ingestor, análise, limpeza) importam
+# o `engine` daqui, então a configuração é sempre a mesma.
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./prologos_mvp.db")
+
+# Ajustes do SQLite (podem ser sobrescritos por variáveis de ambiente)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+
+# Pool do PostgreSQL: conexões fixas + extras em pico, por processo
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE_S = int(os.getenv("DB_POOL_RECYCLE_S", "1800"))
+
+
+def _normalizar_url(url):
+    # Heroku e afins ainda entregam "postgres://", que o SQLAlchemy 2 não aceita.
+    # Sem driver explícito, usamos o psycopg 3 (sync e async no mesmo pacote).
+    for prefixo in ("postgres://", "postgresql://"):
+        if url.startswith(prefixo):
+            return "postgresql+psycopg://" + url[len(prefixo) :]
+    return url
+
+
+def _ajustar_sqlite(dbapi_conn, somente_leitura):
+    cursor = dbapi_conn.cursor()
+    if somente_leitura:
+        # Conexão aberta com mode=ro; query_only garante o mesmo via PRAGMA
+        cursor.execute("PRAGMA query_only=1")
+    else:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")  # em KiB
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+    # Usada só pela migração 006 (o índice textual daquela versão lia o texto
+    # por ela). Desde a 010 nenhum trigger a chama: conexões sqlite3 sem esta
+    # função (CLI, backups, scripts) escrevem em `decisoes` normalmente
+    dbapi_conn.create_function(
+        "descomprimir_texto", 1, compressao.descomprimir, deterministic=True
+    )
+
+
+def _configurar_conexao_sqlite(dbapi_conn, _registro):
+    """
+    WAL deixa o leitor (Streamlit/API) e o escritor (ingestão) trabalharem ao
+    mesmo tempo; synchronous=NORMAL é seguro em WAL e evita um fsync por commit.
+    """
+    _ajustar_sqlite(dbapi_conn, somente_leitura=False)
+
+
+def _configurar_leitura_sqlite(dbapi_conn, _registro):
+    _ajustar_sqlite(dbapi_conn, somente_leitura=True)
+
+
+def _url_somente_leitura(url):
+    """sqlite:///caminho.db -> URI do SQLite com mode=ro (None se em memória)."""
+    if not url.startswith("sqlite:///") or ":memory:" in url:
+        return None
+    caminho = url[len("sqlite:///") :]
+    if not caminho.startswith("file:"):
+        caminho = "file:" + caminho
+    separador = "&" if "?" in caminho else "?"
+    return f"sqlite:///{caminho}{separador}mode=ro&uri=true"
+
+
+def _carregar_dicionarios(dbapi_conn, _registro):
+    """Registra os dicionários de compressão (ver compressao.py) já gravados."""
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute("SELECT id, dados FROM dicionarios_compressao")
+        for dicionario_id, dados in cursor.fetchall():
+            compressao.registrar_dicionario(dicionario_id, dados)
+    except Exception:
+        pass  # banco ainda sem a tabela (antes do create_all/migrações)
+    finally:
+        cursor.close()
+        dbapi_conn.rollback()
+
+
+def criar_engine(url=None, somente_leitura=False):
+    url = _normalizar_url(url or DATABASE_URL)
+    if url.startswith("sqlite"):
+        configurar = _configurar_conexao_sqlite
+        if somente_leitura and _url_somente_leitura(url):
+            url, configurar = _url_somente_leitura(url), _configurar_leitura_sqlite
+        novo_engine = create_engine(
+            url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        )
+        event.listen(novo_engine, "connect", configurar)
+    else:
+        novo_engine = create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=True,  # descarta conexões mortas (ex: restart do servidor)
+            pool_recycle=DB_POOL_RECYCLE_S,
+            connect_args=_argumentos_postgres(somente_leitura),
+        )
+    event.listen(novo_engine, "connect", _carregar_dicionarios)
+    return novo_engine
+
+
+def _argumentos_postgres(somente_leitura):
+    # Sem réplica, a leitura usa o primário, mas em transações read-only
+    if somente_leitura:
+        return {"options": "-c default_transaction_read_only=on"}
+    return {}
+
+
+def _url_async(url):
+    # Mesmo banco, driver assíncrono: aiosqlite para SQLite; o psycopg 3 já é async
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://") :]
+    return url
+
+
+def criar_engine_async(url=None, somente_leitura=False):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = _normalizar_url(url or DATABASE_URL)
+    if url.startswith("sqlite"):
+        configurar = _configurar_conexao_sqlite
+        if somente_leitura and _url_somente_leitura(url):
+            url, configurar = _url_somente_leitura(url), _configurar_leitura_sqlite
+        novo_engine = create_async_engine(
+            _url_async(url), connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        event.listen(novo_engine.sync_engine, "connect", configurar)
+    else:
+        novo_engine = create_async_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=DB_POOL_RECYCLE_S,
+            connect_args=_argumentos_postgres(somente_leitura),
+        )
+    event.listen(novo_engine.sync_engine, "connect", _carregar_dicionarios)
+    return novo_engine
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+engine = criar_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Caminho de leitura (dashboard e API): conexões próprias, somente leitura.
+# No SQLite em WAL, leitores e o escritor (ingestão) não se bloqueiam; cada
+# lado tem o seu pool. DATABASE_READ_URL aponta para uma réplica (Postgres).
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+engine_leitura = criar_engine(DATABASE_READ_URL or DATABASE_URL, somente_leitura=True)
+SessionLeitura = sessionmaker(autocommit=False, autoflush=False, bind=engine_leitura)
+
+# Engines assíncronos (usados pela API). Criados sob demanda para que o
+# Streamlit e os scripts não precisem do driver async instalado.
+_async_session_factories = {}
+
+
+def obter_sessao_async(somente_leitura=False):
+    """Fábrica de AsyncSession ligada ao banco de DATABASE_URL (ou à leitura)."""
+    if somente_leitura not in _async_session_factories:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        url = (DATABASE_READ_URL or DATABASE_URL) if somente_leitura else None
+        _async_session_factories[somente_leitura] = async_sessionmaker(
+            criar_engine_async(url, somente_leitura=somente_leitura),
+            expire_on_commit=False,
+        )
+    return _async_session_factories[somente_leitura]
+
+
 # 2. Definição das Tabelas (Modelos)
 
 
@@ -28,10 +219,16 @@ class Tribunal(Base):
 
 class Juiz(Base):
     __tablename__ = "juizes"
+    # Identidade do juízo: órgão julgador (código DataJud) dentro do tribunal.
+    # Juízes antigos (sem código) ficam com NULL, que não conflita no índice.
+    __table_args__ = (
+        Index("ux_juizes_tribunal_orgao", "tribunal_id", "orgao_codigo", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, index=True)  # Ex: Dr. Fulano de Tal
     vara = Column(String)  # Ex: 5ª Vara Cível
+    orgao_codigo = Column(String)  # Ex: "12345" (orgaoJulgador.codigo no DataJud)
     tribunal_id = Column(Integer, ForeignKey("tribunais.id"))
 
     # Relações
@@ -41,12 +238,27 @@ class Juiz(Base):
 
 class Decisao(Base):
     __tablename__ = "decisoes"
+    __table_args__ = (
+        # Dashboard (últimas decisões do juiz), dossiê e filtros da API por juiz/data
+        Index("ix_decisoes_juiz_data", "juiz_id", "data_decisao"),
+        # Paginação da API por data (ordem=data) sem filtro de juiz
+        Index("ix_decisoes_data", "data_decisao"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     numero_processo = Column(String, unique=True, index=True)
-    texto_decisao = Column(Text)  # O texto completo da sentença (para a IA ler depois)
+    # O texto completo da sentença (para a IA ler depois), comprimido com o
+    # dicionário compartilhado (ver compressao.py). As duas colunas são
+    # "deferred": listagens e consultas de entidade não as leem; só quem acessa
+    # `texto_decisao` dispara a leitura (uma query para as duas colunas).
+    texto_comprimido = deferred(Column(LargeBinary), group="texto")
+    # Coluna antiga, sem compressão. Fica NULL depois da migração 006.
+    texto_legado = deferred(Column("texto_decisao", Text), group="texto")
     resultado = Column(String)  # Ex: Procedente, Improcedente (Normalizado)
-    tema = Column(String)  # Ex: Responsabilidade Civil
+    # Desfecho de mérito lido dos movimentos do DataJud (TPU 219/220/221):
+    # "procedente", "parcial" ou "improcedente"; NULL se ainda não julgado
+    desfecho = Column(String)
+    tema = Column(String)  # Ex: Responsabilidade Civil (nome do assunto principal)
     data_decisao = Column(Date)
 
     juiz_id = Column(Integer, ForeignKey("juizes.id"))
@@ -54,10 +266,248 @@ class Decisao(Base):
     # Relação: Uma decisão pertence a um juiz
     juiz = relationship("Juiz", back_populates="decisoes")
 
+    @property
+    def texto_decisao(self):
+        if self.texto_comprimido is not None:
+            return compressao.descomprimir(self.texto_comprimido)
+        return self.texto_legado
+
+    @texto_decisao.setter
+    def texto_decisao(self, texto):
+        self.texto_comprimido = compressao.comprimir(texto)
+        self.texto_legado = None
+
+
+class Tema(Base):
+    """Assuntos da Tabela Processual Unificada (CNJ), pelo código; ver temas_cnj.py."""
+
+    __tablename__ = "temas"
+
+    codigo = Column(Integer, primary_key=True)  # Ex: 10433
+    nome = Column(String, index=True)  # Ex: Indenização por Dano Moral
+
+
+class DecisaoTema(Base):
+    """Todos os assuntos de cada decisão (o DataJud manda uma lista)."""
+
+    __tablename__ = "decisoes_temas"
+    __table_args__ = (
+        # Filtro por tema (/decisoes/?tema_codigo=) sem tocar em `decisoes`
+        Index("ix_decisoes_temas_tema", "tema_codigo", "decisao_id"),
+    )
+
+    decisao_id = Column(Integer, ForeignKey("decisoes.id"), primary_key=True)
+    tema_codigo = Column(Integer, ForeignKey("temas.codigo"), primary_key=True)
+    ordem = Column(Integer, default=0)  # posição em `assuntos` (0 = principal)
+
+
+class EstatisticaDecisao(Base):
+    """
+    Contagem de decisões por juiz/tema/resultado/mês, mantida pela ingestão e
+    pela classificação (ver estatisticas.py). O dashboard e a API leem estas
+    linhas em vez de varrer `decisoes`.
+    """
+
+    __tablename__ = "estatisticas_decisoes"
+    __table_args__ = (UniqueConstraint("juiz_id", "tema", "resultado", "mes"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    juiz_id = Column(Integer, ForeignKey("juizes.id"), index=True)
+    tema = Column(String)
+    resultado = Column(String)
+    mes = Column(String)  # Ex: "2023-07" ("s/d" quando a decisão não tem data)
+    total = Column(Integer, default=0)
+
+
+class ResumoBloco(Base):
+    """Cache dos resumos parciais do dossiê (etapa "map" do map-reduce).
+
+    Cada bloco agrupa decisões de um juiz por tema/período. A impressão digital
+    muda quando alguma decisão do bloco muda, e só então o bloco é resumido de novo.
+    """
+
+    __tablename__ = "resumos_blocos"
+    __table_args__ = (UniqueConstraint("juiz_id", "chave"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    juiz_id = Column(Integer, ForeignKey("juizes.id"), index=True)
+    chave = Column(String)  # Ex: "Dano Moral|2023|T2"
+    impressao_digital = Column(String)  # sha256 das decisões do bloco
+    n_decisoes = Column(Integer)
+    resumo = Column(Text)
+    atualizado_em = Column(DateTime)
+
+
+class EmbeddingDecisao(Base):
+    """Embedding (normalizado, float16) do tema + texto de cada decisão; ver aderencia.py.
+
+    `juiz_id` é repetido aqui para carregar a matriz de um juiz sem join.
+    """
+
+    __tablename__ = "embeddings_decisoes"
+
+    decisao_id = Column(Integer, ForeignKey("decisoes.id"), primary_key=True)
+    juiz_id = Column(Integer, ForeignKey("juizes.id"), index=True)
+    modelo = Column(String)  # ex: "all-MiniLM-L6-v2"
+    vetor = Column(LargeBinary)
+
+
+class CentroideJuiz(Base):
+    """Soma dos embeddings das decisões de cada juiz; o centroide é soma / n.
+
+    Mantida incrementalmente por aderencia.py a cada embedding gravado ou
+    apagado, para o ranking de todos os juízes de um tribunal (uma linha por juiz).
+    """
+
+    __tablename__ = "centroides_juizes"
+
+    juiz_id = Column(Integer, ForeignKey("juizes.id"), primary_key=True)
+    modelo = Column(String, primary_key=True)
+    soma = Column(LargeBinary)  # float64, para as subtrações não acumularem erro
+    n = Column(Integer, default=0)
+
+
+class ModeloDesfecho(Base):
+    """Regressão logística (softmax) do desfecho por juiz, serializada; ver modelo_desfecho.py."""
+
+    __tablename__ = "modelos_desfecho"
+
+    juiz_id = Column(Integer, ForeignKey("juizes.id"), primary_key=True)
+    modelo_embedding = Column(String)  # embeddings usados como variáveis
+    n_amostras = Column(Integer)  # decisões com desfecho usadas no treino
+    pesos = Column(LargeBinary)  # matriz (variáveis + 1) x classes, formato .npy
+    temas = Column(Text)  # JSON: tema -> contagem por classe (taxas por tema)
+    acuracia = Column(Float)  # no próprio treino (só para acompanhar)
+    treinado_em = Column(DateTime)
+
+
+class DicionarioCompressao(Base):
+    """Dicionários zlib treinados sobre os textos (ver compressao.py). Nunca
+    são apagados: cada texto comprimido guarda o id do dicionário que usou."""
+
+    __tablename__ = "dicionarios_compressao"
+
+    id = Column(Integer, primary_key=True)
+    dados = Column(LargeBinary)
+    amostras = Column(Integer)  # quantos textos entraram no treino
+    criado_em = Column(DateTime)
+
+
+class Tarefa(Base):
+    """Tarefa em segundo plano (clonagem, classificação, dossiê); ver fila_tarefas.py.
+
+    `chave` identifica o trabalho (ex: "clonar:TJSP:12345"): o índice único
+    parcial impede duas tarefas ativas (pendente/executando) com a mesma chave.
+    """
+
+    __tablename__ = "tarefas"
+    __table_args__ = (
+        # O worker pega a próxima por prioridade e ordem de chegada
+        Index("ix_tarefas_fila", "status", "prioridade", "id"),
+        Index(
+            "ux_tarefas_chave_ativa",
+            "chave",
+            unique=True,
+            sqlite_where=text("status IN ('pendente', 'executando')"),
+            postgresql_where=text("status IN ('pendente', 'executando')"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String)  # chave de fila_tarefas.EXECUTORES (ex: clonar)
+    chave = Column(String)
+    parametros = Column(Text)  # JSON
+    prioridade = Column(Integer, default=0)  # maior sai primeiro
+    status = Column(String, default="pendente")
+    progresso = Column(Float, default=0.0)  # 0..1
+    mensagem = Column(String)
+    resultado = Column(Text)  # JSON
+    tentativas = Column(Integer, default=0)
+    worker = Column(String)
+    criada_em = Column(DateTime)
+    iniciada_em = Column(DateTime)
+    concluida_em = Column(DateTime)
+    heartbeat_em = Column(DateTime)  # atualizado enquanto a tarefa roda
+
+
+class EstadoSistema(Base):
+    """Pares chave/valor de controle (ex: versão dos dados para invalidar caches)."""
+
+    __tablename__ = "estado_sistema"
+
+    chave = Column(String, primary_key=True)
+    valor = Column(Integer, default=0)
+
+
+class EventoDecisao(Base):
+    """Log de mudanças em `decisoes` (inserida, atualizada, etiqueta), gravado
+    na mesma transação da escrita e consumido por eventos.py."""
+
+    __tablename__ = "eventos_decisoes"
+    # Sem AUTOINCREMENT o SQLite reusa ids depois que o log é compactado, e os
+    # eventos novos cairiam abaixo dos checkpoints
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)  # ordem dos eventos (checkpoints)
+    tipo = Column(String)
+    decisao_id = Column(Integer, index=True)
+    juiz_id = Column(Integer)
+    criado_em = Column(DateTime)
+
+
+# Chave do contador incrementado a cada escrita de ingestão/classificação.
+# O dashboard usa esse número como parte da chave de cache (st.cache_data).
+CHAVE_VERSAO_DADOS = "versao_dados"
+# Contadores à parte para escritas que não mudam as decisões: embeddings e
+# centroides (caches de aderencia.py) e modelos de desfecho (modelo_desfecho.py).
+# Assim elas não invalidam o cache do dashboard inteiro.
+CHAVE_VERSAO_EMBEDDINGS = "versao_embeddings"
+CHAVE_VERSAO_MODELOS = "versao_modelos"
+
+
+def obter_versao(session, chave):
+    estado = session.get(EstadoSistema, chave)
+    return estado.valor if estado else 0
+
+
+def incrementar_versao(session, chave):
+    """Marca que o que `chave` versiona mudou. Chamar antes do commit da escrita."""
+    atualizados = (
+        session.query(EstadoSistema)
+        .filter(EstadoSistema.chave == chave)
+        .update({EstadoSistema.valor: EstadoSistema.valor + 1})
+    )
+    if not atualizados:
+        session.add(EstadoSistema(chave=chave, valor=1))
+
+
+def obter_versao_dados(session):
+    return obter_versao(session, CHAVE_VERSAO_DADOS)
+
+
+def incrementar_versao_dados(session):
+    """Marca que os dados mudaram. Deve ser chamada antes do commit da escrita."""
+    incrementar_versao(session, CHAVE_VERSAO_DADOS)
+
+
+def _buscar_dicionario(dicionario_id):
+    # Dicionário criado por outro processo depois que esta conexão foi aberta
+    with engine.connect() as conn:
+        return conn.execute(
+            select(DicionarioCompressao.dados).where(
+                DicionarioCompressao.id == dicionario_id
+            )
+        ).scalar()
+
+
+compressao.ao_faltar_dicionario = _buscar_dicionario
+
 
 # 3. Criação das tabelas
 # Este bloco cria o ficheiro do banco de dados automaticamente se ele não existir
 if __name__ == "__main__":
+    import migracoes
+
     print("A criar a base de dados do PRÓLOGOS...")
-    Base.metadata.create_all(bind=engine)
+    migracoes.atualizar_banco()
     print("Sucesso! O arquivo 'prologos_mvp.db' foi criado com as tabelas.")
@@ -0,0 +1,311 @@
+import hashlib
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database_models import SessionLocal, Decisao, Juiz, ResumoBloco
+
+# --- PARÂMETROS DO MAP-REDUCE ---
+# Até LIMIAR_HIERARQUICO decisões, tudo cabe num único prompt (modo simples).
+LIMIAR_HIERARQUICO = 80
+TAMANHO_MAX_BLOCO = 60  # decisões por bloco na etapa "map"
+MIN_DECISOES_TEMA = 5  # temas com menos decisões vão para o bloco "Outros temas"
+RESUMOS_POR_REDUCAO = 8  # quantos resumos parciais entram em cada chamada "reduce"
+MAX_CHARS_REDUCAO = 12000  # acima disso, a redução é feita em mais de um nível
+MAX_PARALELO = 4  # chamadas simultâneas ao LLM
+TENTATIVAS_LLM = 3
+
+CHAVE_DOSSIE_FINAL = "__dossie__"
+
+
+def _chamar_llm(client, modelo, prompt, temperatura=0.4):
+    """Chamada ao LLM com novas tentativas simples (ex: erro 429 do Groq)."""
+    ultimo_erro = None
+    for tentativa in range(TENTATIVAS_LLM):
+        try:
+            resp = client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=modelo,
+                temperature=temperatura,
+            )
+            return resp.choices[0].message.content
+        except Exception as e:
+            ultimo_erro = e
+            time.sleep(2**tentativa)
+    raise ultimo_erro
+
+
+def _linha_decisao(d):
+    data = d["data_decisao"].isoformat() if d["data_decisao"] else "s/d"
+    return f"- [{data}] Tema '{d['tema']}', Risco: {d['resultado']}"
+
+
+def _impressao_digital(decisoes):
+    h = hashlib.sha256()
+    for d in sorted(decisoes, key=lambda x: x["numero_processo"] or ""):
+        h.update(_linha_decisao(d).encode("utf-8"))
+        h.update((d["numero_processo"] or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+def _periodo(data, granularidade):
+    if data is None:
+        return "s/d"
+    if granularidade == "ano":
+        return f"{data.year}"
+    if granularidade == "trimestre":
+        return f"{data.year}|T{(data.month - 1) // 3 + 1}"
+    return f"{data.year}|{data.month:02d}"
+
+
+def dividir_em_blocos(decisoes):
+    """
+    Divide as decisões em blocos por tema e período (ano -> trimestre -> mês).
+
+    O período só é refinado quando o bloco passa de TAMANHO_MAX_BLOCO, assim a
+    chave de um bloco é estável: decisões novas só alteram os blocos do seu
+    tema/período, e os demais continuam a vir do cache.
+    """
+    freq_temas = Counter(d["tema"] for d in decisoes)
+    por_tema = defaultdict(list)
+    for d in decisoes:
+        tema = d["tema"] if freq_temas[d["tema"]] >= MIN_DECISOES_TEMA else None
+        por_tema[tema or "Outros temas"].append(d)
+
+    blocos = {}
+
+    def _particionar(prefixo, itens, niveis):
+        if len(itens) <= TAMANHO_MAX_BLOCO:
+            blocos[prefixo] = itens
+            return
+        if not niveis:
+            # Último recurso: fatias fixas em ordem cronológica
+            itens = sorted(
+                itens, key=lambda x: (str(x["data_decisao"]), x["numero_processo"])
+            )
+            for i in range(0, len(itens), TAMANHO_MAX_BLOCO):
+                blocos[f"{prefixo}|p{i // TAMANHO_MAX_BLOCO + 1}"] = itens[
+                    i : i + TAMANHO_MAX_BLOCO
+                ]
+            return
+        grupos = defaultdict(list)
+        for d in itens:
+            grupos[_periodo(d["data_decisao"], niveis[0])].append(d)
+        if len(grupos) == 1 and niveis[0] != "ano":
+            # Refinar mais não separa nada; vai direto para as fatias fixas
+            _particionar(prefixo, itens, [])
+            return
+        for periodo, grupo in grupos.items():
+            _particionar(f"{prefixo}|{periodo}", grupo, niveis[1:])
+
+    for tema, itens in por_tema.items():
+        _particionar(tema, itens, ["ano", "trimestre", "mes"])
+
+    return blocos
+
+
+def _prompt_bloco(juiz_nome, chave, decisoes):
+    linhas = "\n".join(_linha_decisao(d) for d in decisoes)
+    return f"""
+    ATUE COMO JURIMETRISTA. Resuma o padrão decisório do juiz {juiz_nome}
+    no recorte '{chave}' ({len(decisoes)} decisões).
+    DADOS:
+    {linhas}
+    SAÍDA: até 8 linhas com temas dominantes, distribuição de risco/resultado
+    e qualquer mudança de comportamento no período. Cite números.
+    """
+
+
+def _prompt_reducao(juiz_nome, resumos, final):
+    corpo = "\n\n".join(f"### {chave}\n{texto}" for chave, texto in resumos)
+    if final:
+        saida = (
+            "Perfil comportamental, principais focos, tendência (rígido/garantista)."
+        )
+    else:
+        saida = "Um resumo consolidado de até 15 linhas, preservando os números."
+    return f"""
+    ATUE COMO JURIMETRISTA. Crie um Perfil do juiz: {juiz_nome}.
+    Abaixo estão resumos parciais do histórico decisório, por tema e período.
+    RESUMOS:
+    {corpo}
+    SAÍDA: {saida}
+    """
+
+
+def _carregar_decisoes(session, juiz_id):
+    linhas = (
+        session.query(
+            Decisao.numero_processo,
+            Decisao.tema,
+            Decisao.resultado,
+            Decisao.data_decisao,
+        )
+        .filter(Decisao.juiz_id == juiz_id)
+        .all()
+    )
+    return [dict(linha._mapping) for linha in linhas]
+
+
+def _obter_cache(session, juiz_id):
+    return {
+        r.chave: r
+        for r in session.query(ResumoBloco).filter(ResumoBloco.juiz_id == juiz_id)
+    }
+
+
+def _gravar_cache(session, cache, juiz_id, chave, impressao, n, resumo):
+    registro = cache.get(chave)
+    if registro is None:
+        registro = ResumoBloco(juiz_id=juiz_id, chave=chave)
+        session.add(registro)
+        cache[chave] = registro
+    registro.impressao_digital = impressao
+    registro.n_decisoes = n
+    registro.resumo = resumo
+    registro.atualizado_em = datetime.utcnow()
+
+
+def invalidar(juizes):
+    """
+    Apaga o dossiê final em cache dos `juizes` (decisões novas ou
+    reclassificadas; ver eventos.py). Os resumos dos blocos ficam: a
+    impressão digital de cada um já diz se ele mudou.
+    """
+    session = SessionLocal()
+    try:
+        session.query(ResumoBloco).filter(
+            ResumoBloco.juiz_id.in_(list(juizes)),
+            ResumoBloco.chave == CHAVE_DOSSIE_FINAL,
+        ).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+def _reduzir(client, modelo, juiz_nome, resumos):
+    """Etapa "reduce", em vários níveis se os resumos não couberem num prompt."""
+    while (
+        len(resumos) > RESUMOS_POR_REDUCAO
+        and sum(len(t) for _, t in resumos) > MAX_CHARS_REDUCAO
+    ):
+        grupos = [
+            resumos[i : i + RESUMOS_POR_REDUCAO]
+            for i in range(0, len(resumos), RESUMOS_POR_REDUCAO)
+        ]
+        with ThreadPoolExecutor(max_workers=MAX_PARALELO) as pool:
+            textos = list(
+                pool.map(
+                    lambda g: _chamar_llm(
+                        client, modelo, _prompt_reducao(juiz_nome, g, final=False)
+                    ),
+                    grupos,
+                )
+            )
+        resumos = [(f"{g[0][0]} ... {g[-1][0]}", t) for g, t in zip(grupos, textos)]
+    return _chamar_llm(client, modelo, _prompt_reducao(juiz_nome, resumos, final=True))
+
+
+def gerar_dossie(juiz_id, client, modelo, ao_progresso=None):
+    """
+    Gera o Dossiê Decisório do juiz.
+
+    Juízes com histórico pequeno usam um único prompt. Acima de
+    LIMIAR_HIERARQUICO decisões o dossiê é hierárquico: as decisões são
+    divididas em blocos (tema/período), os blocos são resumidos em paralelo
+    e os resumos parciais são reduzidos ao perfil final. Resumos de blocos
+    inalterados (e o próprio dossiê final) vêm do cache `resumos_blocos`.
+
+    `ao_progresso(feitos, total, mensagem)` é opcional e serve para a UI.
+    """
+
+    def _progresso(feitos, total, msg):
+        if ao_progresso:
+            ao_progresso(feitos, total, msg)
+
+    session = SessionLocal()
+    try:
+        juiz = session.get(Juiz, juiz_id)
+        if not juiz:
+            raise ValueError(f"Juiz não encontrado: {juiz_id}")
+        juiz_nome = juiz.nome
+
+        decisoes = _carregar_decisoes(session, juiz.id)
+        cache = _obter_cache(session, juiz.id)
+
+        impressao_total = _impressao_digital(decisoes)
+        final = cache.get(CHAVE_DOSSIE_FINAL)
+        if final and final.impressao_digital == impressao_total:
+            _progresso(1, 1, "Dossiê sem alterações (cache).")
+            return final.resumo
+
+        if len(decisoes) <= LIMIAR_HIERARQUICO:
+            _progresso(0, 1, "Gerando dossiê...")
+            lista_txt = "\n".join(_linha_decisao(d) for d in decisoes)
+            dossie = _chamar_llm(
+                client,
+                modelo,
+                f"""
+                ATUE COMO JURIMETRISTA. Crie um Perfil do juiz: {juiz_nome}.
+                DADOS: {lista_txt}
+                SAÍDA: Perfil comportamental, principais focos, tendência (rígido/garantista).
+                """,
+            )
+        else:
+            blocos = dividir_em_blocos(decisoes)
+            resumos = {}
+            pendentes = []
+            for chave, itens in blocos.items():
+                impressao = _impressao_digital(itens)
+                registro = cache.get(chave)
+                if registro and registro.impressao_digital == impressao:
+                    resumos[chave] = registro.resumo
+                else:
+                    pendentes.append((chave, itens, impressao))
+
+            total = len(pendentes) + 1
+            _progresso(
+                0,
+                total,
+                f"{len(blocos)} blocos, {len(blocos) - len(pendentes)} em cache.",
+            )
+
+            def _resumir(item):
+                chave, itens, _ = item
+                return _chamar_llm(
+                    client, modelo, _prompt_bloco(juiz_nome, chave, itens)
+                )
+
+            with ThreadPoolExecutor(max_workers=MAX_PARALELO) as pool:
+                for feitos, (item, texto) in enumerate(
+                    zip(pendentes, pool.map(_resumir, pendentes)), start=1
+                ):
+                    chave, itens, impressao = item
+                    resumos[chave] = texto
+                    _gravar_cache(
+                        session, cache, juiz.id, chave, impressao, len(itens), texto
+                    )
+                    _progresso(feitos, total, f"Bloco resumido: {chave}")
+
+            # Blocos que deixaram de existir saem do cache
+            for chave in set(cache) - set(blocos) - {CHAVE_DOSSIE_FINAL}:
+                session.delete(cache.pop(chave))
+            session.commit()
+
+            dossie = _reduzir(client, modelo, juiz_nome, sorted(resumos.items()))
+            _progresso(total, total, "Dossiê consolidado.")
+
+        _gravar_cache(
+            session,
+            cache,
+            juiz.id,
+            CHAVE_DOSSIE_FINAL,
+            impressao_total,
+            len(decisoes),
+            dossie,
+        )
+        session.commit()
+        return dossie
+    finally:
+        session.close()
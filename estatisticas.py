@@ -0,0 +1,109 @@
+"""
+Tabela de resumo `estatisticas_decisoes` (contagens por juiz/tema/resultado/mês).
+
+A ingestão (salvar_lote) e a classificação (normalizar_processos) acumulam
+deltas num `Counter` e aplicam tudo de uma vez com `aplicar_deltas`, na mesma
+transação da escrita. Assim os agregados ficam sempre coerentes com `decisoes`
+e o dashboard lê O(juízes x temas) linhas em vez de varrer a tabela inteira.
+"""
+
+from collections import Counter
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database_models import SessionLocal, Decisao, EstatisticaDecisao
+
+MES_SEM_DATA = "s/d"
+
+
+def chave_estatistica(juiz_id, tema, resultado, data_decisao):
+    mes = data_decisao.strftime("%Y-%m") if data_decisao else MES_SEM_DATA
+    return (juiz_id, tema or "Geral", resultado or "Indefinido", mes)
+
+
+def novo_acumulador():
+    return Counter()
+
+
+def aplicar_deltas(session, deltas):
+    """Soma os deltas acumulados na tabela de resumo (upsert por chave)."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    dialeto = session.get_bind().dialect.name
+    insert = pg_insert if dialeto == "postgresql" else sqlite_insert
+    tabela = EstatisticaDecisao.__table__
+
+    for (juiz_id, tema, resultado, mes), delta in deltas.items():
+        stmt = insert(tabela).values(
+            juiz_id=juiz_id, tema=tema, resultado=resultado, mes=mes, total=delta
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["juiz_id", "tema", "resultado", "mes"],
+            set_={"total": tabela.c.total + delta},
+        )
+        session.execute(stmt)
+        if delta < 0:
+            # Linha zerada (ex: resultado reclassificado) não precisa ficar na
+            # tabela; a busca é pela chave única, só nas chaves que diminuíram
+            session.execute(
+                delete(tabela).where(
+                    tabela.c.juiz_id == juiz_id,
+                    tabela.c.tema == tema,
+                    tabela.c.resultado == resultado,
+                    tabela.c.mes == mes,
+                    tabela.c.total <= 0,
+                )
+            )
+
+
+def recalcular_estatisticas(session=None):
+    """Reconstrói a tabela inteira a partir de `decisoes` (backfill/manutenção)."""
+    propria = session is None
+    if propria:
+        session = SessionLocal()
+    try:
+        session.query(EstatisticaDecisao).delete(synchronize_session=False)
+        linhas = session.execute(
+            select(
+                Decisao.juiz_id,
+                Decisao.tema,
+                Decisao.resultado,
+                Decisao.data_decisao,
+            )
+        )
+        deltas = novo_acumulador()
+        for juiz_id, tema, resultado, data in linhas:
+            deltas[chave_estatistica(juiz_id, tema, resultado, data)] += 1
+        aplicar_deltas(session, deltas)
+        if propria:
+            session.commit()
+        return sum(deltas.values())
+    finally:
+        if propria:
+            session.close()
+
+
+def estatisticas_vazias(session):
+    """True se há decisões mas a tabela de resumo ainda não foi populada."""
+    tem_resumo = session.query(EstatisticaDecisao.id).first() is not None
+    tem_decisoes = session.query(Decisao.id).first() is not None
+    return tem_decisoes and not tem_resumo
+
+
+def totais_por_resultado(session):
+    linhas = (
+        session.query(EstatisticaDecisao.resultado, func.sum(EstatisticaDecisao.total))
+        .group_by(EstatisticaDecisao.resultado)
+        .all()
+    )
+    return {resultado: int(total) for resultado, total in linhas}
+
+
+if __name__ == "__main__":
+    print("📊 Recalculando estatísticas a partir de 'decisoes'...")
+    total = recalcular_estatisticas()
+    print(f"✅ {total} decisões agregadas.")
@@ -0,0 +1,238 @@
+"""
+Log de mudanças em `decisoes` e o processamento incremental do que deriva delas.
+
+`salvar_lote` e `normalizar_processos` gravam um evento por decisão mudada
+(INSERIDA, ATUALIZADA: texto ou desfecho novo, ETIQUETA: classificação
+mudou) em `eventos_decisoes`, na mesma transação da escrita. `processar` lê
+o log em ordem e entrega os eventos a cada consumidor, que só trabalha nas
+decisões e juízes afetados:
+
+- embeddings: calcula os embeddings das decisões inseridas/atualizadas
+  (aderencia.indexar_pendentes com `ids`; os centroides seguem junto);
+- modelo_desfecho: retreina só os juízes afetados;
+- dossies: invalida o dossiê final em cache dos juízes afetados.
+
+Cada consumidor tem o seu checkpoint (último evento processado) em
+`estado_sistema` ("eventos:<consumidor>"), gravado depois do trabalho: se o
+processo cair no meio, os eventos voltam a ser entregues (os consumidores
+são idempotentes). Eventos já vistos por todos os consumidores são apagados;
+os ids nunca são reaproveitados (AUTOINCREMENT no SQLite, migração 009).
+
+Só eventos com mais de JANELA_EVENTOS_S são entregues. Os escritores gravam
+o log depois de `incrementar_versao_dados`, com a linha da versão travada
+até o commit, então os ids já saem na ordem dos commits; a janela é a margem
+para que um checkpoint nunca passe de um id ainda não confirmado (no
+Postgres o id é reservado antes do commit).
+
+A tabela de resumo (estatisticas.py), o índice textual (busca.py) e os
+centroides não passam por aqui: a própria escrita já os atualiza.
+
+Uso:
+    python eventos.py            # processa os eventos pendentes
+    python eventos.py status     # checkpoints e eventos pendentes
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from database_models import SessionLocal, EstadoSistema, EventoDecisao
+
+INSERIDA = "inserida"
+ATUALIZADA = "atualizada"
+ETIQUETA = "etiqueta"
+LOTE_EVENTOS = 5000
+JANELA_EVENTOS_S = 5.0
+
+# nome -> função(eventos [(tipo, decisao_id, juiz_id)], ao_progresso), em ordem
+# (o modelo de desfecho usa os embeddings calculados antes)
+CONSUMIDORES = {}
+
+
+def consumidor(nome):
+    def registrar(funcao):
+        CONSUMIDORES[nome] = funcao
+        return funcao
+
+    return registrar
+
+
+def registrar(session, eventos):
+    """Grava os eventos [(tipo, decisao_id, juiz_id)] na transação da escrita."""
+    if not eventos:
+        return
+    agora = datetime.utcnow()
+    session.execute(
+        insert(EventoDecisao),
+        [
+            {
+                "tipo": tipo,
+                "decisao_id": decisao_id,
+                "juiz_id": juiz_id,
+                "criado_em": agora,
+            }
+            for tipo, decisao_id, juiz_id in eventos
+        ],
+    )
+
+
+# --- CHECKPOINTS ---
+
+
+def _chave(nome):
+    return f"eventos:{nome}"
+
+
+def _checkpoint(session, nome):
+    estado = session.get(EstadoSistema, _chave(nome))
+    return estado.valor if estado else 0
+
+
+def _avancar(session, nome, ultimo_id):
+    estado = session.get(EstadoSistema, _chave(nome))
+    if estado is None:
+        session.add(EstadoSistema(chave=_chave(nome), valor=ultimo_id))
+    else:
+        estado.valor = ultimo_id
+    session.commit()
+
+
+# --- PROCESSAMENTO ---
+
+
+def _aguardar_janela(session, janela_s):
+    """Espera os eventos já gravados saírem da janela (a tarefa vem logo após)."""
+    ultimo = session.scalar(select(func.max(EventoDecisao.criado_em)))
+    session.commit()
+    if ultimo is not None:
+        falta = (ultimo - datetime.utcnow()).total_seconds() + janela_s
+        time.sleep(min(max(falta, 0), janela_s))
+
+
+def processar(
+    consumidores=None, lote=LOTE_EVENTOS, ao_progresso=None, janela_s=JANELA_EVENTOS_S
+):
+    """
+    Entrega os eventos pendentes a cada consumidor (todos, ou só os pedidos),
+    em lotes de `lote`, avançando o checkpoint a cada lote. Devolve
+    {consumidor: eventos processados}.
+    """
+    ao_progresso = ao_progresso or (lambda feitos, total, msg: None)
+    nomes = [n for n in CONSUMIDORES if consumidores is None or n in consumidores]
+    processados = {}
+    session = SessionLocal()
+    try:
+        _aguardar_janela(session, janela_s)
+        for passo, nome in enumerate(nomes):
+            processados[nome] = 0
+            while True:
+                inicio = _checkpoint(session, nome)
+                corte = datetime.utcnow() - timedelta(seconds=janela_s)
+                eventos = session.execute(
+                    select(
+                        EventoDecisao.id,
+                        EventoDecisao.tipo,
+                        EventoDecisao.decisao_id,
+                        EventoDecisao.juiz_id,
+                        EventoDecisao.criado_em,
+                    )
+                    .where(EventoDecisao.id > inicio)
+                    .order_by(EventoDecisao.id)
+                    .limit(lote)
+                ).all()
+                # Para no primeiro evento ainda dentro da janela: nada depois
+                # dele é entregue nem passa pelo checkpoint nesta rodada
+                recentes = [i for i, e in enumerate(eventos) if e.criado_em > corte]
+                if recentes:
+                    eventos = eventos[: recentes[0]]
+                session.commit()  # não segura a leitura durante o consumidor
+                if not eventos:
+                    break
+                CONSUMIDORES[nome](
+                    [
+                        (tipo, decisao_id, juiz_id)
+                        for _id, tipo, decisao_id, juiz_id, _em in eventos
+                    ],
+                    ao_progresso,
+                )
+                _avancar(session, nome, eventos[-1].id)
+                processados[nome] += len(eventos)
+                if recentes:
+                    break
+            ao_progresso(
+                passo + 1, len(nomes), f"🔁 {nome}: {processados[nome]} eventos"
+            )
+        _compactar(session)
+        return processados
+    finally:
+        session.close()
+
+
+def _compactar(session):
+    """Apaga os eventos que todos os consumidores já processaram."""
+    vistos = min(_checkpoint(session, nome) for nome in CONSUMIDORES)
+    session.execute(delete(EventoDecisao).where(EventoDecisao.id <= vistos))
+    session.commit()
+
+
+def pendentes(session):
+    """{consumidor: eventos ainda não processados}."""
+    return {
+        nome: session.scalar(
+            select(func.count()).where(EventoDecisao.id > _checkpoint(session, nome))
+        )
+        for nome in CONSUMIDORES
+    }
+
+
+# --- CONSUMIDORES ---
+
+
+@consumidor("embeddings")
+def _embeddings(eventos, ao_progresso):
+    import aderencia
+
+    ids = sorted({d for tipo, d, _j in eventos if tipo in (INSERIDA, ATUALIZADA)})
+    if ids:
+        aderencia.indexar_pendentes(ids=ids, ao_progresso=ao_progresso)
+
+
+@consumidor("modelo_desfecho")
+def _modelo_desfecho(eventos, ao_progresso):
+    import modelo_desfecho
+
+    juizes = sorted({j for _t, _d, j in eventos if j is not None})
+    # Inserções mudam a contagem de rotuladas (o treino já percebe); desfecho
+    # ou etiqueta novos mudam os dados sem mudar a contagem
+    retreinar = {j for tipo, _d, j in eventos if tipo in (ATUALIZADA, ETIQUETA)}
+    if juizes:
+        modelo_desfecho.treinar(
+            juizes=juizes, retreinar=retreinar, ao_progresso=ao_progresso
+        )
+
+
+@consumidor("dossies")
+def _dossies(eventos, ao_progresso):
+    import dossie
+
+    # O texto não entra no dossiê: só inserções e etiquetas o invalidam
+    juizes = {j for tipo, _d, j in eventos if tipo in (INSERIDA, ETIQUETA)}
+    if juizes:
+        dossie.invalidar(juizes)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        session = SessionLocal()
+        try:
+            for nome, n in pendentes(session).items():
+                ponto = _checkpoint(session, nome)
+                print(f"{nome:<16} checkpoint {ponto:>8}  {n} pendentes")
+        finally:
+            session.close()
+    else:
+        print("🔁 Processando eventos de decisões...")
+        feitos = processar(ao_progresso=lambda feitos, total, msg: print(f"   {msg}"))
+        print(f"✅ {sum(feitos.values())} eventos processados.")
@@ -0,0 +1,105 @@
+"""
+Serialização em streaming das exportações da API (NDJSON e CSV).
+
+As linhas são lidas com `AsyncSession.stream` + `yield_per` (cursor do lado do
+servidor no PostgreSQL; leitura incremental no SQLite) e escritas em blocos de
+LINHAS_POR_BLOCO, opcionalmente comprimidos em gzip de forma incremental.
+"""
+
+import csv
+import io
+import zlib
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:  # serialização mais lenta, mas funciona sem o orjson
+    orjson = None
+    import json
+
+LINHAS_POR_BLOCO = 1000
+
+TIPOS_MIME = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_padrao(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _linhas_ndjson(linhas, campos):
+    if orjson is not None:
+        return b"".join(
+            orjson.dumps(dict(zip(campos, linha)), option=orjson.OPT_APPEND_NEWLINE)
+            for linha in linhas
+        )
+    return "".join(
+        json.dumps(dict(zip(campos, linha)), default=_json_padrao, ensure_ascii=False)
+        + "\n"
+        for linha in linhas
+    ).encode("utf-8")
+
+
+def _linhas_csv(linhas, campos, cabecalho):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    if cabecalho:
+        escritor.writerow(campos)
+    escritor.writerows(linhas)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _converter(bloco, campos, conversores):
+    indices = [(campos.index(c), f) for c, f in conversores.items() if c in campos]
+    if not indices:
+        return bloco
+    linhas = []
+    for linha in bloco:
+        linha = list(linha)
+        for i, funcao in indices:
+            linha[i] = funcao(linha[i])
+        linhas.append(linha)
+    return linhas
+
+
+async def gerar_exportacao(
+    fabrica_sessao, query, campos, formato, comprimir=False, conversores=None
+):
+    """
+    Gerador assíncrono de bytes para um StreamingResponse.
+
+    A sessão é aberta aqui dentro (e não via Depends), para que continue viva
+    enquanto a resposta é transmitida. `conversores` mapeia campo -> função
+    aplicada a cada valor (ex: descomprimir o texto).
+    """
+    compressor = zlib.compressobj(wbits=31) if comprimir else None  # 31 = gzip
+
+    def _saida(dados):
+        return compressor.compress(dados) if compressor else dados
+
+    primeiro = True
+    async with fabrica_sessao() as db:
+        resultado = await db.stream(query.execution_options(yield_per=LINHAS_POR_BLOCO))
+        async for bloco in resultado.partitions(LINHAS_POR_BLOCO):
+            if conversores:
+                bloco = _converter(bloco, campos, conversores)
+            if formato == "csv":
+                dados = _linhas_csv(bloco, campos, cabecalho=primeiro)
+            else:
+                dados = _linhas_ndjson(bloco, campos)
+            primeiro = False
+            saida = _saida(dados)
+            if saida:
+                yield saida
+
+    if formato == "csv" and primeiro:
+        # Exportação vazia: ainda assim devolve o cabeçalho
+        saida = _saida(_linhas_csv([], campos, cabecalho=True))
+        if saida:
+            yield saida
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,172 @@
+"""
+Extração de texto de petições em PDF: preguiçosa e com cache.
+
+O analisador só usa os primeiros LIMITE_CARACTERES da petição, então as
+páginas são extraídas em ordem e a leitura para assim que o limite é
+alcançado: numa petição de 300 páginas, normalmente só as 2-3 primeiras são
+tocadas. Por isso não há pool de processos por página: subir os processos
+custa mais que ler essas poucas páginas. O paralelismo fica num PDF por
+processo, na análise em lote (analise_lote.py, com MAX_PROCESSOS; o pypdf é
+Python puro, então threads não ajudariam por causa do GIL).
+
+O resultado fica em cache pelo sha256 do conteúdo do arquivo, em memória
+(os reruns do Streamlit não reextraem nada). O texto das petições é
+sigiloso, então a cópia em disco, que sobrevive a reinícios do app, só
+existe se PROLOGOS_CACHE_PDF_DIR estiver definido; lá os arquivos expiram
+depois de CACHE_DISCO_MAX_DIAS e os mais antigos saem quando a pasta passa
+de CACHE_DISCO_MAX_MB.
+
+Páginas digitalizadas (só imagem) não têm camada de texto e voltam vazias;
+`paginas_sem_texto` permite ao app avisar que a petição precisa de OCR (e,
+com limite, a leitura desiste depois de PAGINAS_VAZIAS_PARA_DESISTIR páginas
+vazias seguidas no início do arquivo).
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+
+from pypdf import PdfReader
+
+LIMITE_CARACTERES = 6000
+# Com limite, se as primeiras páginas não têm texto o PDF é digitalizado:
+# não adianta percorrer as outras centenas de páginas
+PAGINAS_VAZIAS_PARA_DESISTIR = 10
+MAX_PROCESSOS = min(4, os.cpu_count() or 1)  # pool da análise em lote
+CACHE_DIR = os.getenv("PROLOGOS_CACHE_PDF_DIR")  # None: só em memória
+CACHE_DISCO_MAX_DIAS = float(os.getenv("PROLOGOS_CACHE_PDF_DIAS", "7"))
+CACHE_DISCO_MAX_MB = float(os.getenv("PROLOGOS_CACHE_PDF_MAX_MB", "100"))
+CACHE_MEMORIA_ITENS = 32
+
+_cache = OrderedDict()  # (sha256, limite) -> resultado
+
+
+def _ler(dados):
+    return PdfReader(io.BytesIO(dados))
+
+
+def iterar_paginas(leitor):
+    """Texto de cada página, uma por vez (nada é extraído antes de ser pedido)."""
+    for pagina in leitor.pages:
+        yield pagina.extract_text() or ""
+
+
+# --- CACHE ---
+
+
+def _arquivo_cache(sha256, limite):
+    return os.path.join(CACHE_DIR, f"{sha256}-{limite or 'tudo'}.json")
+
+
+def _ler_cache(sha256, limite):
+    chave = (sha256, limite)
+    if chave in _cache:
+        _cache.move_to_end(chave)
+        return _cache[chave]
+    if not CACHE_DIR:
+        return None
+    arquivo = _arquivo_cache(sha256, limite)
+    try:
+        if time.time() - os.path.getmtime(arquivo) > CACHE_DISCO_MAX_DIAS * 86400:
+            os.remove(arquivo)
+            return None
+        with open(arquivo, encoding="utf-8") as f:
+            resultado = json.load(f)
+        os.utime(arquivo)  # a poda tira primeiro os menos usados
+    except (OSError, json.JSONDecodeError):
+        return None
+    _guardar_memoria(chave, resultado)
+    return resultado
+
+
+def _guardar_memoria(chave, resultado):
+    _cache[chave] = resultado
+    _cache.move_to_end(chave)
+    while len(_cache) > CACHE_MEMORIA_ITENS:
+        _cache.popitem(last=False)
+
+
+def _gravar_cache(sha256, limite, resultado):
+    _guardar_memoria((sha256, limite), resultado)
+    if not CACHE_DIR:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temporario = f"{_arquivo_cache(sha256, limite)}.tmp-{os.getpid()}"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False)
+        os.replace(temporario, _arquivo_cache(sha256, limite))
+        _podar_disco()
+    except OSError:
+        pass  # disco só de leitura (ex: deploy): fica o cache em memória
+
+
+def _podar_disco():
+    """Apaga os arquivos expirados e, acima do limite de tamanho, os mais antigos."""
+    validade = time.time() - CACHE_DISCO_MAX_DIAS * 86400
+    arquivos = []
+    for entrada in os.scandir(CACHE_DIR):
+        if not entrada.name.endswith(".json"):
+            continue
+        info = entrada.stat()
+        if info.st_mtime < validade:
+            os.remove(entrada.path)
+        else:
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+    sobra = (
+        sum(tamanho for _m, tamanho, _c in arquivos) - CACHE_DISCO_MAX_MB * 1024 * 1024
+    )
+    for _m, tamanho, caminho in sorted(arquivos):
+        if sobra <= 0:
+            break
+        os.remove(caminho)
+        sobra -= tamanho
+
+
+# --- API ---
+
+
+def extrair_texto(dados, limite=LIMITE_CARACTERES, usar_cache=True):
+    """
+    Extrai o texto do PDF (`dados` em bytes) até `limite` caracteres
+    (None = documento inteiro). Devolve um dict:
+
+        texto, sha256, paginas (total), paginas_lidas, paginas_sem_texto,
+        do_cache (True se veio do cache)
+    """
+    sha256 = hashlib.sha256(dados).hexdigest()
+    if usar_cache:
+        resultado = _ler_cache(sha256, limite)
+        if resultado is not None:
+            return {**resultado, "do_cache": True}
+
+    leitor = _ler(dados)
+    partes = []
+    tamanho = 0
+    lidas = 0
+    sem_texto = 0
+    for texto in iterar_paginas(leitor):
+        lidas += 1
+        if not texto.strip():
+            sem_texto += 1
+        partes.append(texto)
+        tamanho += len(texto)
+        if limite is not None and (
+            tamanho >= limite or (sem_texto == lidas == PAGINAS_VAZIAS_PARA_DESISTIR)
+        ):
+            break
+
+    texto = "".join(partes)
+    resultado = {
+        "texto": texto[:limite] if limite is not None else texto,
+        "sha256": sha256,
+        "paginas": len(leitor.pages),
+        "paginas_lidas": lidas,
+        "paginas_sem_texto": sem_texto,
+    }
+    if usar_cache:
+        _gravar_cache(sha256, limite, resultado)
+    return {**resultado, "do_cache": False}
@@ -0,0 +1,487 @@
+"""
+Fila de tarefas em segundo plano, guardada no banco (tabela `tarefas`).
+
+O app, a API e a linha de comando só enfileiram; um ou mais workers
+(`python fila_tarefas.py`) executam. Assim clonagens, reclassificações,
+dossiês e análises de petições em lote não prendem a sessão do Streamlit (nem
+a requisição HTTP) e não se perdem se o navegador fechar: a tarefa fica no
+banco até terminar.
+
+- Deduplicação: cada tarefa tem uma `chave` (ex: "clonar:TJSP:12345"). Pedir
+  de novo um trabalho que já está pendente/executando devolve a tarefa existente.
+- Prioridade: a maior sai primeiro (clonagem, que o usuário está esperando,
+  passa na frente da reclassificação em massa).
+- Sobrevive a reinícios: o worker grava um heartbeat enquanto executa; tarefas
+  "executando" sem heartbeat há TIMEOUT_HEARTBEAT_S voltam para a fila (até
+  MAX_TENTATIVAS vezes).
+- Progresso: os executores recebem `ao_progresso(feitos, total, msg)`; o app e
+  a API (/tarefas/{id} e o stream /tarefas/{id}/eventos) leem `progresso` e
+  `mensagem`.
+
+Uso:
+    python fila_tarefas.py                        # worker (fica rodando)
+    python fila_tarefas.py --uma                  # esvazia a fila e sai
+    python fila_tarefas.py enfileirar classificar
+    python fila_tarefas.py enfileirar eventos
+    python fila_tarefas.py enfileirar embeddings
+    python fila_tarefas.py enfileirar modelo_desfecho
+    python fila_tarefas.py status
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from database_models import SessionLocal, EstadoSistema, Tarefa
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+ATIVAS = (PENDENTE, EXECUTANDO)
+
+PRIORIDADES = {
+    "clonar": 10,
+    "dossie": 5,
+    "analisar_peticoes": 5,
+    "eventos": 1,
+    "embeddings": 1,
+    "modelo_desfecho": 1,
+    "classificar": 0,
+}
+MAX_TENTATIVAS = 3
+INTERVALO_POLL_S = 1.0
+INTERVALO_HEARTBEAT_S = 10
+TIMEOUT_HEARTBEAT_S = 60
+CHAVE_WORKER_VISTO = "fila:worker_visto_em"  # em estado_sistema (epoch)
+CHAVE_EVENTOS = "eventos:processar"
+CHAVE_EMBEDDINGS = "embeddings:pendentes"
+CHAVE_MODELO_DESFECHO = "modelo_desfecho:pendentes"
+
+# tipo -> função(parametros, ao_progresso) -> resultado (dict serializável)
+EXECUTORES = {}
+
+
+def executor(tipo):
+    def registrar(funcao):
+        EXECUTORES[tipo] = funcao
+        return funcao
+
+    return registrar
+
+
+# --- ENFILEIRAR E CONSULTAR ---
+
+
+def enfileirar(tipo, parametros=None, chave=None, prioridade=None):
+    """
+    Cria a tarefa e devolve (id, nova). Se já houver uma tarefa ativa com a
+    mesma chave, devolve o id dela e nova=False.
+    """
+    chave = chave or tipo
+    session = SessionLocal()
+    try:
+        existente = _tarefa_ativa(session, chave)
+        if existente:
+            return existente.id, False
+        tarefa = Tarefa(
+            tipo=tipo,
+            chave=chave,
+            parametros=json.dumps(parametros or {}),
+            prioridade=PRIORIDADES.get(tipo, 0) if prioridade is None else prioridade,
+            status=PENDENTE,
+            progresso=0.0,
+            mensagem="Na fila",
+            tentativas=0,
+            criada_em=datetime.utcnow(),
+        )
+        session.add(tarefa)
+        try:
+            session.commit()
+        except IntegrityError:
+            # Outro processo enfileirou a mesma chave entre a checagem e o insert
+            session.rollback()
+            return _tarefa_ativa(session, chave).id, False
+        return tarefa.id, True
+    finally:
+        session.close()
+
+
+def _tarefa_ativa(session, chave):
+    return (
+        session.query(Tarefa)
+        .filter(Tarefa.chave == chave, Tarefa.status.in_(ATIVAS))
+        .first()
+    )
+
+
+def como_dict(tarefa):
+    return {
+        "id": tarefa.id,
+        "tipo": tarefa.tipo,
+        "chave": tarefa.chave,
+        "status": tarefa.status,
+        "prioridade": tarefa.prioridade,
+        "progresso": tarefa.progresso or 0.0,
+        "mensagem": tarefa.mensagem,
+        "resultado": json.loads(tarefa.resultado) if tarefa.resultado else None,
+        "tentativas": tarefa.tentativas,
+        "criada_em": tarefa.criada_em,
+        "iniciada_em": tarefa.iniciada_em,
+        "concluida_em": tarefa.concluida_em,
+    }
+
+
+def obter_tarefa(tarefa_id, session=None):
+    """Estado atual da tarefa (dict) ou None."""
+    propria = session is None
+    session = session or SessionLocal()
+    try:
+        tarefa = session.get(Tarefa, tarefa_id)
+        return como_dict(tarefa) if tarefa else None
+    finally:
+        if propria:
+            session.close()
+
+
+def worker_ativo(session=None):
+    """Algum worker consultou a fila nos últimos TIMEOUT_HEARTBEAT_S segundos?"""
+    propria = session is None
+    session = session or SessionLocal()
+    try:
+        estado = session.get(EstadoSistema, CHAVE_WORKER_VISTO)
+        return bool(estado) and time.time() - estado.valor < TIMEOUT_HEARTBEAT_S
+    finally:
+        if propria:
+            session.close()
+
+
+# --- EXECUÇÃO ---
+
+
+def _atualizar(tarefa_id, **campos):
+    """Grava campos da tarefa numa transação curta (e renova o heartbeat)."""
+    session = SessionLocal()
+    try:
+        session.execute(
+            update(Tarefa)
+            .where(Tarefa.id == tarefa_id)
+            .values(heartbeat_em=datetime.utcnow(), **campos)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def _devolver_orfas(session):
+    """Tarefas "executando" cujo worker morreu voltam para a fila (ou falham)."""
+    limite = datetime.utcnow() - timedelta(seconds=TIMEOUT_HEARTBEAT_S)
+    orfas = (
+        session.query(Tarefa)
+        .filter(Tarefa.status == EXECUTANDO, Tarefa.heartbeat_em < limite)
+        .all()
+    )
+    for tarefa in orfas:
+        if tarefa.tentativas >= MAX_TENTATIVAS:
+            tarefa.status = FALHOU
+            tarefa.mensagem = "Worker interrompido (tentativas esgotadas)"
+            tarefa.concluida_em = datetime.utcnow()
+        else:
+            tarefa.status = PENDENTE
+            tarefa.mensagem = "Reenfileirada após interrupção do worker"
+    session.commit()
+    return len(orfas)
+
+
+def _reservar_por_id(session, tarefa_id, worker):
+    """
+    Marca a tarefa como "executando" se ela ainda estiver pendente. O UPDATE
+    condicional garante que dois workers nunca peguem a mesma tarefa.
+    """
+    agora = datetime.utcnow()
+    reservada = session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == tarefa_id, Tarefa.status == PENDENTE)
+        .values(
+            status=EXECUTANDO,
+            worker=worker,
+            iniciada_em=agora,
+            heartbeat_em=agora,
+            tentativas=Tarefa.tentativas + 1,
+            mensagem="Iniciando",
+        )
+    ).rowcount
+    session.commit()
+    if not reservada:
+        return None
+    tarefa = session.get(Tarefa, tarefa_id)
+    session.expunge(tarefa)
+    return tarefa
+
+
+def _reservar(session, worker):
+    """Pega a próxima tarefa pendente (maior prioridade, depois a mais antiga)."""
+    candidatas = (
+        session.query(Tarefa.id)
+        .filter(Tarefa.status == PENDENTE)
+        .order_by(Tarefa.prioridade.desc(), Tarefa.id)
+        .limit(5)
+        .all()
+    )
+    for (tarefa_id,) in candidatas:
+        tarefa = _reservar_por_id(session, tarefa_id, worker)
+        if tarefa:
+            return tarefa
+    return None
+
+
+def executar_tarefa(tarefa, ao_progresso=None):
+    """
+    Roda o executor da tarefa (já reservada), com heartbeat em paralelo, e
+    grava o resultado. `ao_progresso` recebe também os eventos (uso inline).
+    """
+    parar = threading.Event()
+
+    def _heartbeat():
+        while not parar.wait(INTERVALO_HEARTBEAT_S):
+            _atualizar(tarefa.id)
+
+    def _ao_progresso(feitos, total, msg):
+        _atualizar(tarefa.id, progresso=feitos / max(total, 1), mensagem=msg)
+        if ao_progresso:
+            ao_progresso(feitos, total, msg)
+
+    batimento = threading.Thread(target=_heartbeat, daemon=True)
+    batimento.start()
+    try:
+        funcao = EXECUTORES[tarefa.tipo]
+        resultado = funcao(json.loads(tarefa.parametros or "{}"), _ao_progresso)
+        # Executores que devolvem {"sucesso": False, ...} contam como falha
+        sucesso = not (
+            isinstance(resultado, dict) and resultado.get("sucesso") is False
+        )
+        _atualizar(
+            tarefa.id,
+            status=CONCLUIDA if sucesso else FALHOU,
+            progresso=1.0 if sucesso else tarefa.progresso,
+            mensagem=(resultado or {}).get("msg")
+            or ("Concluída" if sucesso else "Falhou"),
+            resultado=json.dumps(resultado, default=str),
+            concluida_em=datetime.utcnow(),
+        )
+    except Exception as erro:
+        _atualizar(
+            tarefa.id,
+            status=FALHOU,
+            mensagem=f"Erro: {erro}",
+            concluida_em=datetime.utcnow(),
+        )
+    finally:
+        parar.set()
+
+
+def executar_agora(tarefa_id, ao_progresso=None):
+    """
+    Executa a tarefa no processo atual, para quando não há worker rodando
+    (ex: deploy só com o Streamlit). Devolve o estado final (dict). Se ela
+    já está executando, só devolve o estado.
+    """
+    session = SessionLocal()
+    try:
+        # Sem worker, ninguém mais devolve à fila as execuções inline que
+        # morreram com o processo (ex: Streamlit reiniciado no meio)
+        _devolver_orfas(session)
+        tarefa = _reservar_por_id(session, tarefa_id, "inline")
+    finally:
+        session.close()
+    if tarefa:
+        executar_tarefa(tarefa, ao_progresso)
+    return obter_tarefa(tarefa_id)
+
+
+def _marcar_worker_visto(session):
+    estado = session.get(EstadoSistema, CHAVE_WORKER_VISTO)
+    if estado is None:
+        session.add(EstadoSistema(chave=CHAVE_WORKER_VISTO, valor=int(time.time())))
+    else:
+        estado.valor = int(time.time())
+    session.commit()
+
+
+def rodar_worker(nome=None, ate_esvaziar=False):
+    nome = nome or f"{socket.gethostname()}:{os.getpid()}"
+    print(f"👷 Worker {nome} aguardando tarefas...")
+    ultimo_sinal = 0.0
+    while True:
+        session = SessionLocal()
+        try:
+            if time.time() - ultimo_sinal >= INTERVALO_HEARTBEAT_S:
+                _marcar_worker_visto(session)
+                if _devolver_orfas(session):
+                    print("♻️ Tarefas interrompidas voltaram para a fila.")
+                ultimo_sinal = time.time()
+            tarefa = _reservar(session, nome)
+        finally:
+            session.close()
+
+        if tarefa:
+            print(f"▶️ Tarefa #{tarefa.id} ({tarefa.chave})")
+            executar_tarefa(tarefa)
+            print(f"⏹️ Tarefa #{tarefa.id}: {obter_tarefa(tarefa.id)['status']}")
+        elif ate_esvaziar:
+            return
+        else:
+            time.sleep(INTERVALO_POLL_S)
+
+
+# --- EXECUTORES ---
+
+
+@executor("clonar")
+def _clonar(parametros, ao_progresso):
+    import ingestor_datajud
+
+    resultado = ingestor_datajud.clonar_vara(parametros["vara"], ao_progresso)
+    if resultado["sucesso"]:
+        # Embeddings, modelos e dossiês das decisões novas, sem atrasar a clonagem
+        enfileirar("eventos", chave=CHAVE_EVENTOS)
+    return resultado
+
+
+@executor("classificar")
+def _classificar(parametros, ao_progresso):
+    import analise_juridica
+
+    ao_progresso(0, 1, "Classificando decisões...")
+    alterados = analise_juridica.normalizar_processos(ids=parametros.get("ids"))
+    if alterados:
+        enfileirar("eventos", chave=CHAVE_EVENTOS)
+    return {"sucesso": True, "msg": f"{alterados} decisões reclassificadas"}
+
+
+@executor("eventos")
+def _eventos(parametros, ao_progresso):
+    import eventos
+    import snapshot_analitico
+
+    processados = eventos.processar(ao_progresso=ao_progresso)
+    if any(processados.values()) and snapshot_analitico.ler_metadados():
+        # Só atualiza um snapshot que já foi gerado (python snapshot_analitico.py)
+        ao_progresso(0, 1, "🗂️ Atualizando o snapshot analítico...")
+        snapshot_analitico.gerar_snapshot()
+    return {
+        "sucesso": True,
+        "msg": f"{max(processados.values(), default=0)} eventos processados",
+        "consumidores": processados,
+    }
+
+
+@executor("embeddings")
+def _embeddings(parametros, ao_progresso):
+    import aderencia
+
+    ao_progresso(0, 1, "Calculando embeddings...")
+    gravados = aderencia.indexar_pendentes(
+        juizes=parametros.get("juizes"), ao_progresso=ao_progresso
+    )
+    if gravados:
+        # Decisões novas com embedding: o modelo de desfecho pode ser retreinado
+        enfileirar("modelo_desfecho", chave=CHAVE_MODELO_DESFECHO)
+    return {"sucesso": True, "msg": f"{gravados} embeddings calculados"}
+
+
+@executor("modelo_desfecho")
+def _modelo_desfecho(parametros, ao_progresso):
+    import modelo_desfecho
+
+    ao_progresso(0, 1, "Treinando modelos de desfecho...")
+    treinados = modelo_desfecho.treinar(
+        juizes=parametros.get("juizes"), ao_progresso=ao_progresso
+    )
+    return {"sucesso": True, "msg": f"{treinados} modelos de desfecho treinados"}
+
+
+@executor("dossie")
+def _dossie(parametros, ao_progresso):
+    # A chave da Groq vem do ambiente do worker (.env), nunca do banco
+    from groq import Groq
+
+    import dossie
+
+    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    texto = dossie.gerar_dossie(
+        parametros["juiz_id"], client, parametros["modelo"], ao_progresso=ao_progresso
+    )
+    return {"sucesso": True, "msg": "Dossiê gerado", "dossie": texto}
+
+
+@executor("analisar_peticoes")
+def _analisar_peticoes(parametros, ao_progresso):
+    import analise_lote
+
+    resultado = analise_lote.analisar_pasta(
+        parametros["pasta"], parametros["juiz_id"], ao_progresso=ao_progresso
+    )
+    # Os PDFs só são apagados com sucesso: numa nova tentativa ainda estão lá
+    analise_lote.descartar_lote(parametros["pasta"])
+    analisadas = sum(1 for p in resultado["peticoes"] if not p["erro"])
+    return {
+        "sucesso": True,
+        "msg": f"{analisadas} de {len(resultado['peticoes'])} petições analisadas",
+        **resultado,
+    }
+
+
+def chave_clonagem(vara):
+    return f"clonar:{vara['tribunal']}:{vara['orgao_codigo']}"
+
+
+def chave_dossie(juiz_id, modelo):
+    return f"dossie:{juiz_id}:{modelo}"
+
+
+def _status():
+    session = SessionLocal()
+    try:
+        tarefas = session.query(Tarefa).order_by(Tarefa.id.desc()).limit(20).all()
+        for t in tarefas:
+            print(
+                f"#{t.id:<5} {t.status:<11} {t.progresso or 0:4.0%}  "
+                f"p={t.prioridade:<3} {t.chave}  {t.mensagem or ''}"
+            )
+        print(
+            "👷 Worker ativo." if worker_ativo(session) else "💤 Nenhum worker ativo."
+        )
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fila de tarefas do PRÓLOGOS.")
+    parser.add_argument("comando", nargs="?", default="worker")
+    parser.add_argument("tipo", nargs="?")
+    parser.add_argument("--uma", action="store_true", help="esvazia a fila e sai")
+    args = parser.parse_args()
+
+    if args.comando == "status":
+        _status()
+    elif args.comando == "enfileirar":
+        chaves = {
+            "classificar": "classificar:todas",
+            "eventos": CHAVE_EVENTOS,
+            "embeddings": CHAVE_EMBEDDINGS,
+            "modelo_desfecho": CHAVE_MODELO_DESFECHO,
+        }
+        if args.tipo not in chaves:
+            parser.error(f"pela linha de comando: {', '.join(chaves)}")
+        tarefa_id, nova = enfileirar(args.tipo, chave=chaves[args.tipo])
+        print(f"📋 Tarefa #{tarefa_id} {'criada' if nova else 'já estava na fila'}.")
+    else:
+        rodar_worker(ate_esvaziar=args.uma)
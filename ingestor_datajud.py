@@ -1,9 +1,23 @@
 import requests
 import json
 from sqlalchemy.orm import Session
-from database_models import SessionLocal, Tribunal, Juiz, Decisao, Base, engine
+from database_models import (
+    SessionLocal,
+    Tribunal,
+    Juiz,
+    Decisao,
+    Base,
+    engine,
+    incrementar_versao_dados,
+)
 from datetime import datetime
 import re
+import aderencia
+import analise_juridica
+import busca
+import estatisticas
+import eventos
+import temas_cnj
 
 # Headers da API
 HEADERS = {
@@ -122,13 +136,36 @@ def extrair_teor_decisao(processo_source):
     return texto_relevante if texto_relevante else None
 
 
-def clonar_perfil_juiz(numero_processo_ref):
+# Movimentos de julgamento de mérito da Tabela Processual Unificada (CNJ)
+DESFECHOS_TPU = {219: "procedente", 221: "parcial", 220: "improcedente"}
+
+
+def extrair_desfecho(processo_source):
+    """Desfecho do julgamento de mérito mais recente entre os movimentos, ou None."""
+    desfecho = None
+    ultima_data = ""
+    for mov in processo_source.get("movimentos", []):
+        encontrado = DESFECHOS_TPU.get(mov.get("codigo"))
+        data = mov.get("dataHora", "")
+        if encontrado and data >= ultima_data:
+            desfecho, ultima_data = encontrado, data
+    return desfecho
+
+
+ETAPAS_CLONAGEM = 5
+
+
+def localizar_vara(numero_processo_ref, ao_progresso=None):
+    """
+    Etapas 1-2 da clonagem: decodifica o tribunal pelo número CNJ e acha no
+    DataJud a vara (órgão julgador) do processo de referência. É uma consulta
+    só, rápida; o trabalho pesado fica em clonar_vara.
+
+    Devolve {"sucesso": False, "msg": ...} ou {"sucesso": True, "vara": {...}}.
+    """
     # Usa a nova função inteligente
     api_url, sigla_tribunal, estado = detectar_tribunal_inteligente(numero_processo_ref)
-
-    print(
-        f"🔍 Buscando referência: {numero_processo_ref} na API do {sigla_tribunal}..."
-    )
+    _avisar(ao_progresso, 1, f"🧭 Tribunal identificado: {sigla_tribunal} ({estado})")
 
     payload_ref = {
         "query": {
@@ -160,30 +197,122 @@ def clonar_perfil_juiz(numero_processo_ref):
         orgao_cod = processo_ref.get("orgaoJulgador", {}).get("codigo")
         orgao_nome = processo_ref.get("orgaoJulgador", {}).get("nome")
 
-        print(f"✅ Vara: {orgao_nome}")
+        _avisar(ao_progresso, 2, f"📍 Vara localizada: {orgao_nome}")
+        return {
+            "sucesso": True,
+            "vara": {
+                "api_url": api_url,
+                "tribunal": sigla_tribunal,
+                "estado": estado,
+                "orgao_codigo": orgao_cod,
+                "orgao_nome": orgao_nome,
+            },
+        }
+
+    except Exception as e:
+        return {"sucesso": False, "msg": f"Erro técnico: {str(e)}"}
+
 
+def clonar_vara(vara, ao_progresso=None):
+    """
+    Etapas 3-5 da clonagem: baixa o histórico da vara (dict de localizar_vara),
+    grava e classifica as decisões.
+    """
+    try:
         # Baixa histórico
         payload_history = {
             "size": 50,
-            "query": {"match": {"orgaoJulgador.codigo": orgao_cod}},
+            "query": {"match": {"orgaoJulgador.codigo": vara["orgao_codigo"]}},
             "sort": [{"dataAjuizamento": "desc"}],
         }
 
-        resp_hist = requests.post(api_url, json=payload_history, headers=HEADERS)
+        resp_hist = requests.post(
+            vara["api_url"], json=payload_history, headers=HEADERS
+        )
         hits_hist = resp_hist.json().get("hits", {}).get("hits", [])
+        _avisar(ao_progresso, 3, f"📥 Histórico baixado: {len(hits_hist)} processos")
+
+        stats = salvar_lote(hits_hist, vara["tribunal"], vara["estado"])
+        _avisar(
+            ao_progresso,
+            4,
+            f"💾 Decisões gravadas: {stats['novos']} novas, "
+            f"{stats['atualizados']} atualizadas",
+        )
 
-        stats = salvar_lote(hits_hist, sigla_tribunal, estado)
+        classificadas = analise_juridica.normalizar_processos(ids=stats["ids"])
+        _avisar(ao_progresso, 5, f"🧠 Decisões classificadas: {classificadas}")
 
         return {
             "sucesso": True,
             "msg": f"Sucesso! {stats['novos']} novos, {stats['com_teor']} com teor completo.",
-            "juiz_nome": f"Juízo da {orgao_nome}",
+            "juiz_nome": f"Juízo da {vara['orgao_nome']}",
+            # O histórico é todo da mesma vara: um juiz só (nenhum, se vazio)
+            "juiz_id": stats["juizes"][0] if stats["juizes"] else None,
         }
 
     except Exception as e:
         return {"sucesso": False, "msg": f"Erro técnico: {str(e)}"}
 
 
+def clonar_perfil_juiz(numero_processo_ref, ao_progresso=None):
+    """
+    Clona o perfil do juízo de um processo de referência: acha a vara no
+    DataJud, baixa o histórico dela, grava e classifica as decisões.
+
+    `ao_progresso(etapa, total, msg)` é chamado ao fim de cada etapa real
+    (tribunal identificado, vara localizada, histórico baixado, decisões
+    gravadas, decisões classificadas), para a interface mostrar o andamento.
+    O app roda as etapas 3-5 pela fila (fila_tarefas.py), fora da sessão web.
+    """
+    localizada = localizar_vara(numero_processo_ref, ao_progresso)
+    if not localizada["sucesso"]:
+        return localizada
+    return clonar_vara(localizada["vara"], ao_progresso)
+
+
+def _avisar(ao_progresso, etapa, msg):
+    print(msg)
+    if ao_progresso:
+        ao_progresso(etapa, ETAPAS_CLONAGEM, msg)
+
+
+def _obter_ou_criar_juiz(session, cache, tribunal_id, orgao_codigo, nome, vara):
+    """
+    Busca o juiz pela identidade (tribunal + código do órgão julgador). Juízes
+    gravados antes do código existir são achados pelo nome e recebem o código.
+    """
+    orgao_codigo = str(orgao_codigo) if orgao_codigo is not None else None
+    chave = (tribunal_id, orgao_codigo or nome)
+    if chave in cache:
+        return cache[chave]
+
+    juiz = None
+    if orgao_codigo:
+        juiz = (
+            session.query(Juiz)
+            .filter_by(tribunal_id=tribunal_id, orgao_codigo=orgao_codigo)
+            .first()
+        )
+    if not juiz:
+        juiz = (
+            session.query(Juiz)
+            .filter_by(tribunal_id=tribunal_id, nome=nome, orgao_codigo=None)
+            .first()
+        )
+        if juiz and orgao_codigo:
+            juiz.orgao_codigo = orgao_codigo
+    if not juiz:
+        juiz = Juiz(
+            nome=nome, vara=vara, orgao_codigo=orgao_codigo, tribunal_id=tribunal_id
+        )
+        session.add(juiz)
+    session.flush()
+
+    cache[chave] = juiz
+    return juiz
+
+
 def salvar_lote(lista_processos, nome_tribunal, estado_tribunal):
     session = SessionLocal()
 
@@ -196,6 +325,13 @@ def salvar_lote(lista_processos, nome_tribunal, estado_tribunal):
 
     novos = 0
     com_teor = 0
+    atualizados = 0
+    juizes = {}  # cache do lote: (tribunal_id, orgao_codigo ou nome) -> Juiz
+    deltas = estatisticas.novo_acumulador()
+    textos = []  # (Decisao, tema, texto) gravados neste lote, para a busca textual
+    reindexar = []  # decisões existentes cujo texto mudou (embedding refeito)
+    mudancas = []  # (tipo do evento, Decisao), para o log de eventos
+    temas_lote = []  # (Decisao, [(codigo, nome)]) para a dimensão de temas
 
     for proc in lista_processos:
         source = proc["_source"]
@@ -205,6 +341,7 @@ def salvar_lote(lista_processos, nome_tribunal, estado_tribunal):
         data_aj = source.get("dataAjuizamento")
 
         teor_minerado = extrair_teor_decisao(source)
+        desfecho = extrair_desfecho(source)
 
         assuntos = source.get("assuntos", [])
         tema = "Geral"
@@ -222,12 +359,9 @@ def salvar_lote(lista_processos, nome_tribunal, estado_tribunal):
             com_teor += 1
 
         nome_juiz = f"Juízo da {nome_vara}"
-        juiz = session.query(Juiz).filter_by(nome=nome_juiz).first()
-        if not juiz:
-            juiz = Juiz(nome=nome_juiz, vara=nome_vara, tribunal_id=tribunal.id)
-            session.add(juiz)
-            session.commit()
-            session.refresh(juiz)
+        juiz = _obter_ou_criar_juiz(
+            session, juizes, tribunal.id, orgao_data.get("codigo"), nome_juiz, nome_vara
+        )
 
         existe = (
             session.query(Decisao).filter_by(numero_processo=numero_processo).first()
@@ -244,16 +378,57 @@ def salvar_lote(lista_processos, nome_tribunal, estado_tribunal):
                 numero_processo=numero_processo,
                 texto_decisao=texto_completo,
                 resultado="Aguardando Análise",
+                desfecho=desfecho,
                 tema=tema,
                 data_decisao=dt,
                 juiz_id=juiz.id,
             )
             session.add(nova)
+            textos.append((nova, tema, texto_completo))
+            mudancas.append((eventos.INSERIDA, nova))
             novos += 1
-        elif teor_minerado:
-            existe.texto_decisao = texto_completo
-            session.add(existe)
-
+            deltas[
+                estatisticas.chave_estatistica(juiz.id, tema, nova.resultado, dt)
+            ] += 1
+        else:
+            # Só conta como atualização (e vai para o log) o que mudou de fato:
+            # reclonar um órgão traz de volta o mesmo teor
+            texto_mudou = bool(teor_minerado) and (
+                texto_completo != existe.texto_decisao
+            )
+            desfecho_mudou = bool(desfecho) and desfecho != existe.desfecho
+            if texto_mudou or desfecho_mudou:
+                # Só texto novo regrava o blob e refaz o embedding
+                if texto_mudou:
+                    existe.texto_decisao = texto_completo
+                    textos.append((existe, existe.tema, texto_completo))
+                    reindexar.append(existe.id)
+                if desfecho:
+                    existe.desfecho = desfecho
+                session.add(existe)
+                mudancas.append((eventos.ATUALIZADA, existe))
+                atualizados += 1
+        # Decisões já gravadas também entram: completa as de antes da dimensão
+        temas_lote.append((existe or nova, temas_cnj.extrair_assuntos(source)))
+
+    session.flush()
+    ids = [d.id for d, _tema, _texto in textos]
+    ids_juizes = [juiz.id for juiz in juizes.values()]
+    busca.indexar_decisoes(session, [(d.id, tema, t) for d, tema, t in textos])
+    temas_cnj.gravar_vinculos(session, {d.id: lista for d, lista in temas_lote})
+    aderencia.descartar_embeddings(session, reindexar)
+    estatisticas.aplicar_deltas(session, deltas)
+    if novos or atualizados:
+        # Invalida os caches do dashboard (st.cache_data)
+        incrementar_versao_dados(session)
+    # Embeddings, modelos e dossiês afetados são refeitos a partir do log
+    eventos.registrar(session, [(tipo, d.id, d.juiz_id) for tipo, d in mudancas])
     session.commit()
     session.close()
-    return {"novos": novos, "com_teor": com_teor}
+    return {
+        "novos": novos,
+        "com_teor": com_teor,
+        "atualizados": atualizados,
+        "ids": ids,
+        "juizes": ids_juizes,
+    }
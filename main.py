@@ -1,24 +1,51 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    File,
+    HTTPException,
+    Query,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import date
+from typing import List, Optional
+import asyncio
+import base64
+import json
+import os
 import uvicorn
 
 # A chave GROQ foi movida para o .env (variável de ambiente GROQ_API_KEY). Não deixe chaves em código.
 
 # Importamos os nossos ficheiros anteriores
-from database_models import SessionLocal, Decisao, Juiz, Tribunal
+from database_models import SessionLeitura, Decisao, Juiz, Tribunal, obter_sessao_async
+import analise_lote
+import busca
+import compressao
+import estatisticas
+import exportacao
+import fila_tarefas
+import perfilamento
 import schemas
+import temas_cnj
 
 app = FastAPI(
     title="API PRÓLOGOS",
     description="Motor de Jurimetria e Previsibilidade",
     version="1.0.0",
 )
+# Traços por requisição (tempo, SQL, cProfile amostrado) com PROLOGOS_PERFIL=1
+perfilamento.instrumentar_api(app)
 
 
-# Dependência: Função que abre e fecha a conexão com o banco a cada requisição
+# Dependência: Função que abre e fecha a conexão com o banco a cada requisição.
+# A API só lê: usa as sessões somente leitura, que não disputam com a ingestão.
 def get_db():
-    db = SessionLocal()
+    db = SessionLeitura()
     try:
         yield db
     finally:
@@ -33,23 +60,275 @@ def home():
     return {"mensagem": "API do PRÓLOGOS está online! 🚀"}
 
 
-# Rota 1: Listar todos os juízes monitorados
-@app.get("/juizes/", response_model=List[schemas.JuizResponse])
-def listar_juizes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    juizes = db.query(Juiz).offset(skip).limit(limit).all()
-    return juizes
+# --- PAGINAÇÃO POR CURSOR (KEYSET) ---
+# Em vez de OFFSET (que relê todas as linhas anteriores), o cliente devolve o
+# último (data, id) visto e a consulta continua dali pelo índice.
+LIMITE_MAXIMO = 500
+
+# Campos que podem ser pedidos em ?fields=. O texto é pesado e só vem se pedido.
+CAMPOS_DECISAO = {
+    "id": Decisao.id,
+    "numero_processo": Decisao.numero_processo,
+    # Lido comprimido (a coluna antiga só tem valor em linhas não migradas)
+    "texto_decisao": Decisao.texto_comprimido.label("texto_decisao"),
+    "resultado": Decisao.resultado,
+    "tema": Decisao.tema,
+    "data_decisao": Decisao.data_decisao,
+    "juiz_id": Decisao.juiz_id,
+}
+CAMPOS_PADRAO = [c for c in CAMPOS_DECISAO if c != "texto_decisao"]
+# Conversões aplicadas aos valores lidos antes de responder
+CONVERSORES = {"texto_decisao": compressao.descomprimir}
+
+
+def _codificar_cursor(*valores):
+    bruto = json.dumps(valores, default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(bruto).decode("ascii")
+
+
+def _decodificar_cursor(cursor, *tipos):
+    """
+    Valores do cursor, um por tipo em `tipos` (int ou date; date aceita null,
+    a decisão sem data). Qualquer cursor fora desse formato (adulterado, ou de
+    outra ordenação) vira 400.
+    """
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError(cursor)
+        return [_valor_do_cursor(v, tipo) for v, tipo in zip(valores, tipos)]
+    except ValueError:  # inclui base64, JSON e data mal formados
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+def _valor_do_cursor(valor, tipo):
+    if tipo is int and type(valor) is int:
+        return valor
+    if tipo is date and valor is None:
+        return None
+    if tipo is date and isinstance(valor, str):
+        return date.fromisoformat(valor)
+    raise ValueError(valor)
+
 
+def _campos_pedidos(fields):
+    campos = [c.strip() for c in fields.split(",")] if fields else CAMPOS_PADRAO
+    invalidos = [c for c in campos if c not in CAMPOS_DECISAO]
+    if invalidos:
+        raise HTTPException(
+            status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}"
+        )
+    return campos
 
-# Rota 2: Listar decisões (com filtro opcional por tema)
-@app.get("/decisoes/", response_model=List[schemas.DecisaoResponse])
-def listar_decisoes(tema: str = None, db: Session = Depends(get_db)):
-    query = db.query(Decisao)
+
+def _filtrar_decisoes(
+    query, tema, juiz_id, tribunal, data_inicio, data_fim, tema_codigo=None
+):
+    """Filtros comuns da listagem e da exportação de decisões."""
     if tema:
-        # Filtra onde o tema contém a palavra pesquisada
-        query = query.filter(Decisao.tema.contains(tema))
+        # Filtra onde o tema (nome do assunto principal) contém a palavra pesquisada
+        query = query.where(Decisao.tema.contains(tema))
+    if tema_codigo:
+        # Qualquer assunto da decisão, pelo código CNJ (índice em decisoes_temas)
+        query = query.where(Decisao.id.in_(temas_cnj.decisoes_do_tema(tema_codigo)))
+    if juiz_id is not None:
+        query = query.where(Decisao.juiz_id == juiz_id)
+    if tribunal:
+        juizes_do_tribunal = (
+            select(Juiz.id)
+            .join(Tribunal, Juiz.tribunal_id == Tribunal.id)
+            .where(Tribunal.nome == tribunal.upper())
+        )
+        query = query.where(Decisao.juiz_id.in_(juizes_do_tribunal))
+    if data_inicio:
+        query = query.where(Decisao.data_decisao >= data_inicio)
+    if data_fim:
+        query = query.where(Decisao.data_decisao <= data_fim)
+
+    return query
+
+
+async def get_db_async():
+    async with obter_sessao_async(somente_leitura=True)() as db:
+        yield db
+
+
+# Rota 1: Listar todos os juízes monitorados
+@app.get("/juizes/", response_model=schemas.PaginaJuizes)
+async def listar_juizes(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=LIMITE_MAXIMO),
+    tribunal: Optional[str] = None,
+    db: AsyncSession = Depends(get_db_async),
+):
+    query = select(Juiz).order_by(Juiz.id).limit(limit + 1)
+    if cursor:
+        (ultimo_id,) = _decodificar_cursor(cursor, int)
+        query = query.where(Juiz.id > ultimo_id)
+    if tribunal:
+        query = query.join(Tribunal, Juiz.tribunal_id == Tribunal.id).where(
+            Tribunal.nome == tribunal.upper()
+        )
+
+    juizes = (await db.execute(query)).scalars().all()
+    proximo = _codificar_cursor(juizes[limit - 1].id) if len(juizes) > limit else None
+    return {"itens": juizes[:limit], "proximo_cursor": proximo}
+
+
+# Rota 2: Listar decisões (filtros, projeção de campos e paginação por cursor)
+@app.get(
+    "/decisoes/",
+    response_model=schemas.PaginaDecisoes,
+    response_model_exclude_unset=True,
+)
+async def listar_decisoes(
+    tema: Optional[str] = None,
+    tema_codigo: Optional[List[int]] = Query(
+        None, description="Códigos CNJ de assunto (ver /temas/); vale qualquer um."
+    ),
+    juiz_id: Optional[int] = None,
+    tribunal: Optional[str] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    ordem: str = Query("id", pattern="^(id|data)$"),
+    fields: Optional[str] = Query(
+        None,
+        description="Campos separados por vírgula. Padrão: todos menos texto_decisao.",
+    ),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=LIMITE_MAXIMO),
+    db: AsyncSession = Depends(get_db_async),
+):
+    campos = _campos_pedidos(fields)
+
+    # id e data_decisao sempre entram na consulta para montar o cursor
+    colunas = dict.fromkeys(campos + ["id", "data_decisao"])
+    query = select(*[CAMPOS_DECISAO[c] for c in colunas])
 
-    decisoes = query.limit(50).all()
-    return decisoes
+    query = _filtrar_decisoes(
+        query, tema, juiz_id, tribunal, data_inicio, data_fim, tema_codigo
+    )
+
+    if ordem == "data":
+        # Mais recentes primeiro; as decisões sem data vêm no fim, por id. O
+        # cursor leva a data da última linha (null se ela não tinha data). São
+        # duas consultas por índice (com data, depois sem data) em vez de um
+        # OR com IS NULL, que faria o SQLite percorrer o índice desde o início
+        com_data = query.where(Decisao.data_decisao.is_not(None))
+        sem_data = query.where(Decisao.data_decisao.is_(None))
+        if cursor:
+            ultima_data, ultimo_id = _decodificar_cursor(cursor, date, int)
+            if ultima_data is None:
+                com_data = None  # as com data já foram todas
+                sem_data = sem_data.where(Decisao.id < ultimo_id)
+            else:
+                com_data = com_data.where(
+                    or_(
+                        Decisao.data_decisao < ultima_data,
+                        and_(
+                            Decisao.data_decisao == ultima_data,
+                            Decisao.id < ultimo_id,
+                        ),
+                    )
+                )
+        linhas = []
+        if com_data is not None:
+            com_data = com_data.order_by(
+                Decisao.data_decisao.desc(), Decisao.id.desc()
+            ).limit(limit + 1)
+            linhas = (await db.execute(com_data)).mappings().all()
+        if len(linhas) <= limit:
+            sem_data = sem_data.order_by(Decisao.id.desc()).limit(
+                limit + 1 - len(linhas)
+            )
+            linhas += (await db.execute(sem_data)).mappings().all()
+    else:
+        query = query.order_by(Decisao.id)
+        if cursor:
+            (ultimo_id,) = _decodificar_cursor(cursor, int)
+            query = query.where(Decisao.id > ultimo_id)
+        linhas = (await db.execute(query.limit(limit + 1))).mappings().all()
+
+    proximo = None
+    if len(linhas) > limit:
+        ultima = linhas[limit - 1]
+        if ordem == "data":
+            proximo = _codificar_cursor(ultima["data_decisao"], ultima["id"])
+        else:
+            proximo = _codificar_cursor(ultima["id"])
+
+    itens = [
+        {c: CONVERSORES.get(c, lambda v: v)(linha[c]) for c in campos}
+        for linha in linhas[:limit]
+    ]
+    return {"itens": itens, "proximo_cursor": proximo}
+
+
+# Rota 2a: Exportação em massa (NDJSON ou CSV), em streaming
+@app.get("/exportar/decisoes")
+async def exportar_decisoes(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    tema: Optional[str] = None,
+    tema_codigo: Optional[List[int]] = Query(
+        None, description="Códigos CNJ de assunto (ver /temas/); vale qualquer um."
+    ),
+    juiz_id: Optional[int] = None,
+    tribunal: Optional[str] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    fields: Optional[str] = Query(
+        None,
+        description="Campos separados por vírgula. Padrão: todos menos texto_decisao.",
+    ),
+):
+    """
+    Exporta todas as decisões do filtro, em ordem de id. As linhas vêm do banco
+    por um cursor do lado do servidor e saem em blocos, então a memória do
+    servidor fica constante mesmo em exportações de milhões de linhas.
+    """
+    campos = _campos_pedidos(fields)
+    query = select(*[CAMPOS_DECISAO[c] for c in campos]).order_by(Decisao.id)
+    query = _filtrar_decisoes(
+        query, tema, juiz_id, tribunal, data_inicio, data_fim, tema_codigo
+    )
+
+    corpo = exportacao.gerar_exportacao(
+        obter_sessao_async(somente_leitura=True),
+        query,
+        campos,
+        formato,
+        comprimir=gzip,
+        conversores=CONVERSORES,
+    )
+    nome = f"decisoes.{formato}" + (".gz" if gzip else "")
+    tipo = "application/gzip" if gzip else exportacao.TIPOS_MIME[formato]
+    return StreamingResponse(
+        corpo,
+        media_type=tipo,
+        headers={"Content-Disposition": f'attachment; filename="{nome}"'},
+    )
+
+
+# Rota 2b: Busca textual ranqueada sobre tema e texto das decisões
+@app.get("/busca", response_model=List[schemas.ResultadoBusca])
+async def buscar_decisoes(
+    q: str = Query(..., min_length=2, description="Termos da busca"),
+    juiz_id: Optional[int] = None,
+    tribunal: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db_async),
+):
+    return await busca.buscar(db, q, limite=limit, juiz_id=juiz_id, tribunal=tribunal)
+
+
+# Rota 2c: Temas (assuntos da TPU do CNJ) para o filtro tema_codigo
+@app.get("/temas/", response_model=List[schemas.TemaResponse])
+def listar_temas(q: Optional[str] = None, db: Session = Depends(get_db)):
+    return [
+        {"codigo": codigo, "nome": nome}
+        for codigo, nome in temas_cnj.listar_temas(db, q)
+    ]
 
 
 # Rota 3: Dashboard Simples (Jurimetria Básica)
@@ -59,17 +338,99 @@ def metricas_gerais(db: Session = Depends(get_db)):
     Retorna contagens simples para testarmos a saúde do sistema.
     """
     total_juizes = db.query(Juiz).count()
-    total_decisoes = db.query(Decisao).count()
 
-    # Exemplo de agregação simples: Quantos processos 'Procedente' (exemplo futuro)
-    # Por enquanto, mostramos apenas o volume coletado
+    # Contagens lidas da tabela de resumo (mantida na ingestão), sem varrer `decisoes`
+    por_resultado = estatisticas.totais_por_resultado(db)
     return {
         "total_juizes_monitorados": total_juizes,
-        "total_decisoes_indexadas": total_decisoes,
+        "total_decisoes_indexadas": sum(por_resultado.values()),
+        "decisoes_por_resultado": por_resultado,
         "status_sistema": "Operacional",
     }
 
 
+# Rota 4: Acompanhamento das tarefas em segundo plano (fila_tarefas.py)
+@app.get("/tarefas/{tarefa_id}", response_model=schemas.TarefaStatus)
+def status_tarefa(tarefa_id: int, db: Session = Depends(get_db)):
+    tarefa = fila_tarefas.obter_tarefa(tarefa_id, session=db)
+    if tarefa is None:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada.")
+    return tarefa
+
+
+# Eventos de progresso da tarefa (Server-Sent Events): um evento a cada mudança
+# de status/progresso/mensagem; o último traz o resultado
+INTERVALO_EVENTOS_S = 0.5
+
+
+@app.get("/tarefas/{tarefa_id}/eventos")
+def eventos_tarefa(tarefa_id: int):
+    if fila_tarefas.obter_tarefa(tarefa_id) is None:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada.")
+
+    async def eventos():
+        anterior = None
+        while True:
+            tarefa = await asyncio.to_thread(fila_tarefas.obter_tarefa, tarefa_id)
+            if tarefa is None:
+                # Apagada no meio do stream (ex: limpeza da fila): encerra avisando
+                corpo = json.dumps({"detail": "Tarefa não encontrada."})
+                yield f"event: erro\ndata: {corpo}\n\n"
+                return
+            terminou = tarefa["status"] not in fila_tarefas.ATIVAS
+            atual = (tarefa["status"], tarefa["progresso"], tarefa["mensagem"])
+            if atual != anterior:
+                if not terminou:
+                    tarefa = {**tarefa, "resultado": None}
+                corpo = schemas.TarefaStatus(**tarefa).model_dump_json()
+                yield f"event: {tarefa['status']}\ndata: {corpo}\n\n"
+                anterior = atual
+            if terminou:
+                return
+            await asyncio.sleep(INTERVALO_EVENTOS_S)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+# Rota 5: Análise de petições em lote (analise_lote.py), como tarefa da fila
+@app.post("/analise/peticoes", response_model=schemas.TarefaStatus, status_code=202)
+def analisar_peticoes(
+    background_tasks: BackgroundTasks,
+    juiz_id: int = Query(..., description="Juiz cujo histórico é a referência"),
+    arquivos: List[UploadFile] = File(..., description="PDFs ou um .zip de PDFs"),
+    db: Session = Depends(get_db),
+):
+    """
+    Recebe as petições e devolve a tarefa (202). Acompanhe por
+    /tarefas/{id}/eventos (stream) ou /tarefas/{id}; o resultado traz, por
+    petição, aderência, tema conectado, precedentes e probabilidades.
+    """
+    if db.get(Juiz, juiz_id) is None:
+        raise HTTPException(status_code=404, detail="Juiz não encontrado.")
+    try:
+        # O Starlette já guardou cada upload em arquivo temporário: a cópia
+        # vai em blocos para a pasta do lote, sem passar tudo pela memória
+        pasta = analise_lote.gravar_lote(
+            [(arquivo.filename, arquivo.file) for arquivo in arquivos]
+        )
+    except ValueError as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+
+    tarefa_id, _ = fila_tarefas.enfileirar(
+        "analisar_peticoes",
+        {"pasta": pasta, "juiz_id": juiz_id},
+        chave=f"analisar_peticoes:{os.path.basename(pasta)}",
+    )
+    if not fila_tarefas.worker_ativo():
+        # Sem worker: roda na própria API, depois de responder
+        background_tasks.add_task(fila_tarefas.executar_agora, tarefa_id)
+    return fila_tarefas.obter_tarefa(tarefa_id)
+
+
 if __name__ == "__main__":
     # Altere aqui para 8001 ou outra porta livre
     uvicorn.run("main:app", host="127.0.0.1", port=8001, reload=True)
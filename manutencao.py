@@ -0,0 +1,322 @@
+"""
+Manutenção online do banco: remoção de duplicatas em lotes, estatísticas do
+planejador, checagem de integridade, índice textual e espaço livre.
+
+Cada tarefa tem um intervalo mínimo entre execuções; a data da última fica em
+`estado_sistema` ("manutencao:<tarefa>", em segundos desde a época). Rodando
+`python manutencao.py` periodicamente (cron, ou --daemon), só as tarefas
+vencidas são executadas.
+
+Tudo é feito em transações curtas, com uma pausa entre os lotes, para que a
+ingestão e o dashboard continuem funcionando durante a manutenção.
+
+Uso:
+    python manutencao.py                       # tarefas vencidas
+    python manutencao.py --tudo                # todas, ignorando o agendamento
+    python manutencao.py --tarefas duplicatas,analyze
+    python manutencao.py --reconstruir-busca   # recria o índice textual do zero
+    python manutencao.py --daemon              # repete a cada INTERVALO_DAEMON_S
+"""
+
+import argparse
+import time
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.orm import Session
+
+import aderencia
+import busca
+import estatisticas
+import temas_cnj
+from database_models import (
+    engine,
+    Decisao,
+    EstadoSistema,
+    incrementar_versao_dados,
+)
+
+LOTE_DUPLICATAS = 5000  # processos (numero_processo) examinados por transação
+PAUSA_ENTRE_LOTES_S = 0.05  # deixa a ingestão pegar o lock de escrita
+LIMIAR_VACUUM = 0.20  # fração de páginas livres a partir da qual vale o VACUUM
+INTERVALO_DAEMON_S = 300
+
+HORA = 3600
+DIA = 24 * HORA
+
+
+def _eh_sqlite(conn):
+    return conn.dialect.name == "sqlite"
+
+
+# --- TAREFAS ---
+# Cada tarefa recebe as opções e devolve um dict com o trabalho feito.
+
+
+def remover_duplicatas(lote=LOTE_DUPLICATAS, **_opcoes):
+    """
+    Mantém só a decisão mais recente (maior id) de cada numero_processo.
+
+    Percorre o índice de numero_processo em faixas de `lote` processos; em cada
+    faixa, um ROW_NUMBER() OVER (PARTITION BY numero_processo) acha as cópias, que
+    são apagadas na mesma transação curta em que a tabela de resumo é ajustada.
+    Uma faixa sempre termina num processo inteiro, então nenhum grupo fica
+    dividido entre dois lotes.
+    """
+    ultimo = ""
+    lotes = 0
+    removidos = 0
+    while True:
+        lotes += 1
+        with engine.begin() as conn:
+            session = Session(bind=conn)
+            fim = session.scalar(
+                select(Decisao.numero_processo)
+                .where(Decisao.numero_processo > ultimo)
+                .order_by(Decisao.numero_processo)
+                .offset(lote - 1)
+                .limit(1)
+            )
+            faixa = [Decisao.numero_processo > ultimo]
+            if fim is not None:
+                faixa.append(Decisao.numero_processo <= fim)
+
+            janela = (
+                select(
+                    Decisao.id,
+                    Decisao.juiz_id,
+                    Decisao.tema,
+                    Decisao.resultado,
+                    Decisao.data_decisao,
+                    func.row_number()
+                    .over(
+                        partition_by=Decisao.numero_processo,
+                        order_by=Decisao.id.desc(),
+                    )
+                    .label("ordem"),
+                )
+                .where(*faixa)
+                .subquery()
+            )
+            copias = session.execute(select(janela).where(janela.c.ordem > 1)).all()
+
+            if copias:
+                deltas = estatisticas.novo_acumulador()
+                for c in copias:
+                    chave = estatisticas.chave_estatistica(
+                        c.juiz_id, c.tema, c.resultado, c.data_decisao
+                    )
+                    deltas[chave] -= 1
+                # Os triggers do FTS tiram as linhas apagadas do índice textual
+                removidas = [c.id for c in copias]
+                aderencia.descartar_embeddings(session, removidas)
+                temas_cnj.descartar_vinculos(session, removidas)
+                session.execute(delete(Decisao).where(Decisao.id.in_(removidas)))
+                estatisticas.aplicar_deltas(session, deltas)
+                incrementar_versao_dados(session)
+                session.flush()
+                removidos += len(copias)
+
+        if fim is None:
+            break
+        ultimo = fim
+        time.sleep(PAUSA_ENTRE_LOTES_S)
+
+    return {"removidos": removidos, "lotes": lotes}
+
+
+def atualizar_estatisticas_planejador(**_opcoes):
+    """ANALYZE: mantém o planejador escolhendo os índices certos."""
+    with engine.begin() as conn:
+        if _eh_sqlite(conn):
+            # optimize só reanalisa as tabelas cujas estatísticas ficaram velhas
+            conn.execute(text("PRAGMA analysis_limit=1000"))
+            conn.execute(text("PRAGMA optimize"))
+        else:
+            conn.execute(text("ANALYZE"))
+    return {}
+
+
+def checar_integridade(completo=False, **_opcoes):
+    """quick_check (ou integrity_check) do SQLite e do índice FTS5."""
+    with engine.connect() as conn:
+        if not _eh_sqlite(conn):
+            # No PostgreSQL a integridade física é garantida pelo próprio servidor
+            return {"ok": True, "detalhe": "n/a (PostgreSQL)"}
+        pragma = "integrity_check" if completo else "quick_check"
+        problemas = [
+            linha
+            for (linha,) in conn.execute(text(f"PRAGMA {pragma}"))
+            if linha != "ok"
+        ]
+        try:
+            conn.execute(
+                text(
+                    "INSERT INTO decisoes_fts(decisoes_fts) VALUES ('integrity-check')"
+                )
+            )
+        except Exception as erro:
+            problemas.append(f"decisoes_fts: {erro}")
+        conn.rollback()
+    if problemas:
+        raise RuntimeError("; ".join(problemas[:10]))
+    return {"ok": True}
+
+
+def otimizar_busca(reconstruir=False, **_opcoes):
+    """
+    Índice textual: 'optimize' junta os segmentos do FTS5 (incremental, em
+    transação curta); com `reconstruir`, reindexa tudo a partir de `decisoes`.
+    """
+    with engine.begin() as conn:
+        if reconstruir:
+            busca.reconstruir_indice_textual(conn)
+            return {"reconstruido": True}
+        if _eh_sqlite(conn):
+            conn.execute(
+                text("INSERT INTO decisoes_fts(decisoes_fts) VALUES ('optimize')")
+            )
+    return {"reconstruido": False}
+
+
+def liberar_espaco(**_opcoes):
+    """
+    SQLite: checkpoint do WAL e VACUUM só quando há espaço livre relevante
+    (LIMIAR_VACUUM), porque o VACUUM bloqueia escritas enquanto roda.
+    PostgreSQL: VACUUM (ANALYZE) das tabelas, que não bloqueia leituras nem escritas.
+    """
+    if engine.dialect.name != "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM (ANALYZE)"))
+        return {"vacuum": True}
+
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+        paginas = conn.execute(text("PRAGMA page_count")).scalar()
+        livres = conn.execute(text("PRAGMA freelist_count")).scalar()
+        fracao = livres / paginas if paginas else 0.0
+        fazer_vacuum = fracao >= LIMIAR_VACUUM
+        conn.commit()
+    if fazer_vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return {"paginas_livres": f"{fracao:.0%}", "vacuum": fazer_vacuum}
+
+
+# nome -> (função, intervalo mínimo entre execuções em segundos)
+TAREFAS = {
+    "duplicatas": (remover_duplicatas, 6 * HORA),
+    "analyze": (atualizar_estatisticas_planejador, DIA),
+    "integridade": (checar_integridade, DIA),
+    "busca": (otimizar_busca, DIA),
+    "espaco": (liberar_espaco, 7 * DIA),
+}
+
+
+# --- AGENDAMENTO ---
+
+
+def _chave(tarefa):
+    return f"manutencao:{tarefa}"
+
+
+def _ultimas_execucoes():
+    with Session(engine) as session:
+        linhas = session.query(EstadoSistema).filter(
+            EstadoSistema.chave.like("manutencao:%")
+        )
+        return {e.chave.split(":", 1)[1]: e.valor for e in linhas}
+
+
+def _registrar_execucao(tarefa, quando):
+    with Session(engine) as session:
+        estado = session.get(EstadoSistema, _chave(tarefa))
+        if estado is None:
+            session.add(EstadoSistema(chave=_chave(tarefa), valor=int(quando)))
+        else:
+            estado.valor = int(quando)
+        session.commit()
+
+
+def tarefas_vencidas(agora=None):
+    agora = agora or time.time()
+    ultimas = _ultimas_execucoes()
+    return [
+        nome
+        for nome, (_funcao, intervalo) in TAREFAS.items()
+        if agora - ultimas.get(nome, 0) >= intervalo
+    ]
+
+
+def executar_manutencao(tarefas=None, **opcoes):
+    """
+    Executa as `tarefas` pedidas (padrão: as vencidas) e devolve um relatório:
+    lista de dicts com tarefa, segundos, status e o trabalho feito.
+    """
+    tarefas = tarefas_vencidas() if tarefas is None else tarefas
+    relatorio = []
+    for nome in tarefas:
+        funcao, _intervalo = TAREFAS[nome]
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(**opcoes)
+            status = "ok"
+        except Exception as erro:
+            resultado = {"erro": str(erro)}
+            status = "falhou"
+        segundos = time.perf_counter() - inicio
+        if status == "ok":
+            _registrar_execucao(nome, time.time())
+        relatorio.append(
+            {"tarefa": nome, "status": status, "segundos": segundos, **resultado}
+        )
+    return relatorio
+
+
+def imprimir_relatorio(relatorio):
+    if not relatorio:
+        print("👍 Nenhuma tarefa de manutenção vencida.")
+        return
+    for item in relatorio:
+        detalhes = {
+            k: v for k, v in item.items() if k not in ("tarefa", "status", "segundos")
+        }
+        marca = "✅" if item["status"] == "ok" else "❌"
+        extras = ", ".join(f"{k}={v}" for k, v in detalhes.items())
+        print(f"{marca} {item['tarefa']:<12} {item['segundos']:8.2f}s  {extras}")
+    total = sum(item["segundos"] for item in relatorio)
+    print(f"⏱️ Manutenção concluída em {total:.2f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manutenção online do banco.")
+    parser.add_argument("--tudo", action="store_true", help="ignora o agendamento")
+    parser.add_argument(
+        "--tarefas", help=f"lista separada por vírgula: {', '.join(TAREFAS)}"
+    )
+    parser.add_argument(
+        "--completo", action="store_true", help="integrity_check completo"
+    )
+    parser.add_argument("--reconstruir-busca", action="store_true")
+    parser.add_argument("--daemon", action="store_true")
+    args = parser.parse_args()
+
+    if args.tarefas:
+        escolhidas = [t.strip() for t in args.tarefas.split(",")]
+        invalidas = [t for t in escolhidas if t not in TAREFAS]
+        if invalidas:
+            parser.error(f"tarefas desconhecidas: {', '.join(invalidas)}")
+    elif args.tudo:
+        escolhidas = list(TAREFAS)
+    elif args.reconstruir_busca:
+        escolhidas = ["busca"]
+    else:
+        escolhidas = None
+
+    opcoes = {"completo": args.completo, "reconstruir": args.reconstruir_busca}
+    while True:
+        print("🧹 Iniciando manutenção do banco de dados...")
+        imprimir_relatorio(executar_manutencao(escolhidas, **opcoes))
+        if not args.daemon:
+            break
+        time.sleep(INTERVALO_DAEMON_S)
@@ -0,0 +1,393 @@
+"""
+Migrações do esquema do PRÓLOGOS.
+
+Cada migração é uma função numerada que recebe uma conexão (já dentro de uma
+transação) e usa DDL idempotente (IF NOT EXISTS / checagem de colunas), porque
+bancos novos já nascem com o esquema atual via `create_all`. A tabela
+`schema_migracoes` guarda as versões já aplicadas.
+
+Uso:
+    python migracoes.py          # aplica as pendentes
+    python migracoes.py status   # lista aplicadas/pendentes
+
+Para criar uma migração nova, escreva a função e acrescente-a no fim de
+MIGRACOES com o próximo número. Nunca altere uma migração já publicada.
+"""
+
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from database_models import Base, engine
+
+TABELA_VERSOES = "schema_migracoes"
+
+
+def _colunas(conn, tabela):
+    return {c["name"] for c in inspect(conn).get_columns(tabela)}
+
+
+def _adicionar_coluna(conn, tabela, coluna, tipo):
+    if coluna not in _colunas(conn, tabela):
+        conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}"))
+
+
+# --- MIGRAÇÕES ---
+
+
+def m001_identidade_do_juiz(conn):
+    """Juiz identificado por tribunal + código do órgão julgador (DataJud)."""
+    _adicionar_coluna(conn, "juizes", "orgao_codigo", "VARCHAR")
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_juizes_tribunal_orgao "
+            "ON juizes (tribunal_id, orgao_codigo)"
+        )
+    )
+
+
+def m002_indices_consultas(conn):
+    """Índice composto para as consultas por juiz ordenadas/filtradas por data."""
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_decisoes_juiz_data "
+            "ON decisoes (juiz_id, data_decisao)"
+        )
+    )
+
+
+def m003_popular_estatisticas(conn):
+    """Backfill da tabela de resumo em bancos criados antes dela existir."""
+    import estatisticas
+    from sqlalchemy.orm import Session
+
+    session = Session(bind=conn)
+    if estatisticas.estatisticas_vazias(session):
+        estatisticas.recalcular_estatisticas(session)
+    session.flush()
+
+
+def m004_indice_data_decisao(conn):
+    """Paginação por data na API (/decisoes/?ordem=data) sem filtro de juiz."""
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_decisoes_data ON decisoes (data_decisao)")
+    )
+
+
+# DDL da m005 como publicada (o índice atual vem das migrações seguintes)
+_M005_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS decisoes_fts USING fts5(
+        tema, texto_decisao,
+        content='decisoes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_ai AFTER INSERT ON decisoes BEGIN
+        INSERT INTO decisoes_fts(rowid, tema, texto_decisao)
+        VALUES (new.id, new.tema, new.texto_decisao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_ad AFTER DELETE ON decisoes BEGIN
+        INSERT INTO decisoes_fts(decisoes_fts, rowid, tema, texto_decisao)
+        VALUES ('delete', old.id, old.tema, old.texto_decisao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_au
+    AFTER UPDATE OF tema, texto_decisao ON decisoes BEGIN
+        INSERT INTO decisoes_fts(decisoes_fts, rowid, tema, texto_decisao)
+        VALUES ('delete', old.id, old.tema, old.texto_decisao);
+        INSERT INTO decisoes_fts(rowid, tema, texto_decisao)
+        VALUES (new.id, new.tema, new.texto_decisao);
+    END
+    """,
+]
+_M005_POSTGRES = [
+    """
+    ALTER TABLE decisoes ADD COLUMN IF NOT EXISTS busca_vetor tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(tema, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(texto_decisao, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_decisoes_busca ON decisoes USING GIN (busca_vetor)",
+]
+
+
+def m005_busca_textual(conn):
+    """Índice full-text sobre tema/texto (FTS5 no SQLite, tsvector no Postgres)."""
+    if conn.dialect.name == "postgresql":
+        for ddl in _M005_POSTGRES:
+            conn.execute(text(ddl))
+        return
+    ja_existia = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'decisoes_fts'")
+    ).first()
+    for ddl in _M005_SQLITE:
+        conn.execute(text(ddl))
+    if not ja_existia:
+        conn.execute(text("INSERT INTO decisoes_fts(decisoes_fts) VALUES ('rebuild')"))
+
+
+# DDL da m006 como publicada: o FTS5 lê o texto por uma view que descomprime
+# com a função SQL `descomprimir_texto` (substituída na m010)
+_M006_TEXTO = "coalesce(descomprimir_texto({0}.texto_comprimido), {0}.texto_decisao)"
+_M006_SQLITE = [
+    f"""
+    CREATE VIEW IF NOT EXISTS decisoes_fts_conteudo AS
+    SELECT id, tema, {_M006_TEXTO.format("decisoes")} AS texto_decisao FROM decisoes
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS decisoes_fts USING fts5(
+        tema, texto_decisao,
+        content='decisoes_fts_conteudo', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_ai AFTER INSERT ON decisoes BEGIN
+        INSERT INTO decisoes_fts(rowid, tema, texto_decisao)
+        VALUES (new.id, new.tema, {_M006_TEXTO.format("new")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_ad AFTER DELETE ON decisoes BEGIN
+        INSERT INTO decisoes_fts(decisoes_fts, rowid, tema, texto_decisao)
+        VALUES ('delete', old.id, old.tema, {_M006_TEXTO.format("old")});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_au
+    AFTER UPDATE OF tema, texto_comprimido, texto_decisao ON decisoes
+    WHEN old.tema IS NOT new.tema
+      OR {_M006_TEXTO.format("old")} IS NOT {_M006_TEXTO.format("new")}
+    BEGIN
+        INSERT INTO decisoes_fts(decisoes_fts, rowid, tema, texto_decisao)
+        VALUES ('delete', old.id, old.tema, {_M006_TEXTO.format("old")});
+        INSERT INTO decisoes_fts(rowid, tema, texto_decisao)
+        VALUES (new.id, new.tema, {_M006_TEXTO.format("new")});
+    END
+    """,
+]
+_M006_POSTGRES = [
+    "ALTER TABLE decisoes ADD COLUMN IF NOT EXISTS busca_vetor tsvector",
+    "CREATE INDEX IF NOT EXISTS ix_decisoes_busca ON decisoes USING GIN (busca_vetor)",
+]
+_REMOVER_FTS_SQLITE = [
+    "DROP TRIGGER IF EXISTS decisoes_fts_ai",
+    "DROP TRIGGER IF EXISTS decisoes_fts_ad",
+    "DROP TRIGGER IF EXISTS decisoes_fts_au",
+    "DROP TABLE IF EXISTS decisoes_fts",
+    "DROP VIEW IF EXISTS decisoes_fts_conteudo",
+]
+
+
+def m006_texto_comprimido(conn):
+    """Texto das decisões comprimido com dicionário (ver compressao.py)."""
+    import busca
+    import compressao
+
+    tipo = "BYTEA" if conn.dialect.name == "postgresql" else "BLOB"
+    _adicionar_coluna(conn, "decisoes", "texto_comprimido", tipo)
+    if conn.dialect.name == "postgresql":
+        # O tsvector gerado lia a coluna antiga: passa a ser gravado pela aplicação
+        conn.execute(text("ALTER TABLE decisoes DROP COLUMN IF EXISTS busca_vetor"))
+        compressao.migrar_texto_legado(conn)
+        for ddl in _M006_POSTGRES:
+            conn.execute(text(ddl))
+        busca.indexar_todas(conn)
+        return
+    # O índice textual lia a coluna antiga: sai antes da cópia e volta lendo a nova
+    for ddl in _REMOVER_FTS_SQLITE:
+        conn.execute(text(ddl))
+    compressao.migrar_texto_legado(conn)
+    for ddl in _M006_SQLITE:
+        conn.execute(text(ddl))
+    conn.execute(text("INSERT INTO decisoes_fts(decisoes_fts) VALUES ('rebuild')"))
+
+
+def m007_desfecho(conn):
+    """Desfecho de mérito das decisões (TPU 219/220/221), preenchido na ingestão."""
+    _adicionar_coluna(conn, "decisoes", "desfecho", "VARCHAR")
+
+
+def m008_centroides_juizes(conn):
+    """Centroides por juiz (ranking de varas) para os embeddings já calculados."""
+    import aderencia
+    from sqlalchemy.orm import Session
+
+    session = Session(bind=conn)
+    aderencia.recalcular_centroides(session)
+    session.flush()
+
+
+def m009_eventos_autoincremento(conn):
+    """Ids do log de eventos nunca reaproveitados (AUTOINCREMENT no SQLite)."""
+    if conn.dialect.name != "sqlite":
+        return  # SERIAL do Postgres não reaproveita valores
+    criacao = conn.execute(
+        text(
+            "SELECT sql FROM sqlite_master "
+            "WHERE type = 'table' AND name = 'eventos_decisoes'"
+        )
+    ).scalar()
+    if criacao is None or "AUTOINCREMENT" in criacao.upper():
+        return
+    conn.execute(text("ALTER TABLE eventos_decisoes RENAME TO eventos_antigos"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_eventos_decisoes_decisao_id"))
+    Base.metadata.tables["eventos_decisoes"].create(conn)
+    # Com a reutilização, eventos pendentes podem ter ficado abaixo de algum
+    # checkpoint: os que restaram são renumerados acima do maior deles e
+    # entregues de novo (os consumidores são idempotentes)
+    base = conn.execute(
+        text(
+            "SELECT COALESCE(MAX(valor), 0) FROM estado_sistema "
+            "WHERE chave LIKE 'eventos:%'"
+        )
+    ).scalar()
+    conn.execute(
+        text(
+            "INSERT INTO eventos_decisoes (id, tipo, decisao_id, juiz_id, criado_em) "
+            "SELECT :base + ROW_NUMBER() OVER (ORDER BY id), tipo, decisao_id, "
+            "juiz_id, criado_em FROM eventos_antigos"
+        ),
+        {"base": base},
+    )
+    conn.execute(text("DROP TABLE eventos_antigos"))
+    # Log vazio: a sequência ainda precisa partir do maior checkpoint
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'eventos_decisoes'"))
+    conn.execute(
+        text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'eventos_decisoes', "
+            "MAX(:base, COALESCE(MAX(id), 0)) FROM eventos_decisoes"
+        ),
+        {"base": base},
+    )
+
+
+# Índice com o texto em claro na própria tabela FTS5, gravado pela aplicação
+# (busca.indexar_decisoes): nenhum trigger depende de função SQL registrada na
+# conexão, então sqlite3 puro (CLI, backups, scripts) também escreve em decisoes
+_M010_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS decisoes_fts USING fts5(
+        tema, texto_decisao, tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # Texto na coluna legada (escritas fora da aplicação) entra na hora; o texto
+    # comprimido a aplicação indexa logo depois do flush
+    """
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_ai AFTER INSERT ON decisoes BEGIN
+        INSERT INTO decisoes_fts(rowid, tema, texto_decisao)
+        VALUES (new.id, new.tema, new.texto_decisao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_ad AFTER DELETE ON decisoes BEGIN
+        DELETE FROM decisoes_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS decisoes_fts_au
+    AFTER UPDATE OF tema, texto_decisao ON decisoes
+    WHEN old.tema IS NOT new.tema
+      OR (new.texto_decisao IS NOT NULL AND new.texto_decisao IS NOT old.texto_decisao)
+    BEGIN
+        UPDATE decisoes_fts
+        SET tema = new.tema, texto_decisao = coalesce(new.texto_decisao, texto_decisao)
+        WHERE rowid = new.id;
+    END
+    """,
+]
+
+
+def m010_busca_sem_funcao_sql(conn):
+    """Índice textual do SQLite sem triggers que chamam `descomprimir_texto`."""
+    import busca
+
+    if conn.dialect.name != "sqlite":
+        return  # o tsvector do Postgres já é gravado pela aplicação
+    for ddl in _REMOVER_FTS_SQLITE + _M010_SQLITE:
+        conn.execute(text(ddl))
+    busca.indexar_todas(conn)
+
+
+MIGRACOES = [
+    (1, m001_identidade_do_juiz),
+    (2, m002_indices_consultas),
+    (3, m003_popular_estatisticas),
+    (4, m004_indice_data_decisao),
+    (5, m005_busca_textual),
+    (6, m006_texto_comprimido),
+    (7, m007_desfecho),
+    (8, m008_centroides_juizes),
+    (9, m009_eventos_autoincremento),
+    (10, m010_busca_sem_funcao_sql),
+]
+
+
+def _garantir_tabela_versoes(conn):
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {TABELA_VERSOES} ("
+            "versao INTEGER PRIMARY KEY, nome VARCHAR, aplicada_em VARCHAR)"
+        )
+    )
+
+
+def versoes_aplicadas(conn):
+    _garantir_tabela_versoes(conn)
+    return {v for (v,) in conn.execute(text(f"SELECT versao FROM {TABELA_VERSOES}"))}
+
+
+def atualizar_banco(engine_alvo=None, verbose=False):
+    """Cria as tabelas que faltam e aplica as migrações pendentes, em ordem."""
+    engine_alvo = engine_alvo or engine
+    Base.metadata.create_all(bind=engine_alvo)
+
+    with engine_alvo.begin() as conn:
+        aplicadas = versoes_aplicadas(conn)
+
+    novas = []
+    for versao, funcao in MIGRACOES:
+        if versao in aplicadas:
+            continue
+        # Uma transação por migração: se falhar, as anteriores ficam gravadas
+        with engine_alvo.begin() as conn:
+            funcao(conn)
+            conn.execute(
+                text(
+                    f"INSERT INTO {TABELA_VERSOES} (versao, nome, aplicada_em) "
+                    "VALUES (:versao, :nome, :quando)"
+                ),
+                {
+                    "versao": versao,
+                    "nome": funcao.__name__,
+                    "quando": datetime.utcnow().isoformat(timespec="seconds"),
+                },
+            )
+        novas.append(funcao.__name__)
+        if verbose:
+            print(f"✅ Migração aplicada: {funcao.__name__}")
+    return novas
+
+
+def status(engine_alvo=None):
+    with (engine_alvo or engine).begin() as conn:
+        aplicadas = versoes_aplicadas(conn)
+    for versao, funcao in MIGRACOES:
+        marca = "✅" if versao in aplicadas else "⏳"
+        print(f"{marca} {versao:03d} {funcao.__name__}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        status()
+    else:
+        novas = atualizar_banco(verbose=True)
+        if not novas:
+            print("👍 O esquema já estava atualizado.")
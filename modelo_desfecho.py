@@ -0,0 +1,286 @@
+"""
+Modelo estatístico do desfecho por juiz: regressão logística multinomial
+(softmax) em numpy sobre o embedding da decisão (aderencia.py) + área e risco
+(analise_juridica.py), treinada com as decisões que têm `desfecho`.
+
+- Treino em lote (`treinar`), um modelo por juiz com ao menos MIN_AMOSTRAS
+  decisões rotuladas, gravado em `modelos_desfecho` (pesos em .npy). É
+  incremental: só juízes com decisões rotuladas novas (ou alteradas, pelo
+  log de eventos) são retreinados, e o treino parte dos pesos anteriores
+  (menos iterações).
+- Por tema: a contagem de desfechos de cada tema do juiz vai junto com o
+  modelo; na previsão, a proporção de desfechos do juiz embutida no modelo é
+  trocada pela do tema (suavizada com peso ALFA_TEMA em direção à do juiz).
+- Inferência (`prever`): os modelos ficam em memória (recarregados quando a
+  versão dos modelos muda, contador próprio que `treinar` incrementa ao
+  gravar, sem invalidar o cache do dashboard) e prever é um
+  produto vetor-matriz + softmax, bem abaixo de 1 ms.
+
+Uso:
+    python modelo_desfecho.py            # (re)treina os juízes com dados novos
+    python modelo_desfecho.py --forcar   # retreina todos do zero
+"""
+
+import io
+import json
+import re
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func, select
+
+import aderencia
+from analise_juridica import AREAS, RISCOS
+from database_models import (
+    SessionLocal,
+    SessionLeitura,
+    Decisao,
+    EmbeddingDecisao,
+    ModeloDesfecho,
+    CHAVE_VERSAO_MODELOS,
+    incrementar_versao,
+    obter_versao,
+)
+
+CLASSES = ["procedente", "parcial", "improcedente"]
+MIN_AMOSTRAS = 30
+ITERACOES = 300
+ITERACOES_INCREMENTAIS = 100  # partindo dos pesos do treino anterior
+TAXA_APRENDIZADO = 0.5
+L2 = 1e-3
+ALFA_TEMA = 20.0  # suavização da taxa do tema em direção à do juiz
+
+_RE_ETIQUETA = re.compile(r"\[(\w+)\] Risco: (\w+)")
+
+_modelos = {}  # juiz_id -> dict(W, temas, n_amostras)
+_versao_carregada = None
+_trava = threading.Lock()
+
+
+def variaveis(embeddings, areas, riscos):
+    """Matriz de variáveis: embedding + one-hot de área e de risco."""
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    area = np.zeros((len(embeddings), len(AREAS)), dtype=np.float32)
+    risco = np.zeros((len(embeddings), len(RISCOS)), dtype=np.float32)
+    for i, (a, r) in enumerate(zip(areas, riscos)):
+        area[i, AREAS.index(a) if a in AREAS else -1] = 1
+        risco[i, RISCOS.index(r) if r in RISCOS else -1] = 1
+    return np.hstack([embeddings, area, risco])
+
+
+def _area_risco(etiqueta):
+    """Lê a etiqueta gravada em `resultado` ("[CIVIL] Risco: ALTO")."""
+    encontrado = _RE_ETIQUETA.match(etiqueta or "")
+    return encontrado.groups() if encontrado else ("Outros", "Indefinido")
+
+
+def _softmax(z):
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def _com_vies(X):
+    return np.hstack([X, np.ones((len(X), 1), dtype=X.dtype)])
+
+
+def ajustar(X, y, pesos_iniciais=None):
+    """Gradiente descendente (lote inteiro) da softmax com L2. y = índices de CLASSES."""
+    Xb = _com_vies(X)
+    Y = np.eye(len(CLASSES), dtype=np.float32)[y]
+    if pesos_iniciais is not None and pesos_iniciais.shape == (Xb.shape[1], Y.shape[1]):
+        W = pesos_iniciais.astype(np.float32).copy()
+        iteracoes = ITERACOES_INCREMENTAIS
+    else:
+        W = np.zeros((Xb.shape[1], Y.shape[1]), dtype=np.float32)
+        iteracoes = ITERACOES
+    regularizacao = np.ones_like(W)
+    regularizacao[-1] = 0  # o viés não é regularizado
+    for _ in range(iteracoes):
+        gradiente = Xb.T @ (_softmax(Xb @ W) - Y) / len(Xb) + L2 * regularizacao * W
+        W -= TAXA_APRENDIZADO * gradiente
+    return W
+
+
+# --- TREINO ---
+
+
+def _dados_treino(session, juiz_id):
+    linhas = session.execute(
+        select(
+            EmbeddingDecisao.vetor, Decisao.resultado, Decisao.tema, Decisao.desfecho
+        )
+        .join(Decisao, Decisao.id == EmbeddingDecisao.decisao_id)
+        .where(
+            EmbeddingDecisao.juiz_id == juiz_id,
+            EmbeddingDecisao.modelo == aderencia.MODELO_PADRAO,
+            Decisao.desfecho.in_(CLASSES),
+        )
+    ).all()
+    vetores, etiquetas, temas, desfechos = zip(*linhas)
+    embeddings = np.frombuffer(b"".join(vetores), dtype=np.float16).reshape(
+        len(linhas), -1
+    )
+    areas, riscos = zip(*(_area_risco(e) for e in etiquetas))
+    y = np.array([CLASSES.index(d) for d in desfechos])
+    return variaveis(embeddings, areas, riscos), y, temas
+
+
+def _contagens_por_tema(temas, y):
+    contagens = defaultdict(lambda: [0] * len(CLASSES))
+    for tema, classe in zip(temas, y):
+        contagens[tema][int(classe)] += 1
+    return dict(contagens)
+
+
+def _rotuladas_por_juiz(session, juizes=None):
+    """juiz_id -> decisões com desfecho e embedding (o que o treino usaria)."""
+    query = (
+        select(EmbeddingDecisao.juiz_id, func.count())
+        .join(Decisao, Decisao.id == EmbeddingDecisao.decisao_id)
+        .where(
+            EmbeddingDecisao.modelo == aderencia.MODELO_PADRAO,
+            Decisao.desfecho.in_(CLASSES),
+        )
+        .group_by(EmbeddingDecisao.juiz_id)
+    )
+    if juizes is not None:
+        query = query.where(EmbeddingDecisao.juiz_id.in_(juizes))
+    return dict(session.execute(query).all())
+
+
+def treinar(juizes=None, forcar=False, ao_progresso=None, retreinar=()):
+    """
+    Treina os juízes (todos, ou só `juizes`) que têm MIN_AMOSTRAS decisões
+    rotuladas e ganharam decisões novas desde o último treino. Os de
+    `retreinar` (desfecho ou etiqueta mudou, ver eventos.py) são treinados
+    mesmo sem decisões novas. Devolve quantos modelos foram gravados.
+    """
+    session = SessionLocal()
+    try:
+        rotuladas = _rotuladas_por_juiz(session, juizes)
+        existentes = {m.juiz_id: m for m in session.query(ModeloDesfecho)}
+        a_treinar = [
+            juiz_id
+            for juiz_id, n in sorted(rotuladas.items())
+            if n >= MIN_AMOSTRAS
+            and (
+                forcar
+                or juiz_id in retreinar
+                or juiz_id not in existentes
+                or existentes[juiz_id].n_amostras != n
+                or existentes[juiz_id].modelo_embedding != aderencia.MODELO_PADRAO
+            )
+        ]
+        for feitos, juiz_id in enumerate(a_treinar, start=1):
+            X, y, temas = _dados_treino(session, juiz_id)
+            anterior = existentes.get(juiz_id)
+            W = ajustar(
+                X,
+                y,
+                None if forcar or anterior is None else _ler_pesos(anterior.pesos),
+            )
+            acuracia = float((_softmax(_com_vies(X) @ W).argmax(axis=1) == y).mean())
+
+            buffer = io.BytesIO()
+            np.save(buffer, W)
+            modelo = anterior or ModeloDesfecho(juiz_id=juiz_id)
+            modelo.modelo_embedding = aderencia.MODELO_PADRAO
+            modelo.n_amostras = len(y)
+            modelo.pesos = buffer.getvalue()
+            modelo.temas = json.dumps(_contagens_por_tema(temas, y))
+            modelo.acuracia = acuracia
+            modelo.treinado_em = datetime.utcnow()
+            session.add(modelo)
+            incrementar_versao(session, CHAVE_VERSAO_MODELOS)  # o app recarrega
+            session.commit()
+            if ao_progresso:
+                ao_progresso(
+                    feitos, len(a_treinar), f"📈 Juiz {juiz_id}: {len(y)} decisões"
+                )
+        return len(a_treinar)
+    finally:
+        session.close()
+
+
+# --- INFERÊNCIA ---
+
+
+def _ler_pesos(blob):
+    return np.load(io.BytesIO(blob))
+
+
+def _carregar_modelos(session):
+    return {
+        m.juiz_id: {
+            "W": _ler_pesos(m.pesos),
+            "temas": json.loads(m.temas or "{}"),
+            "n_amostras": m.n_amostras,
+        }
+        for m in session.query(ModeloDesfecho).filter(
+            ModeloDesfecho.modelo_embedding == aderencia.MODELO_PADRAO
+        )
+    }
+
+
+def modelos_carregados():
+    """Modelos em memória, recarregados quando a versão dos modelos muda."""
+    global _modelos, _versao_carregada
+    session = SessionLeitura()
+    try:
+        with _trava:
+            versao = obter_versao(session, CHAVE_VERSAO_MODELOS)
+            if versao != _versao_carregada:
+                _modelos, _versao_carregada = _carregar_modelos(session), versao
+            return _modelos
+    finally:
+        session.close()
+
+
+def prever(juizes, embedding, area, risco, tema=None):
+    """
+    Probabilidades {classe: 0-1} do desfecho de uma petição com os modelos dos
+    `juizes` (média ponderada pelo nº de amostras, se houver mais de um), já
+    ajustadas pelo histórico do `tema`. None se nenhum dos juízes tem modelo.
+    Também devolve "n_amostras" e "n_tema" (decisões do tema no histórico).
+    """
+    carregados = modelos_carregados()
+    modelos = [carregados[j] for j in juizes if j in carregados]
+    if not modelos:
+        return None
+    x = _com_vies(variaveis(aderencia.normalizar(embedding), [area], [risco]))[0]
+
+    total = sum(m["n_amostras"] for m in modelos)
+    probabilidades = sum(
+        _softmax(x @ m["W"]) * (m["n_amostras"] / total) for m in modelos
+    )
+    # O modelo aprendeu a proporção de desfechos do juiz como um todo; troca
+    # essa proporção pela do tema (suavizada em direção à do juiz)
+    contagem_juiz = np.ones(len(CLASSES))  # +1: nenhuma classe com taxa zero
+    contagem_tema = np.zeros(len(CLASSES))
+    for m in modelos:
+        contagem_juiz += np.sum(list(m["temas"].values()), axis=0)
+        contagem_tema += m["temas"].get(tema, [0] * len(CLASSES))
+    taxa_juiz = contagem_juiz / contagem_juiz.sum()
+    n_tema = int(contagem_tema.sum())
+    taxa_tema = (contagem_tema + ALFA_TEMA * taxa_juiz) / (n_tema + ALFA_TEMA)
+    probabilidades = probabilidades * taxa_tema / taxa_juiz
+    probabilidades /= probabilidades.sum()
+
+    return {
+        **{classe: float(p) for classe, p in zip(CLASSES, probabilidades)},
+        "n_amostras": total,
+        "n_tema": n_tema,
+    }
+
+
+if __name__ == "__main__":
+    forcar = "--forcar" in sys.argv
+    print("📈 Treinando modelos de desfecho por juiz...")
+    treinados = treinar(
+        forcar=forcar, ao_progresso=lambda feitos, total, msg: print(f"   {msg}")
+    )
+    print(f"✅ {treinados} modelos (re)treinados.")
@@ -0,0 +1,306 @@
+"""
+Perfilamento opcional da API e do dashboard, para investigar lentidão
+relatada por usuários. Desligado por padrão; liga com PROLOGOS_PERFIL=1.
+
+- API (main.py): um middleware grava, por requisição, rota, status, tempo
+  total e as consultas SQL feitas (quantidade e tempo, via eventos do
+  SQLAlchemy; as mais lentas vão junto quando a requisição é lenta). Em
+  respostas em streaming (exportação, eventos) o tempo vai até o início do
+  corpo.
+- cProfile: uma amostra das requisições (PROLOGOS_PERFIL_AMOSTRA) roda com
+  o profiler; o .prof só é guardado se a requisição passou de
+  PROLOGOS_PERFIL_LENTO_MS. Um profiler por vez; ele cobre a thread do event
+  loop (rotas async). Rotas síncronas rodam no threadpool: delas ficam o
+  tempo e o SQL, não o perfil de chamadas.
+- Dashboard (app.py): `with perfilamento.secao("encode"):` em volta das
+  etapas (carga de dados, encode, chamada ao LLM), com o SQL de cada uma.
+
+Os traços vão para DIR_PERFIL/tracos.jsonl (uma linha JSON por traço,
+rotacionado por tamanho) e os perfis para DIR_PERFIL/perfis/ (os
+MAX_PERFIS mais recentes).
+
+Uso:
+    python perfilamento.py relatorio [--origem api|app] [--ultimos 5000]
+    python perfilamento.py perfil dados/perfil/perfis/<arquivo>.prof
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+ATIVO = os.getenv("PROLOGOS_PERFIL", "").lower() in ("1", "true", "sim")
+DIR_PERFIL = os.getenv("PROLOGOS_PERFIL_DIR", "./dados/perfil")
+LENTO_MS = float(os.getenv("PROLOGOS_PERFIL_LENTO_MS", "500"))
+AMOSTRA_CPROFILE = float(os.getenv("PROLOGOS_PERFIL_AMOSTRA", "0.1"))
+MAX_BYTES_TRACOS = 5 * 1024 * 1024
+ARQUIVOS_TRACOS = 5  # tracos.jsonl + 4 rotacionados
+MAX_PERFIS = 50
+SQL_LENTAS_POR_TRACO = 10
+
+_traco_atual = ContextVar("traco_atual", default=None)
+_trava_profiler = threading.Lock()  # cProfile não aninha: um por vez
+_logger = None
+
+
+class Traco:
+    """Tempo e SQL de uma requisição ou seção do app."""
+
+    def __init__(self, origem, nome):
+        self.origem = origem
+        self.nome = nome
+        self.inicio = time.perf_counter()
+        self.sql_n = 0
+        self.sql_ms = 0.0
+        self.sql_lentas = []  # (ms, sql), só as SQL_LENTAS_POR_TRACO piores
+
+    def registrar_sql(self, ms, sql):
+        self.sql_n += 1
+        self.sql_ms += ms
+        self.sql_lentas.append((ms, sql))
+        if len(self.sql_lentas) > SQL_LENTAS_POR_TRACO * 2:
+            self.sql_lentas.sort(reverse=True)
+            del self.sql_lentas[SQL_LENTAS_POR_TRACO:]
+
+    def como_dict(self, **extras):
+        ms = (time.perf_counter() - self.inicio) * 1000
+        registro = {
+            "em": datetime.now().isoformat(timespec="milliseconds"),
+            "origem": self.origem,
+            "nome": self.nome,
+            "ms": round(ms, 2),
+            "sql_n": self.sql_n,
+            "sql_ms": round(self.sql_ms, 2),
+            **extras,
+        }
+        if ms >= LENTO_MS:
+            registro["sql_lentas"] = [
+                {"ms": round(t, 2), "sql": sql[:300]}
+                for t, sql in sorted(self.sql_lentas, reverse=True)[
+                    :SQL_LENTAS_POR_TRACO
+                ]
+            ]
+        return registro
+
+
+# --- GRAVAÇÃO ---
+
+
+def _gravar(registro):
+    global _logger
+    if _logger is None:
+        os.makedirs(DIR_PERFIL, exist_ok=True)
+        handler = RotatingFileHandler(
+            os.path.join(DIR_PERFIL, "tracos.jsonl"),
+            maxBytes=MAX_BYTES_TRACOS,
+            backupCount=ARQUIVOS_TRACOS - 1,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger("prologos.perfil")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+        _logger = logger
+    _logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+def _guardar_perfil(profiler, nome):
+    pasta = os.path.join(DIR_PERFIL, "perfis")
+    os.makedirs(pasta, exist_ok=True)
+    seguro = re.sub(r"[^\w.-]+", "_", nome).strip("_")[:60]
+    arquivo = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{seguro}.prof"
+    profiler.dump_stats(os.path.join(pasta, arquivo))
+    antigos = sorted(os.listdir(pasta))[:-MAX_PERFIS]
+    for velho in antigos:
+        try:
+            os.remove(os.path.join(pasta, velho))
+        except OSError:
+            pass
+    return arquivo
+
+
+# --- SQL (eventos do SQLAlchemy) ---
+
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("perfil_inicio", []).append(time.perf_counter())
+
+
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("perfil_inicio")
+    if not inicios:
+        return
+    ms = (time.perf_counter() - inicios.pop()) * 1000
+    traco = _traco_atual.get()
+    if traco is not None:
+        traco.registrar_sql(ms, statement)
+
+
+def instrumentar_sql():
+    """Liga a contagem de SQL em todos os engines (sync e async)."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if not event.contains(Engine, "before_cursor_execute", _antes_sql):
+        event.listen(Engine, "before_cursor_execute", _antes_sql)
+        event.listen(Engine, "after_cursor_execute", _depois_sql)
+        # Erros de SQL não passam pelo after_cursor_execute: limpa a pilha
+        event.listen(Engine, "handle_error", _erro_sql)
+
+
+def _erro_sql(contexto):
+    conn = contexto.connection
+    if conn is not None and conn.info.get("perfil_inicio"):
+        conn.info["perfil_inicio"].pop()
+
+
+# --- API ---
+
+
+def instrumentar_api(app):
+    """Registra o middleware de traços no app FastAPI (se ATIVO)."""
+    if not ATIVO:
+        return
+    instrumentar_sql()
+
+    @app.middleware("http")
+    async def _perfilar_requisicao(request, call_next):
+        traco = Traco("api", f"{request.method} {request.url.path}")
+        token = _traco_atual.set(traco)
+        profiler = None
+        if random.random() < AMOSTRA_CPROFILE and _trava_profiler.acquire(
+            blocking=False
+        ):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        status = 500
+        try:
+            resposta = await call_next(request)
+            status = resposta.status_code
+            return resposta
+        finally:
+            if profiler:
+                profiler.disable()
+                _trava_profiler.release()
+            _traco_atual.reset(token)
+            # Rota com parâmetros ("/tarefas/{tarefa_id}") agrupa no relatório
+            rota = request.scope.get("route")
+            if rota is not None:
+                traco.nome = f"{request.method} {rota.path}"
+            registro = traco.como_dict(status=status)
+            if profiler and registro["ms"] >= LENTO_MS:
+                registro["perfil"] = _guardar_perfil(profiler, traco.nome)
+            _gravar(registro)
+
+
+# --- DASHBOARD ---
+
+
+@contextmanager
+def secao(nome):
+    """Cronometra uma etapa do app (com o SQL dela) quando ATIVO."""
+    if not ATIVO:
+        yield
+        return
+    instrumentar_sql()
+    traco = Traco("app", nome)
+    token = _traco_atual.set(traco)
+    try:
+        yield
+    finally:
+        _traco_atual.reset(token)
+        _gravar(traco.como_dict())
+
+
+# --- RELATÓRIO ---
+
+
+def ler_tracos(ultimos=None):
+    """Traços gravados, do mais antigo ao mais recente (inclui os rotacionados)."""
+    base = os.path.join(DIR_PERFIL, "tracos.jsonl")
+    arquivos = [f"{base}.{i}" for i in range(ARQUIVOS_TRACOS - 1, 0, -1)] + [base]
+    tracos = []
+    for arquivo in arquivos:
+        try:
+            with open(arquivo, encoding="utf-8") as f:
+                tracos.extend(json.loads(linha) for linha in f if linha.strip())
+        except FileNotFoundError:
+            continue
+    return tracos[-ultimos:] if ultimos else tracos
+
+
+def relatorio(origem=None, ultimos=None, lentos=10):
+    tracos = [t for t in ler_tracos(ultimos) if origem in (None, t["origem"])]
+    if not tracos:
+        print(f"Nenhum traço em {DIR_PERFIL} (ligue com PROLOGOS_PERFIL=1).")
+        return
+    grupos = {}
+    for t in tracos:
+        grupos.setdefault((t["origem"], t["nome"]), []).append(t)
+
+    print(
+        f"{'origem':<6} {'nome':<40} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'máx ms':>9} {'SQL/req':>8} {'SQL ms':>8}"
+    )
+    for (orig, nome), itens in sorted(
+        grupos.items(), key=lambda g: -sum(t["ms"] for t in g[1])
+    ):
+        ms = np.array([t["ms"] for t in itens])
+        print(
+            f"{orig:<6} {nome[:40]:<40} {len(itens):>6} "
+            f"{np.percentile(ms, 50):>9.1f} {np.percentile(ms, 95):>9.1f} "
+            f"{ms.max():>9.1f} {np.mean([t['sql_n'] for t in itens]):>8.1f} "
+            f"{np.mean([t['sql_ms'] for t in itens]):>8.1f}"
+        )
+
+    print(f"\n🐢 {lentos} mais lentos:")
+    for t in sorted(tracos, key=lambda t: -t["ms"])[:lentos]:
+        perfil = f"  perfil: {t['perfil']}" if t.get("perfil") else ""
+        print(
+            f"{t['em']}  {t['ms']:>9.1f} ms  {t['sql_n']:>4} SQL "
+            f"({t['sql_ms']:.1f} ms)  {t['nome']}{perfil}"
+        )
+        for consulta in t.get("sql_lentas", [])[:3]:
+            print(f"      {consulta['ms']:>8.1f} ms  {consulta['sql'][:100]}")
+
+
+def mostrar_perfil(arquivo, linhas=25):
+    if not os.path.exists(arquivo):
+        arquivo = os.path.join(DIR_PERFIL, "perfis", arquivo)
+    saida = io.StringIO()
+    pstats.Stats(arquivo, stream=saida).sort_stats("cumulative").print_stats(linhas)
+    print(saida.getvalue())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Traços de desempenho do PRÓLOGOS.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_relatorio = sub.add_parser("relatorio", help="resumo por rota/seção")
+    p_relatorio.add_argument("--origem", choices=["api", "app"])
+    p_relatorio.add_argument("--ultimos", type=int, help="só os N traços mais recentes")
+    p_relatorio.add_argument("--lentos", type=int, default=10)
+    p_perfil = sub.add_parser("perfil", help="top funções de um .prof")
+    p_perfil.add_argument("arquivo")
+    p_perfil.add_argument("--linhas", type=int, default=25)
+    args = parser.parse_args()
+
+    if args.comando == "relatorio":
+        relatorio(args.origem, args.ultimos, args.lentos)
+    else:
+        mostrar_perfil(args.arquivo, args.linhas)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from datetime import date
-from typing import Optional, List
+from datetime import date, datetime
+from typing import Any, Dict, Optional, List
 
 
 # Schema base para Juiz
@@ -32,3 +32,58 @@ class DecisaoResponse(DecisaoBase):
 
     class Config:
         from_attributes = True
+
+
+# Decisão com projeção (?fields=): só os campos pedidos vêm preenchidos
+class DecisaoParcial(BaseModel):
+    id: Optional[int] = None
+    numero_processo: Optional[str] = None
+    texto_decisao: Optional[str] = None
+    resultado: Optional[str] = None
+    tema: Optional[str] = None
+    data_decisao: Optional[date] = None
+    juiz_id: Optional[int] = None
+
+
+# Assunto da Tabela Processual Unificada (CNJ); `codigo` filtra /decisoes/
+class TemaResponse(BaseModel):
+    codigo: int
+    nome: str
+
+
+# Páginas com cursor (keyset): passe `proximo_cursor` como `cursor` na próxima chamada
+class PaginaJuizes(BaseModel):
+    itens: List[JuizResponse]
+    proximo_cursor: Optional[str] = None
+
+
+class PaginaDecisoes(BaseModel):
+    itens: List[DecisaoParcial]
+    proximo_cursor: Optional[str] = None
+
+
+# Resultado da busca textual (/busca), do mais relevante para o menos
+class ResultadoBusca(BaseModel):
+    id: int
+    numero_processo: str
+    tema: Optional[str] = None
+    data_decisao: Optional[date] = None
+    juiz_id: Optional[int] = None
+    score: float
+    trecho: Optional[str] = None  # HTML escapado, com os termos entre <b></b>
+
+
+# Tarefa da fila em segundo plano (/tarefas/{id}); progresso vai de 0 a 1
+class TarefaStatus(BaseModel):
+    id: int
+    tipo: str
+    chave: str
+    status: str
+    prioridade: int
+    progresso: float
+    mensagem: Optional[str] = None
+    resultado: Optional[Dict[str, Any]] = None
+    tentativas: int
+    criada_em: datetime
+    iniciada_em: Optional[datetime] = None
+    concluida_em: Optional[datetime] = None
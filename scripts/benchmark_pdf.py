@@ -0,0 +1,122 @@
+"""Benchmark for petition text extraction (see extracao_pdf.py).
+
+Builds large PDFs from `peticao_teste.pdf` (its pages repeated up to --pages)
+and, when Pillow is available, an image-only "scanned" PDF of the same size,
+then compares:
+
+* baseline: the analyzer's old `"".join(p.extract_text() for p in pages)[:6000]`;
+* lazy: extracao_pdf.extrair_texto with the 6000-character limit, no cache;
+* cached: the same call again (what every Streamlit rerun now costs);
+* full text: limite=None (every page, serially).
+
+    python scripts/benchmark_pdf.py [--pages 300] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pypdf import PdfReader, PdfWriter  # noqa: E402
+
+import extracao_pdf  # noqa: E402
+
+BASE_PDF = os.path.join(os.path.dirname(__file__), "..", "peticao_teste.pdf")
+
+
+def _text_pdf(pages):
+    source = PdfReader(BASE_PDF)
+    writer = PdfWriter()
+    while len(writer.pages) < pages:
+        for page in source.pages:
+            if len(writer.pages) == pages:
+                break
+            writer.add_page(page)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _scanned_pdf(pages):
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return None
+    images = []
+    for i in range(pages):
+        image = Image.new("L", (1240, 1754), 255)  # A4 at 150 dpi
+        draw = ImageDraw.Draw(image)
+        for line in range(40):
+            draw.text((100, 100 + line * 40), f"page {i + 1} line {line + 1}", 0)
+        images.append(image)
+    out = io.BytesIO()
+    images[0].save(out, "PDF", save_all=True, append_images=images[1:])
+    return out.getvalue()
+
+
+def _baseline(data):
+    reader = PdfReader(io.BytesIO(data))
+    return "".join([p.extract_text() for p in reader.pages])[:6000]
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Keep the benchmark's disk cache away from the app's
+    extracao_pdf.CACHE_DIR = tempfile.mkdtemp(prefix="benchmark_pdf_")
+
+    with open(BASE_PDF, "rb") as f:
+        documents = [("peticao_teste.pdf", f.read())]
+    documents.append((f"text, {args.pages} pages", _text_pdf(args.pages)))
+    scanned = _scanned_pdf(args.pages)
+    if scanned is None:
+        print("Pillow not installed: skipping the scanned PDF.")
+    else:
+        documents.append((f"scanned, {args.pages} pages", scanned))
+
+    for name, data in documents:
+        first = extracao_pdf.extrair_texto(data, usar_cache=False)
+        print(
+            f"\n{name} ({len(data) / 1024:.0f} KiB, {first['paginas']} pages, "
+            f"{first['paginas_lidas']} read for {len(first['texto'])} chars, "
+            f"{first['paginas_sem_texto']} without text)"
+        )
+        print(f"{'':<36}{'ms (median)':>14}")
+
+        extracao_pdf.extrair_texto(data)  # warms the cache
+
+        for label, fn in [
+            ("baseline (all pages, then [:6000])", lambda: _baseline(data)),
+            (
+                "lazy, 6000 chars",
+                lambda: extracao_pdf.extrair_texto(data, usar_cache=False),
+            ),
+            ("cached (rerun)", lambda: extracao_pdf.extrair_texto(data)),
+            (
+                "full text",
+                lambda: extracao_pdf.extrair_texto(data, limite=None, usar_cache=False),
+            ),
+        ]:
+            print(f"{label:<36}{_median_ms(fn, args.repeat):>14.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
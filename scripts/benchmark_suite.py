@@ -0,0 +1,320 @@
+"""Benchmark suite for the ingest, classify and read hot paths.
+
+Runs against a fresh SQLite database in a temporary directory (or
+--database-url), filled with synthetic DataJud processes from
+fake_datajud.py, and times:
+
+* extrair_teor: ingestor_datajud.extrair_teor_decisao, per process;
+* salvar_lote: ingestor_datajud.salvar_lote, per page of --page-size hits;
+* normalizar_processos: analise_juridica.normalizar_processos, per page of ids
+  (what each clone does);
+* carregar_decisoes: consultas.carregar_decisoes for random judges (the
+  dashboard's data load);
+* api_juizes / api_decisoes: GET /juizes/ and GET /decisoes/ (cursor pages,
+  optional filters) through FastAPI's TestClient;
+* encode: the sentence-transformers model used for adherence, in batches.
+
+Each stage reports item throughput, p50/p99 latency of its unit of work and
+the process peak RSS so far, as JSON (stdout or --output). Compare two runs,
+e.g. before/after a commit, with --compare:
+
+    python scripts/benchmark_suite.py --docs 100k --output after.json
+    python scripts/benchmark_suite.py --compare before.json after.json
+
+--docs accepts 1k, 100k, 1M, ...
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_datajud  # noqa: E402
+
+STAGES = [
+    "extrair_teor",
+    "salvar_lote",
+    "normalizar_processos",
+    "carregar_decisoes",
+    "api_juizes",
+    "api_decisoes",
+    "encode",
+]
+
+
+def _count(text):
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    text = text.strip().lower()
+    if text[-1:] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(text)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Stage:
+    """Collects per-unit latencies and the number of items processed."""
+
+    def __init__(self):
+        self.latencies = []
+        self.items = 0
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def unit(self, items=1):
+        """Times the block; set `.items` on the yielded object if not known yet."""
+        unit = SimpleNamespace(items=items)
+        start = time.perf_counter()
+        yield unit
+        self.latencies.append(time.perf_counter() - start)
+        self.items += unit.items
+
+    def report(self):
+        total = sum(self.latencies)
+        latencies_ms = np.array(self.latencies) * 1000
+        return {
+            "items": self.items,
+            "units": len(self.latencies),
+            "total_s": round(total, 4),
+            "wall_s": round(time.perf_counter() - self.start, 4),
+            "throughput_per_s": round(self.items / total, 1) if total else None,
+            "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    # The application modules read DATABASE_URL at import time
+    if not args.database_url:
+        workdir = tempfile.mkdtemp(prefix="benchmark_suite_")
+        args.database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+
+    import aderencia
+    import analise_juridica
+    import compressao
+    import consultas
+    import ingestor_datajud
+    import migracoes
+    from database_models import SessionLocal, Decisao, Juiz
+
+    migracoes.atualizar_banco()
+    rng = random.Random(args.seed)
+    results = {}
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    def wanted(name):
+        return name in args.stages
+
+    # --- ingest ---
+    teor, lote, classify = Stage(), Stage(), Stage()
+    for page in fake_datajud.search_pages(
+        args.docs, args.page_size, seed=args.seed, courts=args.courts
+    ):
+        hits = page["hits"]["hits"]
+        if wanted("extrair_teor"):
+            for hit in hits:
+                with teor.unit():
+                    ingestor_datajud.extrair_teor_decisao(hit["_source"])
+        with lote.unit(len(hits)):
+            stats = ingestor_datajud.salvar_lote(hits, "TJSP", "SP")
+        if wanted("normalizar_processos"):
+            with quiet, classify.unit(len(stats["ids"])):
+                analise_juridica.normalizar_processos(ids=stats["ids"])
+    if wanted("extrair_teor"):
+        results["extrair_teor"] = teor.report()
+    if wanted("salvar_lote"):
+        results["salvar_lote"] = lote.report()
+    if wanted("normalizar_processos"):
+        results["normalizar_processos"] = classify.report()
+
+    session = SessionLocal()
+    try:
+        judges = [
+            (juiz_id, nome)
+            for juiz_id, nome in session.query(Juiz.id, Juiz.nome).order_by(Juiz.id)
+        ]
+        # What indexar_pendentes encodes: theme + decompressed text
+        texts = [
+            aderencia.texto_para_embedding(tema, compressao.descomprimir(blob))
+            for tema, blob in session.query(Decisao.tema, Decisao.texto_comprimido)
+            .order_by(Decisao.id)
+            .limit(args.encode_docs)
+        ]
+    finally:
+        session.close()
+
+    # --- reads ---
+    if wanted("carregar_decisoes"):
+        stage = Stage()
+        for _ in range(args.reads):
+            juiz_id, _ = rng.choice(judges)
+            with stage.unit() as unit:
+                unit.items = len(consultas.carregar_decisoes(juiz_id))  # rows loaded
+        results["carregar_decisoes"] = stage.report()
+
+    if wanted("api_juizes") or wanted("api_decisoes"):
+        try:
+            from fastapi.testclient import TestClient
+        except (ImportError, RuntimeError) as error:  # TestClient needs httpx
+            print(f"Skipping API stages: {error}", file=sys.stderr)
+        else:
+            import main
+
+            client = TestClient(main.app)
+            if wanted("api_juizes"):
+                stage = Stage()
+                for _ in range(args.reads):
+                    with stage.unit():
+                        client.get("/juizes/", params={"limit": 100}).raise_for_status()
+                results["api_juizes"] = stage.report()
+            if wanted("api_decisoes"):
+                stage = Stage()
+                for i in range(args.reads):
+                    params = {"limit": 100, "ordem": "data" if i % 2 else "id"}
+                    if i % 3 == 0:
+                        params["juiz_id"] = rng.choice(judges)[0]
+                    with stage.unit():
+                        response = client.get("/decisoes/", params=params)
+                        response.raise_for_status()
+                    # follow one cursor page, as a paging client would
+                    cursor = response.json()["proximo_cursor"]
+                    if cursor:
+                        with stage.unit():
+                            client.get(
+                                "/decisoes/", params={**params, "cursor": cursor}
+                            ).raise_for_status()
+                results["api_decisoes"] = stage.report()
+
+    if wanted("encode"):
+        try:
+            model = aderencia.carregar_modelo()
+        except ImportError as error:
+            print(f"Skipping encode: {error}", file=sys.stderr)
+        else:
+            model.encode(texts[:8])  # load weights outside the timing
+            stage = Stage()
+            batch = aderencia.LOTE_EMBEDDINGS
+            for start in range(0, len(texts), batch):
+                chunk = texts[start : start + batch]
+                with stage.unit(len(chunk)):
+                    model.encode(chunk, batch_size=batch, convert_to_numpy=True)
+            results["encode"] = stage.report()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": args.database_url.split("://")[0],
+            "docs": args.docs,
+            "page_size": args.page_size,
+            "courts": args.courts,
+            "seed": args.seed,
+            "judges": len(judges),
+        },
+        "results": results,
+    }
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(
+        f"before: {before['meta'].get('commit')} ({before['meta']['docs']} docs)  "
+        f"after: {after['meta'].get('commit')} ({after['meta']['docs']} docs)"
+    )
+    print(
+        f"{'stage':<22}{'items/s before':>16}{'after':>12}{'p50 ms':>10}"
+        f"{'after':>10}{'p99 ms':>10}{'after':>10}"
+    )
+    for stage in STAGES:
+        a, b = before["results"].get(stage), after["results"].get(stage)
+        if not a or not b:
+            continue
+        print(
+            f"{stage:<22}{a['throughput_per_s'] or 0:>16.0f}"
+            f"{b['throughput_per_s'] or 0:>12.0f}"
+            f"{a['p50_ms']:>10.2f}{b['p50_ms']:>10.2f}"
+            f"{a['p99_ms']:>10.2f}{b['p99_ms']:>10.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=_count, default=_count("1k"))
+    parser.add_argument("--page-size", type=int, default=50, help="hits per page")
+    parser.add_argument("--courts", type=int, default=200, help="órgãos julgadores")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--reads", type=int, default=200, help="requests per read stage"
+    )
+    parser.add_argument("--encode-docs", type=_count, default=2000)
+    parser.add_argument(
+        "--stages",
+        type=lambda s: s.split(","),
+        default=STAGES,
+        help=f"comma-separated subset of: {','.join(STAGES)}",
+    )
+    parser.add_argument("--database-url", help="default: a temporary SQLite file")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two reports"
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Storage benchmark for the compressed `texto_decisao` (see compressao.py).
+
+Reports, against the database in DATABASE_URL:
+
+* size: raw UTF-8 vs. per-row deflate without a dictionary vs. with a freshly
+  trained shared dictionary vs. what is actually stored in `texto_comprimido`;
+* read latency: listing rows without the text (what the dashboard and the API
+  do by default) vs. the same rows with the text decompressed, both through
+  Core and through the ORM (deferred vs. undeferred columns).
+
+    python scripts/benchmark_text_storage.py [--rows 5000] [--repeat 5]
+
+Run `python migracoes.py` first so the texts are already compressed.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.orm import undefer_group  # noqa: E402
+
+import compressao  # noqa: E402
+from database_models import SessionLocal, Decisao  # noqa: E402
+
+LIST_COLUMNS = [
+    Decisao.id,
+    Decisao.numero_processo,
+    Decisao.tema,
+    Decisao.resultado,
+    Decisao.data_decisao,
+]
+
+
+def _deflate_size(texts, zdict=None):
+    total = 0
+    for texto in texts:
+        if zdict:
+            c = zlib.compressobj(compressao.NIVEL, zlib.DEFLATED, -15, zdict=zdict)
+        else:
+            c = zlib.compressobj(compressao.NIVEL, zlib.DEFLATED, -15)
+        # Same rule as compressao.comprimir: never store more than raw + 1 byte
+        raw = len(texto.encode("utf-8"))
+        total += min(len(c.compress(texto.encode("utf-8")) + c.flush()), raw) + 1
+    return total
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000, help="rows per read test")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        blobs = session.execute(
+            select(Decisao.texto_comprimido).where(
+                Decisao.texto_comprimido.is_not(None)
+            )
+        ).scalars()
+        stored = [bytes(b) for b in blobs]
+        texts = [compressao.descomprimir(b) for b in stored]
+        if not texts:
+            print("No compressed texts found (run `python migracoes.py` first).")
+            return 1
+
+        raw = sum(len(t.encode("utf-8")) for t in texts)
+        zdict = compressao.treinar_dicionario(texts[: compressao.AMOSTRA_TREINO])
+        sizes = [
+            ("raw UTF-8", raw),
+            ("deflate, no dictionary", _deflate_size(texts)),
+            (
+                f"deflate, fresh dictionary ({len(zdict)} B)",
+                _deflate_size(texts, zdict),
+            ),
+            ("stored (texto_comprimido)", sum(len(b) for b in stored)),
+        ]
+
+        print(f"\n{len(texts)} texts, average {raw / len(texts):.0f} bytes\n")
+        print(f"{'size':<44}{'bytes':>12}{'ratio':>8}")
+        for label, size in sizes:
+            print(f"{label:<44}{size:>12}{raw / size:>7.2f}x")
+
+        n = args.rows
+        list_only = select(*LIST_COLUMNS).order_by(Decisao.id).limit(n)
+        with_text = (
+            select(*LIST_COLUMNS, Decisao.texto_comprimido)
+            .order_by(Decisao.id)
+            .limit(n)
+        )
+
+        def core_list():
+            session.execute(list_only).all()
+
+        def core_text():
+            for linha in session.execute(with_text):
+                compressao.descomprimir(linha.texto_comprimido)
+
+        def orm_deferred():
+            session.expunge_all()
+            session.query(Decisao).order_by(Decisao.id).limit(n).all()
+
+        def orm_text():
+            session.expunge_all()
+            for d in (
+                session.query(Decisao)
+                .options(undefer_group("texto"))
+                .order_by(Decisao.id)
+                .limit(n)
+            ):
+                d.texto_decisao
+
+        def decompress_only():
+            for b in stored[:n]:
+                compressao.descomprimir(b)
+
+        rows = min(n, session.scalar(select(func.count(Decisao.id))))
+        print(f"\n{'read latency, ' + str(rows) + ' rows (median)':<44}{'ms':>12}")
+        for label, fn in [
+            ("Core, list columns only", core_list),
+            ("Core, + text decompressed", core_text),
+            ("ORM, text deferred", orm_deferred),
+            ("ORM, text undeferred + decompressed", orm_text),
+            ("decompression alone", decompress_only),
+        ]:
+            print(f"{label:<44}{_median_ms(fn, args.repeat):>12.2f}")
+
+        per_text_us = (
+            _median_ms(decompress_only, args.repeat) * 1000 / min(n, len(stored))
+        )
+        print(f"\n~{per_text_us:.1f} µs to decompress one text")
+    finally:
+        session.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
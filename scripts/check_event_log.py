@@ -0,0 +1,114 @@
+"""Check that the change-event log (eventos.py) never loses events.
+
+Runs against a fresh SQLite database in a temporary directory: ingests
+synthetic DataJud pages (fake_datajud.py), processes the log, which compacts
+it, ingests again and processes again. Every pass must deliver exactly the
+events written since the previous one, and new ids must stay above the
+checkpoints after compaction. Re-ingesting an unchanged page must write no
+events. It also checks that migration 009 rebuilds a log table created
+without AUTOINCREMENT and re-delivers the events that were left in it.
+
+The real consumers (embeddings, models, dossiers) are swapped for a counter,
+so no model needs to be installed. Exits 1 on failure.
+
+    python scripts/check_event_log.py
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_datajud  # noqa: E402
+
+
+def main():
+    # The application modules read DATABASE_URL at import time
+    workdir = tempfile.mkdtemp(prefix="check_event_log_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'eventos.db')}"
+
+    import eventos
+    import ingestor_datajud
+    import migracoes
+    from sqlalchemy import text
+    from database_models import SessionLocal, EventoDecisao, engine
+
+    migracoes.atualizar_banco()
+    delivered = []
+    eventos.CONSUMIDORES.clear()
+
+    @eventos.consumidor("counter")
+    def _counter(batch, _progress):
+        delivered.extend(batch)
+
+    pages = list(fake_datajud.search_pages(90, 30, seed=1, courts=3))
+    failures = []
+
+    def check(name, condition):
+        print(f"[{'ok' if condition else 'FAIL'}] {name}")
+        if not condition:
+            failures.append(name)
+
+    def ingest(page):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ingestor_datajud.salvar_lote(page["hits"]["hits"], "TJSP", "SP")
+
+    def process():
+        delivered.clear()
+        return eventos.processar(janela_s=0)["counter"]
+
+    def log_rows():
+        session = SessionLocal()
+        try:
+            return session.query(EventoDecisao).count()
+        finally:
+            session.close()
+
+    ingest(pages[0])
+    check("first pass delivers the first page", process() == 30)
+    check("processed events are compacted", log_rows() == 0)
+    ingest(pages[1])
+    check("after compaction, new events are delivered", process() == 30)
+    check("an empty log delivers nothing", process() == 0)
+    stats = ingest(pages[1])
+    check(
+        "re-ingesting an unchanged page writes no events",
+        stats["atualizados"] == 0 and process() == 0,
+    )
+
+    # Log table as created before AUTOINCREMENT, with ids below the checkpoint
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE eventos_decisoes"))
+        conn.execute(
+            text(
+                "CREATE TABLE eventos_decisoes (id INTEGER NOT NULL, tipo VARCHAR, "
+                "decisao_id INTEGER, juiz_id INTEGER, criado_em DATETIME, "
+                "PRIMARY KEY (id))"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO eventos_decisoes (id, tipo, decisao_id, criado_em) "
+                "VALUES (1, 'inserida', 1, '2000-01-01'), "
+                "(2, 'inserida', 2, '2000-01-01')"
+            )
+        )
+        conn.execute(text("DELETE FROM schema_migracoes WHERE versao = :v"), {"v": 9})
+    migracoes.atualizar_banco()
+    check("migration 009 re-delivers events left in the old table", process() == 2)
+    ingest(pages[2])
+    check("migrated log keeps ids above the checkpoints", process() == 30)
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed.")
+        sys.exit(1)
+    print("\nEvent log OK.")
+
+
+if __name__ == "__main__":
+    main()
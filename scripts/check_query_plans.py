@@ -0,0 +1,168 @@
+"""EXPLAIN-based check that the hot queries use the indexes.
+
+Runs EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (PostgreSQL) for the queries used by
+the dashboard, the API and the ingestor, against the database in DATABASE_URL,
+and fails (exit 1) when one of them falls back to a full table scan. The
+dashboard and dossier queries are not written out here: the real functions run
+for one judge and the SQL they send is captured and explained.
+
+    python scripts/check_query_plans.py
+
+Run `python migracoes.py` first so the indexes exist.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import event, text  # noqa: E402
+
+import consultas  # noqa: E402
+import dossie  # noqa: E402
+from database_models import SessionLocal, engine, engine_leitura  # noqa: E402
+
+
+def _dossier_decisions(juiz_id):
+    session = SessionLocal()
+    try:
+        dossie._carregar_decisoes(session, juiz_id)
+    finally:
+        session.close()
+
+
+# name -> (function of a judge id, tables that must not be fully scanned)
+CODE_QUERIES = {
+    "dashboard: latest decisions of a judge": (
+        lambda juiz_id: consultas.carregar_decisoes(juiz_id, limite=10),
+        ["decisoes", "juizes"],
+    ),
+    "dashboard: decision count of a judge": (
+        consultas.contar_decisoes,
+        ["estatisticas_decisoes"],
+    ),
+    "dashboard: theme distribution of a judge": (
+        consultas.distribuicao_temas,
+        ["decisoes", "decisoes_temas", "temas"],
+    ),
+    "dossier: all decisions of a judge": (_dossier_decisions, ["decisoes"]),
+}
+
+# name -> (SQL, bind params, tables that must not be fully scanned)
+HOT_QUERIES = {
+    "api: decisions of a judge in a date range": (
+        "SELECT id FROM decisoes WHERE juiz_id = :juiz "
+        "AND data_decisao BETWEEN :ini AND :fim ORDER BY data_decisao, id",
+        {"juiz": 1, "ini": "2020-01-01", "fim": "2024-12-31"},
+        ["decisoes"],
+    ),
+    "api: page of decisions by date (keyset)": (
+        "SELECT id FROM decisoes WHERE data_decisao IS NOT NULL "
+        "AND (data_decisao < :d OR (data_decisao = :d AND id < :id)) "
+        "ORDER BY data_decisao DESC, id DESC LIMIT 50",
+        {"d": "2023-01-01", "id": 100},
+        ["decisoes"],
+    ),
+    "api: page of undated decisions (keyset)": (
+        "SELECT id FROM decisoes WHERE data_decisao IS NULL AND id < :id "
+        "ORDER BY id DESC LIMIT 50",
+        {"id": 100},
+        ["decisoes"],
+    ),
+    "api: page of decisions by id (keyset)": (
+        "SELECT id FROM decisoes WHERE id > :id ORDER BY id LIMIT 50",
+        {"id": 100},
+        ["decisoes"],
+    ),
+    "ingest: decision by process number": (
+        "SELECT id FROM decisoes WHERE numero_processo = :numero",
+        {"numero": "00000000000000000000"},
+        ["decisoes"],
+    ),
+    "ingest: judge by tribunal + orgao": (
+        "SELECT id FROM juizes WHERE tribunal_id = :trib AND orgao_codigo = :orgao",
+        {"trib": 1, "orgao": "123"},
+        ["juizes"],
+    ),
+    "ingest: legacy judge by name": (
+        "SELECT id FROM juizes WHERE tribunal_id = :trib AND nome = :nome "
+        "AND orgao_codigo IS NULL",
+        {"trib": 1, "nome": "x"},
+        ["juizes"],
+    ),
+}
+
+
+def _plan(conn, sql, params, driver_sql=False):
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    if driver_sql:  # captured statement, in the driver's own paramstyle
+        rows = conn.exec_driver_sql(prefix + sql, params).all()
+    else:
+        rows = conn.execute(text(prefix + sql), params).all()
+    column = -1 if engine.dialect.name == "sqlite" else 0
+    return [row[column] for row in rows]
+
+
+def _captured(function, juiz_id):
+    """(SQL, params) of every SELECT `function(juiz_id)` sends to the database."""
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    for target in {engine, engine_leitura}:
+        event.listen(target, "before_cursor_execute", _capture)
+    try:
+        function(juiz_id)
+    finally:
+        for target in {engine, engine_leitura}:
+            event.remove(target, "before_cursor_execute", _capture)
+    return statements
+
+
+def _full_scans(plan, tables):
+    scans = []
+    for line in plan:
+        for table in tables:
+            if engine.dialect.name == "sqlite":
+                # "SCAN decisoes" is a full scan; "SCAN ... USING INDEX" is not
+                if line.startswith(f"SCAN {table}") and "INDEX" not in line:
+                    scans.append(line)
+            elif f"Seq Scan on {table}" in line:
+                scans.append(line)
+    return scans
+
+
+def main():
+    failures = 0
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            # Small test tables make the planner prefer seq scans; we only want
+            # to know whether an index *can* serve the query.
+            conn.execute(text("SET enable_seqscan = off"))
+        juiz_id = conn.execute(text("SELECT MIN(id) FROM juizes")).scalar() or 1
+        checks = [
+            (name, _plan(conn, sql, params, driver_sql=True), tables)
+            for name, (function, tables) in CODE_QUERIES.items()
+            for sql, params in _captured(function, juiz_id)
+        ]
+        checks += [
+            (name, _plan(conn, sql, params), tables)
+            for name, (sql, params, tables) in HOT_QUERIES.items()
+        ]
+        for name, plan, tables in checks:
+            scans = _full_scans(plan, tables)
+            status = "FAIL" if scans else "ok"
+            failures += bool(scans)
+            print(f"[{status}] {name}")
+            for line in plan:
+                print(f"       {line}")
+    if failures:
+        print(f"\n{failures} hot query(ies) without index support.")
+        sys.exit(1)
+    print("\nAll hot queries use indexes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Synthetic DataJud `_search` payloads for benchmarks (see benchmark_suite.py).
+
+Generates processes shaped like the public DataJud API responses that
+ingestor_datajud.py consumes: CNJ numbers, classe, assuntos (TPU codes),
+órgão julgador and a movement history with tabled complements, including the
+merit judgments (TPU 219/220/221) that `extrair_desfecho` reads. Órgãos follow
+a Zipf-like distribution (a few very busy courts, a long tail), like real
+tribunals. Output is deterministic for a given --seed.
+
+    python scripts/fake_datajud.py --docs 1000 [--page-size 50] > pages.ndjson
+
+Each output line is one `_search` response page.
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+
+TRIBUNAIS = {"TJSP": ("26", "SP"), "TJRJ": ("19", "RJ"), "TJMG": ("13", "MG")}
+
+CLASSES = [
+    (7, "Procedimento Comum Cível"),
+    (436, "Procedimento do Juizado Especial Cível"),
+    (1116, "Execução Fiscal"),
+    (12154, "Execução de Título Extrajudicial"),
+]
+
+ASSUNTOS = [
+    (10433, "Indenização por Dano Moral"),
+    (10439, "Indenização por Dano Material"),
+    (7771, "Obrigação de Fazer / Não Fazer"),
+    (11806, "Bancários"),
+    (7780, "Telefonia"),
+    (9607, "Rescisão do contrato e devolução do dinheiro"),
+    (10431, "Transporte Aéreo"),
+    (6017, "IPTU/ Imposto Predial e Territorial Urbano"),
+    (5952, "ICMS/ Imposto sobre Circulação de Mercadorias"),
+    (7691, "Cobrança de Aluguéis - Sem despejo"),
+    (10671, "Posse"),
+    (899, "Alimentos"),
+]
+
+# Movements before the decision: (TPU code, name)
+PROCEDURAL = [
+    (26, "Distribuição"),
+    (85, "Petição"),
+    (60, "Expedição de documento"),
+    (123, "Remessa"),
+    (11010, "Mero expediente"),
+    (51, "Conclusão"),
+]
+DECISIONS = [
+    (219, "Julgamento com Resolução do Mérito - Procedência"),
+    (221, "Julgamento com Resolução do Mérito - Procedência em Parte"),
+    (220, "Julgamento com Resolução do Mérito - Improcedência"),
+    (11009, "Decisão - Concessão - Liminar"),
+    (11021, "Despacho"),
+]
+CLOSING = [(848, "Trânsito em julgado"), (246, "Arquivamento Definitivo")]
+
+SENTENCES = [
+    "Trata-se de ação de indenização por danos morais em face de banco réu",
+    "A parte autora alega cobrança indevida e negativação do nome nos cadastros",
+    "Defiro a tutela de urgência para determinar a exclusão da restrição",
+    "O contrato de prestação de serviços de telefonia foi rescindido unilateralmente",
+    "Julgo procedente o pedido para condenar a ré ao pagamento da indenização",
+    "Julgo improcedente o pedido, ante a ausência de prova do fato constitutivo",
+    "Julgo parcialmente procedentes os pedidos formulados na petição inicial",
+    "Execução fiscal de ICMS; rejeito a exceção de pré-executividade",
+    "Homologo o acordo celebrado entre as partes para que produza seus efeitos",
+    "A cobranca foi comprovada por documentos e não houve impugnação específica",
+    "Considerando a urgência, concedo a liminar nos termos requeridos",
+    "Condeno a parte vencida em custas e honorários de dez por cento",
+]
+
+
+def _cnj_number(rng, year, tr):
+    sequence = rng.randrange(10**7)
+    court = rng.randrange(10**4)
+    base = f"{sequence:07d}{year}8{tr}{court:04d}"
+    check = 98 - (int(base + "00") % 97)
+    return f"{sequence:07d}{check:02d}{year}8{tr}{court:04d}"
+
+
+def _description(rng):
+    return ". ".join(rng.sample(SENTENCES, rng.randint(2, 4))) + "."
+
+
+def _courts(rng, tribunal, count):
+    return [
+        {
+            "codigo": 10000 + i,
+            "nome": f"{i + 1}ª Vara Cível de {tribunal}-{rng.randrange(1000):03d}",
+            "codigoMunicipioIBGE": 3500000 + rng.randrange(99999),
+        }
+        for i in range(count)
+    ]
+
+
+def generate_hits(docs, seed=0, tribunal="TJSP", courts=200):
+    """Yields `docs` DataJud hits ({"_id", "_index", "_source"})."""
+    rng = random.Random(seed)
+    tr, _state = TRIBUNAIS[tribunal]
+    court_list = _courts(rng, tribunal, courts)
+    court_weights = [1 / (i + 1) for i in range(courts)]
+    start = datetime(2015, 1, 1)
+
+    for _ in range(docs):
+        filed = start + timedelta(days=rng.randrange(9 * 365))
+        number = _cnj_number(rng, filed.year, tr)
+        when = filed
+        movements = []
+        for code, name in rng.sample(PROCEDURAL, rng.randint(2, len(PROCEDURAL))):
+            when += timedelta(days=rng.randint(1, 90))
+            movements.append(
+                {"codigo": code, "nome": name, "dataHora": when.isoformat()}
+            )
+        # ~80% reach a decision; those carry the text the ingestor mines
+        if rng.random() < 0.8:
+            for code, name in rng.sample(DECISIONS, rng.randint(1, 2)):
+                when += timedelta(days=rng.randint(10, 180))
+                movements.append(
+                    {
+                        "codigo": code,
+                        "nome": name,
+                        "dataHora": when.isoformat(),
+                        "complementosTabelados": [
+                            {
+                                "codigo": 2,
+                                "valor": rng.randrange(1, 30),
+                                "nome": "tipo de decisão",
+                                "descricao": _description(rng),
+                            }
+                        ],
+                    }
+                )
+            if rng.random() < 0.5:
+                code, name = rng.choice(CLOSING)
+                when += timedelta(days=rng.randint(15, 60))
+                movements.append(
+                    {"codigo": code, "nome": name, "dataHora": when.isoformat()}
+                )
+
+        class_code, class_name = rng.choice(CLASSES)
+        subjects = [
+            {"codigo": code, "nome": name}
+            for code, name in rng.sample(ASSUNTOS, rng.randint(1, 3))
+        ]
+        yield {
+            "_index": f"api_publica_{tribunal.lower()}",
+            "_id": f"{tribunal}_{class_code}_G1_{number}",
+            "_source": {
+                "numeroProcesso": number,
+                "classe": {"codigo": class_code, "nome": class_name},
+                "sistema": {"codigo": 1, "nome": "Pje"},
+                "formato": {"codigo": 1, "nome": "Eletrônico"},
+                "tribunal": tribunal,
+                "dataHoraUltimaAtualizacao": when.isoformat(),
+                "grau": "G1",
+                "dataAjuizamento": filed.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "movimentos": movements,
+                "orgaoJulgador": rng.choices(court_list, court_weights)[0],
+                "assuntos": subjects,
+                "nivelSigilo": 0,
+            },
+        }
+
+
+def search_pages(docs, page_size=50, **kwargs):
+    """Yields `_search` responses of up to `page_size` hits each."""
+    page = []
+    for hit in generate_hits(docs, **kwargs):
+        page.append(hit)
+        if len(page) == page_size:
+            yield search_response(page)
+            page = []
+    if page:
+        yield search_response(page)
+
+
+def search_response(hits):
+    return {
+        "took": 12,
+        "timed_out": False,
+        "hits": {
+            "total": {"value": len(hits), "relation": "eq"},
+            "max_score": None,
+            "hits": hits,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tribunal", choices=sorted(TRIBUNAIS), default="TJSP")
+    parser.add_argument("--courts", type=int, default=200)
+    args = parser.parse_args()
+    for page in search_pages(
+        args.docs,
+        args.page_size,
+        seed=args.seed,
+        tribunal=args.tribunal,
+        courts=args.courts,
+    ):
+        sys.stdout.write(json.dumps(page, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""Local stand-in for the Groq (OpenAI-compatible) API, for offline load tests.
+
+Implements the two endpoints the app uses:
+
+- GET  /openai/v1/models            (used by `_discover_groq_models`)
+- POST /openai/v1/chat/completions  (used by `client.chat.completions.create`)
+
+The same routes are also exposed under /v1/ (REST fallback used by
+scripts/test_groq_integration.py).
+
+Usage:
+
+    python scripts/groq_stub_server.py --port 8010 --latency 0.8 --tokens-per-second 250 \
+        --error-429-rate 0.05 --error-500-rate 0.01
+
+    # In another shell, point the Groq SDK at the stub:
+    GROQ_BASE_URL=http://127.0.0.1:8010 GROQ_API_KEY=stub streamlit run app.py
+
+The behaviour can be changed at runtime (without restarting the server) with
+POST /_stub/config and inspected with GET /_stub/stats, which makes it easy to
+script scenarios (e.g. "now inject 30% of 429s") from a load-test driver.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_MODELS = [
+    "llama-3.3-70b-versatile",
+    "llama-3.1-8b-instant",
+    "llama3-8b-8192",
+]
+
+LOREM = (
+    "O magistrado demonstra tendência garantista em matérias de consumo, "
+    "com fundamentação concisa e ampla citação de precedentes do STJ. "
+    "Em demandas bancárias, predomina a parcial procedência, com redução "
+    "de danos morais. Recomenda-se reforçar a prova documental e os pedidos "
+    "subsidiários. "
+).split()
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.5  # seconds before the first token (time to first byte)
+    jitter: float = 0.1  # uniform +/- jitter applied to the latency
+    tokens_per_second: float = 200.0  # 0 disables the generation delay
+    completion_tokens: int = 200  # used when the request has no max_tokens
+    error_429_rate: float = 0.0
+    error_500_rate: float = 0.0
+    retry_after: float = 1.0  # seconds, sent in the Retry-After header on 429
+    models: List[str] = field(default_factory=lambda: list(DEFAULT_MODELS))
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    completions: int = 0
+    streamed: int = 0
+    errors_429: int = 0
+    errors_500: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    completion_tokens: int = 0
+
+
+config = StubConfig()
+stats = StubStats()
+_lock = threading.Lock()
+_rng = random.Random()
+
+app = FastAPI(title="Groq stub", version="1.0.0")
+
+
+def _error(status: int, message: str, err_type: str, code: str, headers=None):
+    body = {"error": {"message": message, "type": err_type, "code": code}}
+    return JSONResponse(status_code=status, content=body, headers=headers)
+
+
+def _injected_error() -> Optional[JSONResponse]:
+    roll = _rng.random()
+    if roll < config.error_429_rate:
+        with _lock:
+            stats.errors_429 += 1
+        return _error(
+            429,
+            "Rate limit reached (stub). Please try again later.",
+            "tokens",
+            "rate_limit_exceeded",
+            headers={"retry-after": str(config.retry_after)},
+        )
+    if roll < config.error_429_rate + config.error_500_rate:
+        with _lock:
+            stats.errors_500 += 1
+        return _error(500, "Internal server error (stub).", "internal_error", "500")
+    return None
+
+
+def _count_prompt_tokens(messages) -> int:
+    # Rough estimate (~4 chars per token), good enough for usage accounting
+    chars = sum(len(str(m.get("content", ""))) for m in messages or [])
+    return max(1, chars // 4)
+
+
+def _fake_tokens(n: int) -> List[str]:
+    return [LOREM[i % len(LOREM)] + " " for i in range(n)]
+
+
+def _first_token_delay() -> float:
+    return max(0.0, config.latency + _rng.uniform(-config.jitter, config.jitter))
+
+
+def _per_token_delay() -> float:
+    return 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+
+def _models_payload():
+    created = int(time.time())
+    return {
+        "object": "list",
+        "data": [
+            # `name` is what `_discover_groq_models` reads; `id` is the OpenAI field
+            {
+                "id": m,
+                "name": m,
+                "object": "model",
+                "created": created,
+                "owned_by": "stub",
+            }
+            for m in config.models
+        ],
+    }
+
+
+@app.get("/openai/v1/models")
+@app.get("/v1/models")
+async def list_models():
+    with _lock:
+        stats.requests += 1
+    return _models_payload()
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    with _lock:
+        stats.requests += 1
+
+    model = body.get("model")
+    if model not in config.models:
+        return _error(
+            404,
+            f"The model `{model}` does not exist or you do not have access to it.",
+            "invalid_request_error",
+            "model_not_found",
+        )
+
+    erro = _injected_error()
+    if erro is not None:
+        return erro
+
+    n_tokens = int(body.get("max_tokens") or config.completion_tokens)
+    prompt_tokens = _count_prompt_tokens(body.get("messages"))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    tokens = _fake_tokens(n_tokens)
+
+    with _lock:
+        stats.completions += 1
+        stats.completion_tokens += n_tokens
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+
+    if body.get("stream"):
+        with _lock:
+            stats.streamed += 1
+        return _InFlightStream(
+            _stream(completion_id, created, model, tokens, prompt_tokens),
+            media_type="text/event-stream",
+        )
+
+    try:
+        await asyncio.sleep(_first_token_delay() + _per_token_delay() * n_tokens)
+    finally:
+        with _lock:
+            stats.in_flight -= 1
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                "finish_reason": "length" if body.get("max_tokens") else "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+        },
+    }
+
+
+async def _stream(completion_id, created, model, tokens, prompt_tokens):
+    def chunk(delta, finish_reason=None, usage=None):
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage is not None:
+            data["x_groq"] = {"id": completion_id, "usage": usage}
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    await asyncio.sleep(_first_token_delay())
+    yield chunk({"role": "assistant", "content": ""})
+    delay = _per_token_delay()
+    for tok in tokens:
+        if delay:
+            await asyncio.sleep(delay)
+        yield chunk({"content": tok})
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(tokens),
+        "total_tokens": prompt_tokens + len(tokens),
+    }
+    yield chunk({}, finish_reason="stop", usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+class _InFlightStream(StreamingResponse):
+    """Releases the request's in-flight slot however the streamed write ends.
+
+    A finally inside the body generator is not enough: if the client
+    disconnects before the first chunk, or while the generator is parked on
+    a yield, the generator may never be resumed or closed.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with _lock:
+                stats.in_flight -= 1
+
+
+@app.get("/_stub/config")
+async def get_config():
+    return asdict(config)
+
+
+@app.post("/_stub/config")
+async def update_config(request: Request):
+    changes = await request.json()
+    unknown = [k for k in changes if not hasattr(config, k)]
+    if unknown:
+        return JSONResponse(status_code=400, content={"unknown_fields": unknown})
+    for key, value in changes.items():
+        setattr(config, key, value)
+    return asdict(config)
+
+
+@app.get("/_stub/stats")
+async def get_stats():
+    with _lock:
+        return asdict(stats)
+
+
+@app.post("/_stub/stats/reset")
+async def reset_stats():
+    global stats
+    with _lock:
+        stats = StubStats()
+    return asdict(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", type=float, default=config.latency)
+    parser.add_argument("--jitter", type=float, default=config.jitter)
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=config.tokens_per_second
+    )
+    parser.add_argument(
+        "--completion-tokens", type=int, default=config.completion_tokens
+    )
+    parser.add_argument("--error-429-rate", type=float, default=config.error_429_rate)
+    parser.add_argument("--error-500-rate", type=float, default=config.error_500_rate)
+    parser.add_argument("--retry-after", type=float, default=config.retry_after)
+    parser.add_argument(
+        "--models", default=",".join(DEFAULT_MODELS), help="comma-separated list"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config.latency = args.latency
+    config.jitter = args.jitter
+    config.tokens_per_second = args.tokens_per_second
+    config.completion_tokens = args.completion_tokens
+    config.error_429_rate = args.error_429_rate
+    config.error_500_rate = args.error_500_rate
+    config.retry_after = args.retry_after
+    config.models = [m.strip() for m in args.models.split(",") if m.strip()]
+    if args.seed is not None:
+        _rng.seed(args.seed)
+
+    print(f"Groq stub listening on http://{args.host}:{args.port}")
+    print(f"Set GROQ_BASE_URL=http://{args.host}:{args.port} to use it.")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
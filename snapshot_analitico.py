@@ -0,0 +1,234 @@
+"""
+Snapshot analítico colunar (Parquet) de `decisoes` + `juizes` + `tribunais`.
+
+O snapshot é particionado por tribunal e ano (layout "hive":
+tribunal=TJSP/ano=2023/part-0.parquet) e guarda as colunas repetitivas (tema,
+resultado, juiz, vara...) com dictionary encoding, que viram `category` no
+pandas. Leituras usam memory-map e só tocam nas colunas e partições pedidas.
+
+Depois do primeiro `python snapshot_analitico.py`, a tarefa "eventos" da fila
+o regera sempre que processa mudanças. Como a versão dos dados muda a cada
+escrita (inclusive embeddings e treinos), o dashboard aceita um snapshot
+defasado de até SNAPSHOT_VALIDADE_H horas e mostra a idade dele.
+
+Uso:
+    python snapshot_analitico.py              # gera/atualiza o snapshot
+    python snapshot_analitico.py --forcar     # regera mesmo sem mudanças
+
+Num notebook:
+    import snapshot_analitico as sa
+    df = sa.carregar_snapshot(["tema", "resultado"], tribunal="TJSP", anos=[2023])
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+from sqlalchemy import select
+
+from database_models import (
+    SessionLeitura,
+    Decisao,
+    Juiz,
+    Tribunal,
+    obter_versao_dados,
+)
+
+SNAPSHOT_DIR = os.getenv("PROLOGOS_SNAPSHOT_DIR", "./dados/snapshot")
+ARQUIVO_META = "_snapshot.json"
+LINHAS_POR_LOTE = 50_000
+SNAPSHOT_VALIDADE_H = float(os.getenv("PROLOGOS_SNAPSHOT_VALIDADE_H", "24"))
+# O que uma leitura pode levantar se pegar a troca de `gerar_snapshot` no meio
+# (diretório ausente por um instante, arquivos do snapshot antigo já apagados)
+ERROS_LEITURA = (OSError, pa.ArrowException)
+
+_TEXTO_DICT = pa.dictionary(pa.int32(), pa.string())
+
+ESQUEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("numero_processo", pa.string()),
+        ("tema", _TEXTO_DICT),
+        ("resultado", _TEXTO_DICT),
+        ("data_decisao", pa.date32()),
+        ("juiz_id", pa.int32()),
+        ("juiz", _TEXTO_DICT),
+        ("vara", _TEXTO_DICT),
+        ("estado", _TEXTO_DICT),
+        ("tribunal", pa.string()),  # partição
+        ("ano", pa.int16()),  # partição (nulo = decisão sem data)
+    ]
+)
+PARTICOES = ds.partitioning(
+    pa.schema([("tribunal", pa.string()), ("ano", pa.int16())]), flavor="hive"
+)
+
+
+def _lotes(session):
+    query = (
+        select(
+            Decisao.id,
+            Decisao.numero_processo,
+            Decisao.tema,
+            Decisao.resultado,
+            Decisao.data_decisao,
+            Decisao.juiz_id,
+            Juiz.nome,
+            Juiz.vara,
+            Tribunal.estado,
+            Tribunal.nome,
+        )
+        .join(Juiz, Decisao.juiz_id == Juiz.id)
+        .join(Tribunal, Juiz.tribunal_id == Tribunal.id)
+        .order_by(Decisao.id)
+        .execution_options(yield_per=LINHAS_POR_LOTE)
+    )
+    for linhas in session.execute(query).partitions(LINHAS_POR_LOTE):
+        colunas = list(zip(*linhas))
+        datas = colunas[4]
+        anos = [d.year if d else None for d in datas]
+        arrays = [
+            (
+                pa.array(valores, type=campo.type.value_type).dictionary_encode()
+                if pa.types.is_dictionary(campo.type)
+                else pa.array(valores, type=campo.type)
+            )
+            for campo, valores in zip(ESQUEMA, list(colunas) + [anos])
+        ]
+        yield pa.RecordBatch.from_arrays(arrays, schema=ESQUEMA)
+
+
+def ler_metadados(destino=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(destino, ARQUIVO_META), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def snapshot_atualizado(versao_dados, destino=SNAPSHOT_DIR):
+    meta = ler_metadados(destino)
+    return meta is not None and meta.get("versao_dados") == versao_dados
+
+
+def idade_snapshot(meta):
+    """Segundos desde que o snapshot descrito em `meta` foi gerado."""
+    gerado_em = datetime.fromisoformat(meta["gerado_em"])
+    return (datetime.utcnow() - gerado_em).total_seconds()
+
+
+def snapshot_recente(destino=SNAPSHOT_DIR):
+    """Metadados do snapshot se ele tem até SNAPSHOT_VALIDADE_H horas; senão None."""
+    meta = ler_metadados(destino)
+    if meta is None or idade_snapshot(meta) > SNAPSHOT_VALIDADE_H * 3600:
+        return None
+    return meta
+
+
+def gerar_snapshot(destino=SNAPSHOT_DIR, forcar=False):
+    """
+    Escreve o snapshot num diretório temporário e troca de uma vez, para que
+    leitores nunca vejam um snapshot pela metade. Não faz nada se a versão dos
+    dados não mudou desde o último snapshot (a menos que `forcar`).
+    """
+    session = SessionLeitura()
+    try:
+        versao = obter_versao_dados(session)
+        if not forcar and snapshot_atualizado(versao, destino):
+            return ler_metadados(destino)
+
+        inicio = time.perf_counter()
+        temporario = f"{destino.rstrip('/')}.tmp-{os.getpid()}"
+        shutil.rmtree(temporario, ignore_errors=True)
+
+        total = 0
+
+        def _contar(lotes):
+            nonlocal total
+            for lote in lotes:
+                total += lote.num_rows
+                yield lote
+
+        ds.write_dataset(
+            _contar(_lotes(session)),
+            temporario,
+            schema=ESQUEMA,
+            format="parquet",
+            partitioning=PARTICOES,
+            existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_group=LINHAS_POR_LOTE * 2,
+        )
+    finally:
+        session.close()
+
+    meta = {
+        "versao_dados": versao,
+        "linhas": total,
+        "gerado_em": datetime.utcnow().isoformat(timespec="seconds"),
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+    os.makedirs(temporario, exist_ok=True)
+    with open(os.path.join(temporario, ARQUIVO_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    antigo = f"{destino.rstrip('/')}.old-{os.getpid()}"
+    if os.path.exists(destino):
+        os.replace(destino, antigo)
+    os.replace(temporario, destino)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return meta
+
+
+def abrir_snapshot(destino=SNAPSHOT_DIR):
+    """Dataset pyarrow do snapshot, com leitura via memory-map."""
+    return ds.dataset(
+        destino,
+        format="parquet",
+        partitioning=PARTICOES,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=True,
+    )
+
+
+def carregar_snapshot(
+    colunas=None, tribunal=None, anos=None, juiz_id=None, destino=SNAPSHOT_DIR
+):
+    """
+    DataFrame do snapshot, lendo só as `colunas` pedidas. Os filtros por
+    tribunal/ano descartam partições inteiras sem abrir os arquivos.
+    """
+    filtro = None
+
+    def _e(expr):
+        return expr if filtro is None else filtro & expr
+
+    if tribunal:
+        filtro = _e(ds.field("tribunal") == tribunal.upper())
+    if anos:
+        filtro = _e(ds.field("ano").isin(list(anos)))
+    if juiz_id is not None:
+        filtro = _e(ds.field("juiz_id") == juiz_id)
+
+    tabela = abrir_snapshot(destino).to_table(columns=colunas, filter=filtro)
+    if "tribunal" in tabela.column_names:
+        i = tabela.column_names.index("tribunal")
+        tabela = tabela.set_column(
+            i, "tribunal", tabela.column("tribunal").dictionary_encode()
+        )
+    # Colunas dictionary viram `category`; datas viram datetime64 (não objetos)
+    return tabela.to_pandas(date_as_object=False)
+
+
+if __name__ == "__main__":
+    forcar = "--forcar" in sys.argv
+    print("🗂️ Gerando snapshot analítico (Parquet)...")
+    meta = gerar_snapshot(forcar=forcar)
+    print(
+        f"✅ {meta['linhas']} decisões em {SNAPSHOT_DIR} (versão {meta['versao_dados']})."
+    )
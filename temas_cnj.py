@@ -0,0 +1,123 @@
+"""
+Dimensão de temas: os assuntos do DataJud pelo código da Tabela Processual
+Unificada do CNJ (`temas`) e a ligação N:N com as decisões (`decisoes_temas`).
+
+`decisoes.tema` guarda só o nome do primeiro assunto (texto repetido em cada
+linha); aqui ficam todos os assuntos de cada decisão, por código. A ingestão
+(salvar_lote) junta os assuntos do lote e grava tudo de uma vez com
+`gravar_vinculos`: um upsert para os temas e um para as ligações, que também
+completa decisões antigas quando o processo é baixado de novo.
+
+As estatísticas por tema do dashboard e o filtro `tema_codigo` da API são
+joins por inteiro sobre `decisoes_temas`. Decisões gravadas antes da tabela
+(sem ligação) continuam contando pelo nome em `decisoes.tema`.
+"""
+
+from collections import Counter
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database_models import Decisao, DecisaoTema, Tema
+
+
+def extrair_assuntos(processo_source):
+    """[(codigo, nome)] dos assuntos do processo, na ordem do DataJud."""
+    assuntos = []
+    for assunto in processo_source.get("assuntos") or []:
+        # Alguns tribunais mandam cada assunto dentro de uma lista
+        for item in assunto if isinstance(assunto, list) else [assunto]:
+            try:
+                codigo = int(item.get("codigo"))
+            except (AttributeError, TypeError, ValueError):
+                continue
+            nome = item.get("nome") or item.get("descricao") or str(codigo)
+            if all(codigo != c for c, _ in assuntos):
+                assuntos.append((codigo, nome))
+    return assuntos
+
+
+def gravar_vinculos(session, assuntos_por_decisao):
+    """
+    Grava os temas e as ligações de {decisao_id: [(codigo, nome)]} em dois
+    upserts em massa (o que já existe fica como está).
+    """
+    temas = {}
+    vinculos = []
+    for decisao_id, assuntos in assuntos_por_decisao.items():
+        for ordem, (codigo, nome) in enumerate(assuntos):
+            temas.setdefault(codigo, nome)
+            vinculos.append(
+                {"decisao_id": decisao_id, "tema_codigo": codigo, "ordem": ordem}
+            )
+    if not vinculos:
+        return
+
+    insert = (
+        pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    )
+    session.execute(
+        insert(Tema.__table__).on_conflict_do_nothing(index_elements=["codigo"]),
+        [{"codigo": codigo, "nome": nome} for codigo, nome in temas.items()],
+    )
+    session.execute(
+        insert(DecisaoTema.__table__).on_conflict_do_nothing(
+            index_elements=["decisao_id", "tema_codigo"]
+        ),
+        vinculos,
+    )
+
+
+def descartar_vinculos(session, decisao_ids):
+    """Apaga as ligações de decisões removidas."""
+    if decisao_ids:
+        session.query(DecisaoTema).filter(
+            DecisaoTema.decisao_id.in_(list(decisao_ids))
+        ).delete(synchronize_session=False)
+
+
+def decisoes_do_tema(codigos):
+    """Subconsulta com os ids das decisões ligadas a algum dos `codigos`."""
+    return select(DecisaoTema.decisao_id).where(DecisaoTema.tema_codigo.in_(codigos))
+
+
+def contar_por_tema(session, juiz_id):
+    """
+    {tema: decisões} do juiz, contando todos os assuntos de cada decisão. A
+    contagem é por código; códigos diferentes com o mesmo nome aparecem como
+    "nome (código)". As sem ligação (anteriores à dimensão) contam pelo nome
+    em `decisoes.tema`.
+    """
+    por_codigo = session.execute(
+        select(Tema.codigo, Tema.nome, func.count())
+        .select_from(DecisaoTema)
+        .join(Decisao, Decisao.id == DecisaoTema.decisao_id)
+        .join(Tema, Tema.codigo == DecisaoTema.tema_codigo)
+        .where(Decisao.juiz_id == juiz_id)
+        .group_by(Tema.codigo, Tema.nome)
+    ).all()
+    repetidos = Counter(nome for _codigo, nome, _n in por_codigo)
+    contagem = Counter()
+    for codigo, nome, n in por_codigo:
+        contagem[nome if repetidos[nome] == 1 else f"{nome} ({codigo})"] += n
+    sem_vinculo = (
+        ~select(DecisaoTema.decisao_id)
+        .where(DecisaoTema.decisao_id == Decisao.id)
+        .exists()
+    )
+    for nome, n in session.execute(
+        select(func.coalesce(Decisao.tema, "Geral"), func.count())
+        .where(Decisao.juiz_id == juiz_id, sem_vinculo)
+        .group_by(Decisao.tema)
+    ):
+        contagem[nome] += n
+    return dict(contagem)
+
+
+def listar_temas(session, busca=None):
+    """[(codigo, nome)] dos temas conhecidos, por nome (opcionalmente filtrados)."""
+    query = select(Tema.codigo, Tema.nome).order_by(Tema.nome)
+    if busca:
+        query = query.where(Tema.nome.contains(busca))
+    return session.execute(query).all()